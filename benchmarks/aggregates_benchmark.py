@@ -0,0 +1,233 @@
+"""
+Incremental summary tables versus a full recompute.
+
+Simulates --runs scheduled runs of both functions against the local server.
+Each run serves a new vintage of every summarized source: one more month
+(or --days more days for the daily CO2 series), and --revisions values
+inside the source's revision window changed. GISTEMP runs with a change
+manifest; the Global Warming API runs in incremental mode, with the stub
+watermark set to the newest date loaded before, once with the whole-body
+decoder and once with STREAM_JSON.
+
+The summary rows the functions merge are replayed into in-memory summary
+tables. After every run these are compared with a full recompute over the
+current vintage, which must match exactly (updated_at aside). Reported per
+run: summary rows merged and milliseconds spent computing them, against the
+rows and milliseconds of the full recompute. The script exits non-zero on a
+mismatch.
+
+Usage:
+    python benchmarks/aggregates_benchmark.py [--runs 6] [--revisions 3] [--days 7]
+"""
+
+import argparse
+import io
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pyarrow.parquet as pq
+
+from common import FIRST_YEAR, REAL_YEARS, load_function
+from local_server import LocalUpstream, point_sources_at
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def add_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+class Vintages:
+    """A dated series that grows and is revised from one vintage to the next."""
+
+    def __init__(self, first: date, count: int, step, low: float, high: float, rng: random.Random):
+        self.step, self.low, self.high, self.rng = step, low, high, rng
+        self.values = {}
+        day = first
+        for _ in range(count):
+            self.values[day] = rng.uniform(low, high)
+            day = step(day)
+        self.next = day
+
+    def advance(self, new: int, revisions: int, window: int):
+        """Append new values and revise some of the last window values."""
+        for _ in range(new):
+            self.values[self.next] = self.rng.uniform(self.low, self.high)
+            self.next = self.step(self.next)
+        recent = sorted(self.values)[-window:]
+        for day in self.rng.sample(recent, min(revisions, len(recent))):
+            self.values[day] += self.rng.uniform(-0.5, 0.5)
+
+    def latest(self) -> date:
+        return max(self.values)
+
+
+def gistemp_csv(vintages: Vintages) -> bytes:
+    lines = ['Land-Ocean: Means', 'Year,' + ','.join(MONTH_NAMES) + ',J-D']
+    years = sorted({day.year for day in vintages.values})
+    for year in years:
+        months = [vintages.values.get(date(year, m, 1)) for m in range(1, 13)]
+        lines.append(','.join([str(year)] + ['***' if v is None else f"{v:.2f}" for v in months] + ['***']))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+GW_PAYLOADS = {
+    'temperature': lambda values: {'result': [
+        {'time': f"{d.year}.{(d.month - 1) * 833 + 417:04d}", 'station': f"{v:.2f}", 'land': f"{v + 0.3:.2f}"}
+        for d, v in sorted(values.items())]},
+    'co2': lambda values: {'co2': [
+        {'year': str(d.year), 'month': str(d.month), 'day': str(d.day), 'cycle': f"{v + 2:.2f}", 'trend': f"{v:.2f}"}
+        for d, v in sorted(values.items())]},
+    'methane': lambda values: {'methane': [
+        {'date': f"{d.year}-{d.month}", 'average': f"{v:.2f}", 'trend': f"{v:.2f}"}
+        for d, v in sorted(values.items())]},
+}
+
+
+def replay_summary_loads(client: StubBigQueryClient, start: int, tables: dict) -> int:
+    """Upsert the rows of summary staging loads (Parquet) since start into tables; returns the rows seen."""
+    rows = 0
+    for load in client.loads[start:]:
+        name = load['table'].split('.')[-1].split('_temp_')[0]
+        if not name.startswith('agg_'):
+            continue
+        for row in pq.read_table(io.BytesIO(load['payload'])).to_pylist():
+            tables.setdefault(name, {})[row['record_id']] = row
+            rows += 1
+    return rows
+
+
+def comparable(rows) -> dict:
+    """Rows by record_id, updated_at aside; Parquet dates compare as their ISO strings."""
+    return {row['record_id']: json.dumps({k: v for k, v in row.items() if k != 'updated_at'}, sort_keys=True,
+                                         default=str)
+            for row in rows}
+
+
+def check(label: str, run: int, merged: int, merged_seconds: float, tables: dict, summary_tables: dict,
+          full: dict, full_seconds: float) -> bool:
+    full_rows = {summary_tables[kind]: rows for kind, rows in full.items()}
+    same = all(comparable(tables.get(name, {}).values()) == comparable(rows) for name, rows in full_rows.items())
+    total = sum(len(rows) for rows in full.values())
+    print(f"{label:<24}{run:>4}{merged:>9}{merged_seconds * 1000:>10.1f}{total:>9}{full_seconds * 1000:>10.1f}"
+          f"   {'OK' if same else 'MISMATCH'}")
+    return same
+
+
+def run_gistemp(args, rng: random.Random) -> bool:
+    module = load_function('nasa-gistemp-ingest')
+    from aggregates import MonthlySeries, summarize
+    from change_manifest import create_change_manifest
+    from metrics import RunMetrics
+
+    sources = {name: config for name, config in module.DATA_SOURCES.items() if config.get('aggregates')}
+    vintages = {name: Vintages(date(FIRST_YEAR, 1, 1), REAL_YEARS * 12 - 4, add_month, -1, 1.5, rng)
+                for name in sources}
+    client = StubBigQueryClient(TABLE_SCHEMAS)
+    tables = {}
+    ok = True
+    with tempfile.TemporaryDirectory() as directory, LocalUpstream(payloads={}) as upstream:
+        manifest = create_change_manifest(f"{directory}/manifest.json")
+        point_sources_at(module, upstream.base_url)
+        for run in range(1, args.runs + 1):
+            if run > 1:
+                for series in vintages.values():
+                    series.advance(1, args.revisions, 24)
+            for name, config in sources.items():
+                path = config['url'].split(upstream.base_url)[1]
+                upstream.payloads[path] = ('text/csv', gistemp_csv(vintages[name]))
+
+            start = len(client.loads)
+            run_metrics = RunMetrics('aggregates-benchmark')
+            module.ingest_pipelined(client, sources, manifest=manifest, run_metrics=run_metrics)
+            merged = replay_summary_loads(client, start, tables)
+            seconds = sum(source['stage_seconds'].get('aggregate', 0)
+                          for source in run_metrics.as_dict()['sources'].values())
+
+            series = MonthlySeries()
+            for name, config in sources.items():
+                for row in module.parse_gistemp_csv(gistemp_csv(vintages[name]).decode(), 'monthly',
+                                                    config['hemisphere']):
+                    series.add(config['hemisphere'], row['measurement_date'], row['temperature_anomaly'])
+            began = time.perf_counter()
+            full = summarize(series, {c['hemisphere']: c['aggregates'] for c in sources.values()})
+            ok &= check('GISTEMP', run, merged, seconds, tables, module.SUMMARY_TABLES, full,
+                        time.perf_counter() - began)
+    return ok
+
+
+def run_global_warming(args, rng: random.Random, stream: bool) -> bool:
+    module = load_function('global-warming-api-ingest')
+    from aggregates import MonthlySeries, summarize
+    from metrics import SourceMetrics
+
+    module.STREAM_JSON = stream
+    endpoints = {name: module.API_ENDPOINTS[name] for name in GW_PAYLOADS}
+    vintages = {
+        'temperature': Vintages(date(FIRST_YEAR, 1, 1), REAL_YEARS * 12, add_month, -1, 1.5, rng),
+        'co2': Vintages(date(2013, 1, 1), 4000, lambda d: d + timedelta(days=1), 390, 425, rng),
+        'methane': Vintages(date(1983, 7, 1), 500, add_month, 1600, 1950, rng),
+    }
+    client = StubBigQueryClient(TABLE_SCHEMAS)
+    tables = {}
+    ok = True
+    label = f"Global Warming ({'stream' if stream else 'body'})"
+    with LocalUpstream(payloads={}) as upstream:
+        point_sources_at(module, upstream.base_url)
+        for run in range(1, args.runs + 1):
+            merged, seconds = 0, 0.0
+            for name, config in endpoints.items():
+                series = vintages[name]
+                if run > 1:
+                    daily = name == 'co2'
+                    # Revisions stay inside the look-back window, as the watermark filter requires
+                    series.advance(args.days if daily else 1, args.revisions, 20 if daily else 11)
+                upstream.payloads[config['url'].split(upstream.base_url)[1]] = (
+                    'application/json', json.dumps(GW_PAYLOADS[name](series.values)).encode())
+
+                start = len(client.loads)
+                metrics = SourceMetrics(name)
+                module.fetch_and_load_endpoint(client, name, config, metrics=metrics)
+                merged += replay_summary_loads(client, start, tables)
+                seconds += metrics.stages.get('aggregate', 0)
+                client.watermarks[config['table']] = {'measurement_date': series.latest(), 'record_id': ''}
+
+            series, kinds = MonthlySeries(), {}
+            for name, config in endpoints.items():
+                columns = module.summary_columns(name, config)
+                for row in module.transform_payload(name, config, GW_PAYLOADS[name](vintages[name].values)):
+                    series.add_row(row, columns)
+                kinds.update({f"{name}_{column}": column_kinds
+                              for column, column_kinds in config['aggregates'].items()})
+            began = time.perf_counter()
+            full = summarize(series, kinds)
+            ok &= check(label, run, merged, seconds, tables, module.SUMMARY_TABLES, full,
+                        time.perf_counter() - began)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=6, help='Scheduled runs to simulate')
+    parser.add_argument('--revisions', type=int, default=3, help='Values revised per source and run')
+    parser.add_argument('--days', type=int, default=7, help='Days the daily CO2 series grows per run')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'function':<24}{'run':>4}{'merged':>9}{'ms':>10}{'full':>9}{'ms':>10}   match")
+    ok = run_gistemp(args, random.Random(args.seed))
+    ok &= run_global_warming(args, random.Random(args.seed), stream=False)
+    ok &= run_global_warming(args, random.Random(args.seed), stream=True)
+    print('incremental summaries match a full recompute' if ok else 'MISMATCH between incremental and full summaries')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    main()
@@ -0,0 +1,118 @@
+"""
+Cold-start benchmark for the ingestion Cloud Functions.
+
+Each run starts a fresh Python process (a new instance) that times:
+  - import: importing main.py
+  - first: the first handler invocation (client/session creation included)
+  - warm: a second invocation on the same instance
+
+Modes:
+  lazy  - the functions as deployed (lazy imports, instance-wide client/session)
+  eager - google.cloud.bigquery and requests imported up front and the
+          client/session rebuilt per invocation, as before
+
+Upstreams are served by a local HTTP server and BigQuery is replaced by
+StubBigQueryClient, so timings exclude network and job latency. The stub
+uses anonymous credentials, so the credential discovery a real client does
+on construction (and that warm reuse avoids) is not included either.
+
+Usage:
+    python benchmarks/cold_start_benchmark.py [--runs 5] [--function NAME]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+FUNCTIONS = {
+    'global-warming-api-ingest': 'ingest_global_warming_data',
+    'nasa-gistemp-ingest': 'ingest_gistemp_data',
+}
+
+
+class BenchmarkRequest:
+    """Minimal stand-in for the flask request the handlers receive."""
+    args = {}
+
+    def get_json(self, silent=False, **_):
+        return None
+
+
+def child(function: str, mode: str):
+    """Time one cold instance and print the result as JSON."""
+    from local_server import LocalUpstream, point_sources_at
+
+    with LocalUpstream() as upstream:
+        start = time.perf_counter()
+        if mode == 'eager':
+            import requests  # noqa: F401
+            from google.cloud import bigquery  # noqa: F401
+
+        from common import load_function
+        module = load_function(function)
+        imported = time.perf_counter()
+
+        runtime = sys.modules['runtime']
+
+        class StubFactory:
+            """Builds StubBigQueryClient in place of bigquery.Client, importing it on first use."""
+            @staticmethod
+            def Client(project=None):
+                from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+                return StubBigQueryClient(TABLE_SCHEMAS, project=project or 'benchmark')
+
+        runtime.bigquery = StubFactory
+        point_sources_at(module, upstream.base_url)
+        handler = getattr(module, FUNCTIONS[function])
+
+        timings = {'import': imported - start}
+        for name in ('first', 'warm'):
+            if mode == 'eager':
+                runtime.reset_instances()
+            invoked = time.perf_counter()
+            _, status = handler(BenchmarkRequest())
+            timings[name] = time.perf_counter() - invoked
+            if status != 200:
+                raise RuntimeError(f"{function} returned HTTP {status}")
+
+    print(json.dumps(timings))
+
+
+def run_instance(function: str, mode: str) -> dict:
+    env = dict(os.environ, GCP_PROJECT='benchmark', BATCH_MERGE='true', STREAM_JSON='false')
+    for name in ('FETCH_STATE_URI', 'CHANGE_MANIFEST_URI'):
+        env.pop(name, None)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', function, '--mode', mode],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Cold instances per function and mode')
+    parser.add_argument('--function', choices=sorted(FUNCTIONS), help='Benchmark a single function')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', default='lazy', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.mode)
+        return
+
+    functions = [args.function] if args.function else sorted(FUNCTIONS)
+    print(f"{'function':<28}{'mode':<7}{'import ms':>11}{'first ms':>11}{'warm ms':>11}")
+    for function in functions:
+        for mode in ('eager', 'lazy'):
+            runs = [run_instance(function, mode) for _ in range(args.runs)]
+            medians = {k: statistics.median(r[k] for r in runs) * 1000 for k in ('import', 'first', 'warm')}
+            print(f"{function:<28}{mode:<7}{medians['import']:>11.1f}{medians['first']:>11.1f}{medians['warm']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Shared helpers for the ingestion benchmarks: module loading and synthetic inputs."""
+
+import importlib.util
+import os
+import random
+import sys
+import time
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'cloud-functions')
+SERVICES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'cloud-run')
+SHARED_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'shared'))
+
+FIRST_YEAR = 1880
+REAL_YEARS = 145  # 1880 - 2024, the size of the real GISTEMP tables
+ZONES = ['Glob', 'NHem', 'SHem', '24N-90N', '24S-24N', '90S-24S', '64N-90N',
+         '44N-64N', '24N-44N', 'EQU-24N', '24S-EQU', '44S-24S', '64S-44S', '90S-64S']
+
+
+def load_function(name: str, base: str = FUNCTIONS_DIR):
+    """
+    Import src/cloud-functions/<name>/main.py as module '<name>_main'.
+
+    The function directory goes first on sys.path, followed by src/shared,
+    so its sibling modules (fetch_state, parquet_load, ...) resolve as they
+    do in the deployed package, where the shared modules sit next to
+    main.py. Pass base=SERVICES_DIR for the Cloud Run services in
+    src/cloud-run.
+    """
+    module_name = name.replace('-', '_') + '_main'
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    function_dir = os.path.abspath(os.path.join(base, name))
+    if SHARED_DIR not in sys.path:
+        sys.path.insert(0, SHARED_DIR)
+    sys.path.insert(0, function_dir)
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(function_dir, 'main.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_monthly_csv(n_years: int, rng: random.Random) -> str:
+    """Monthly table in the GLB.Ts+dSST.csv layout, with '***' for unreported months."""
+    lines = ['Land-Ocean: Global Means',
+             'Year,Jan,Feb,Mar,Apr,May,Jun,Jul,Aug,Sep,Oct,Nov,Dec,J-D,D-N,DJF,MAM,JJA,SON']
+    for i in range(n_years):
+        year = FIRST_YEAR + i % 8000  # keep years valid for date()
+        months = [f"{rng.uniform(-1, 1.5):.2f}" for _ in range(12)]
+        if i == n_years - 1:
+            months[8:] = ['***'] * 4
+        seasons = ['***' if i == n_years - 1 else f"{rng.uniform(-1, 1.5):.2f}" for _ in range(6)]
+        lines.append(','.join([str(year)] + months + seasons))
+    return '\n'.join(lines) + '\n'
+
+
+def synthetic_zonal_csv(n_years: int, rng: random.Random) -> str:
+    """Zonal annual table in the ZonAnn.Ts+dSST.csv layout, with 999.9 gaps."""
+    lines = ['Year,' + ','.join(ZONES)]
+    for i in range(n_years):
+        values = ['999.9' if rng.random() < 0.01 else f"{rng.uniform(-1, 1.5):.2f}" for _ in ZONES]
+        lines.append(','.join([str(FIRST_YEAR + i)] + values))
+    return '\n'.join(lines) + '\n'
+
+
+def synthetic_co2_records(n_days: int, rng: random.Random) -> list:
+    """Daily records in the co2-api layout (string fields, as served)."""
+    records = []
+    for i in range(n_days):
+        year, day_of_year = 2013 + i // 365, i % 365
+        records.append({
+            'year': str(year),
+            'month': str(day_of_year // 31 + 1),
+            'day': str(day_of_year % 28 + 1),
+            'cycle': f"{rng.uniform(390, 425):.2f}",
+            'trend': f"{rng.uniform(390, 425):.2f}",
+        })
+    return records
+
+
+def best_of(fn, repeat: int) -> float:
+    """Best wall-clock time in seconds of repeat calls to fn."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,104 @@
+"""
+Row building and batch validation throughput of the Global Warming API function.
+
+Builds synthetic payloads for every endpoint, --scale times the size of the
+real ones, with a small share of bad records: unparseable dates, values that
+are not numbers and (for temperature) 'time' strings longer than the
+schema's max_length. Reports rows/s of transform_payload() (row building
+plus, where the endpoint has a compiled connector, batch validation) and
+rows/s of the batch validator alone over the built rows, with the rows
+dropped by reason.
+
+--dump writes the rows built per endpoint (ingestion_timestamp aside) as
+JSON, to compare the output of two versions of the function.
+
+Usage:
+    python benchmarks/connector_benchmark.py [--scale 10] [--repeat 5] [--dump rows.json]
+"""
+
+import argparse
+import json
+import logging
+import random
+
+from common import FIRST_YEAR, REAL_YEARS, best_of, load_function, synthetic_co2_records
+
+BAD_SHARE = 0.002  # Share of records corrupted per kind of fault
+
+
+def temperature_records(count: int, rng: random.Random) -> list:
+    return [{'time': f"{FIRST_YEAR + i // 12 % 8000}.{(i % 12) * 833 + 417:04d}",
+             'station': f"{rng.uniform(-1, 1.5):.2f}", 'land': f"{rng.uniform(-1, 1.5):.2f}"}
+            for i in range(count)]
+
+
+def monthly_records(count: int, rng: random.Random) -> list:
+    return [{'date': f"{1983 + i // 12 % 8000}-{i % 12 + 1}", 'average': f"{rng.uniform(1600, 1950):.2f}",
+             'trend': f"{rng.uniform(1600, 1950):.2f}"}
+            for i in range(count)]
+
+
+PAYLOADS = {
+    'temperature': ('result', REAL_YEARS * 12, temperature_records, 'time', 'station'),
+    'co2': ('co2', 4000, synthetic_co2_records, 'year', 'trend'),
+    'methane': ('methane', 500, monthly_records, 'date', 'average'),
+    'nitrous-oxide': ('nitrous', 300, monthly_records, 'date', 'average'),
+}
+
+
+def payload(name: str, scale: int, rng: random.Random) -> dict:
+    data_key, size, generate, date_field, value_field = PAYLOADS[name]
+    records = generate(size * scale, rng)
+    for record in rng.sample(records, int(len(records) * BAD_SHARE)):
+        record[date_field] = 'n/a'
+    for record in rng.sample(records, int(len(records) * BAD_SHARE)):
+        record[value_field] = 'n/a'
+    if name == 'temperature':
+        for record in rng.sample(records, int(len(records) * BAD_SHARE)):
+            record['time'] += '0' * 16
+    return {data_key: records}
+
+
+def built_rows(connector, records: list):
+    """Rows a connector builds from records, before validation, as a RecordBatch."""
+    return connector.build_batch(records, '2024-01-01T00:00:00', 'https://example.com')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10, help='Payload size as a multiple of the real endpoint')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dump', help='Write the rows built per endpoint to this JSON file')
+    args = parser.parse_args()
+
+    module = load_function('global-warming-api-ingest')
+    from metrics import SourceMetrics
+
+    dumped = {}
+    print(f"{'endpoint':<15}{'records':>9}{'rows':>9}{'rows/s':>12}{'validate rows/s':>17}  dropped")
+    for name, config in module.API_ENDPOINTS.items():
+        data = payload(name, args.scale, random.Random(f"{args.seed}-{name}"))
+        records = len(next(iter(data.values())))
+        metrics = SourceMetrics(name)
+        rows = module.transform_payload(name, config, data, metrics)
+        seconds = best_of(lambda: module.transform_payload(name, config, data), args.repeat)
+
+        validate = '-'
+        connector = config.get('connector')
+        if connector:
+            built = built_rows(connector, data[config['data_key']])
+            validate_seconds = best_of(lambda: connector.validator.validate(built), args.repeat)
+            validate = f"{len(built) / validate_seconds:,.0f}"
+        print(f"{name:<15}{records:>9}{len(rows):>9}{len(rows) / seconds:>12,.0f}{validate:>17}  "
+              f"{dict(metrics.dropped)}")
+        dumped[name] = [{k: v for k, v in row.items() if k != 'ingestion_timestamp'} for row in rows]
+
+    if args.dump:
+        with open(args.dump, 'w') as f:
+            json.dump(dumped, f, sort_keys=True)
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    main()
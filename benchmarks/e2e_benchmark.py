@@ -0,0 +1,188 @@
+"""
+Offline end-to-end benchmark for the ingestion Cloud Functions.
+
+For every scale factor, the upstream payloads (synthetic, or recorded with
+--record and replayed with --recorded) are served from a local HTTP server.
+Each function then runs in a fresh process: the app is built with
+functions_framework.create_app, bigquery.Client is replaced by
+StubBigQueryClient and one request is sent through the Flask test client.
+
+Reported per run:
+  rows/s    - total_records from the response over the request wall time
+  peak RSS  - maximum resident set size of the function process
+  stages    - seconds per stage from the response's metrics block, summed
+              over sources (stages overlap when endpoints run in parallel)
+
+With --check, each run is compared against the stored baseline and the
+script exits non-zero when rows/s drops, or peak RSS grows, by more than
+--tolerance. --update-baseline rewrites the baseline from this run.
+
+Usage:
+    python benchmarks/e2e_benchmark.py [--scales 1,10] [--check]
+    python benchmarks/e2e_benchmark.py --scales 1,10,100,1000 --function nasa-gistemp-ingest
+    python benchmarks/e2e_benchmark.py --record benchmarks/recordings
+    python benchmarks/e2e_benchmark.py --recorded benchmarks/recordings --scales 1,100
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from common import SHARED_DIR
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'e2e_baseline.json')
+
+STAGES = ('fetch', 'parse', 'transform', 'load', 'merge')
+
+FUNCTIONS = {
+    'global-warming-api-ingest': 'ingest_global_warming_data',
+    'nasa-gistemp-ingest': 'ingest_gistemp_data',
+}
+
+
+def child(function: str, base_url: str):
+    """Run one function once against base_url and print the measurements as JSON."""
+    import functions_framework
+    from local_server import point_sources_at
+    from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+    function_dir = os.path.join(BENCHMARKS_DIR, '..', 'src', 'cloud-functions', function)
+    app = functions_framework.create_app(FUNCTIONS[function], os.path.join(function_dir, 'main.py'))
+    module, runtime = sys.modules['main'], sys.modules['runtime']
+    point_sources_at(module, base_url)
+
+    clients = []
+
+    class StubFactory:
+        @staticmethod
+        def Client(project=None):
+            clients.append(StubBigQueryClient(TABLE_SCHEMAS, project=project or 'benchmark'))
+            return clients[-1]
+
+    runtime.bigquery = StubFactory
+    test_client = app.test_client()
+
+    start = time.perf_counter()
+    response = test_client.get('/?metrics=true')
+    wall = time.perf_counter() - start
+
+    body = response.get_json()
+    if response.status_code != 200 or body.get('status') != 'completed':
+        raise RuntimeError(f"{function} failed: HTTP {response.status_code} {body}")
+
+    stages = defaultdict(float)
+    for source in body['metrics']['sources'].values():
+        for stage, seconds in source['stage_seconds'].items():
+            stages[stage] += seconds
+    loads = [load for stub in clients for load in stub.loads]
+    print(json.dumps({
+        'rows': body['total_records'],
+        'wall': wall,
+        'rows_per_sec': body['total_records'] / wall,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stages': stages,
+        'load_jobs': len(loads),
+        'bytes_uploaded': sum(load['bytes'] for load in loads),
+        'queries': sum(len(stub.queries) for stub in clients),
+    }))
+
+
+def run_function(function: str, base_url: str) -> dict:
+    env = dict(os.environ, GCP_PROJECT='benchmark', PYTHONPATH=os.pathsep.join([BENCHMARKS_DIR, SHARED_DIR]))
+    for name in ('FETCH_STATE_URI', 'CHANGE_MANIFEST_URI'):
+        env.pop(name, None)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', function, '--url', base_url],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a description of every run that regressed past the baseline."""
+    failures = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if not expected:
+            continue
+        if result['rows_per_sec'] < expected['rows_per_sec'] * (1 - tolerance):
+            failures.append(f"{key}: {result['rows_per_sec']:.0f} rows/s, baseline {expected['rows_per_sec']:.0f}")
+        if result['peak_rss_mb'] > expected['peak_rss_mb'] * (1 + tolerance):
+            failures.append(f"{key}: {result['peak_rss_mb']:.1f} MB peak RSS, baseline {expected['peak_rss_mb']:.1f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,10', help='Comma-separated payload scale factors')
+    parser.add_argument('--function', choices=sorted(FUNCTIONS), help='Benchmark a single function')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per function and scale (best is kept)')
+    parser.add_argument('--recorded', help='Serve payloads recorded with --record from this directory')
+    parser.add_argument('--record', help='Download live upstream payloads into this directory and exit')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--check', action='store_true', help='Fail if a run regresses past the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='Allowed regression as a fraction')
+    parser.add_argument('--update-baseline', action='store_true', help='Write this run as the new baseline')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.url)
+        return
+
+    from local_server import LocalUpstream, record_upstreams, recorded_payloads, synthetic_payloads
+
+    if args.record:
+        record_upstreams(args.record)
+        print(f"Recorded upstream payloads to {args.record}")
+        return
+
+    functions = [args.function] if args.function else sorted(FUNCTIONS)
+    results = {}
+    print(f"{'function':<28}{'scale':>6}{'rows':>10}{'rows/s':>11}{'RSS MB':>8}"
+          + ''.join(f"{stage + ' s':>{len(stage) + 4}}" for stage in STAGES) + f"{'upload KB':>11}")
+    for scale in [int(s) for s in args.scales.split(',')]:
+        payloads = recorded_payloads(args.recorded, scale) if args.recorded else synthetic_payloads(scale)
+        with LocalUpstream(payloads=payloads) as upstream:
+            for function in functions:
+                runs = [run_function(function, upstream.base_url) for _ in range(args.repeat)]
+                best = max(runs, key=lambda r: r['rows_per_sec'])
+                best['peak_rss_mb'] = min(r['peak_rss_mb'] for r in runs)
+                results[f"{function}@{scale}"] = best
+                stages = best['stages']
+                print(f"{function:<28}{scale:>6}{best['rows']:>10}{best['rows_per_sec']:>11.0f}"
+                      f"{best['peak_rss_mb']:>8.1f}"
+                      + ''.join(f"{stages.get(stage, 0):>{len(stage) + 4}.3f}" for stage in STAGES)
+                      + f"{best['bytes_uploaded'] / 1024:>11.0f}")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({key: {'rows_per_sec': round(r['rows_per_sec']), 'peak_rss_mb': round(r['peak_rss_mb'], 1)}
+                         for key, r in results.items()})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+
+    if args.check:
+        with open(args.baseline) as f:
+            failures = check_regressions(results, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark and check of the coordinator (fan-out) mode of the ingest functions.
+
+Both functions run in this process against the local upstream server and a
+StubBigQueryClient whose jobs take --job-latency seconds. One source per
+function (the zonal CSV, the co2 endpoint) answers --slow-seconds later
+than the others. Each function is timed once processing every source
+in-process and once as a coordinator with FANOUT_TOPIC=local, where
+LocalTaskQueue delivers one task per source to the function's own push
+handler, as the Pub/Sub push subscription does when deployed.
+
+Then checks, in coordinator mode with a fetch state (and, for GISTEMP, a
+change manifest):
+
+  report     the fan-out report has the same per-source statuses and
+             record counts as the in-process one
+  retry      with the slow source's upstream down, the run reports it as
+             failed; re-invoked with the same run_id once it is back, only
+             that source is fetched again and the run completes
+  redelivery a task redelivered after its source finished does no work
+  state      the workers' fetch state (and manifest) updates are saved by
+             the coordinator, so the next run reports every source unchanged
+
+Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/fanout_benchmark.py [--http-latency 0.2] [--job-latency 0.5] [--slow-seconds 3]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from common import load_function
+from local_server import LocalUpstream, point_sources_at
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+FUNCTIONS = {  # Function -> (entry point, path of its slow source)
+    'nasa-gistemp-ingest': ('ingest_gistemp_data', '/gistemp/tabledata_v4/ZonAnn.Ts+dSST.csv'),
+    'global-warming-api-ingest': ('ingest_global_warming_data', '/api/co2-api'),
+}
+
+
+class Request:
+    """The parts of a Flask request the entry points read."""
+
+    def __init__(self, body: dict = None, **args):
+        self.args = args
+        self._body = body
+
+    def get_json(self, silent: bool = False):
+        return self._body
+
+
+def summary(body: dict) -> dict:
+    return {name: (result['status'], result.get('records')) for name, result in body['details'].items()}
+
+
+def invoke(module, entry_point: str, **args) -> tuple:
+    """Call an entry point; returns (response body, seconds). Metrics logs to stdout are dropped."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        body, status = getattr(module, entry_point)(Request(**args))
+    if status != 200:
+        raise RuntimeError(f"{entry_point} answered {status}: {body}")
+    return body, time.perf_counter() - start
+
+
+def check_function(module, function: str, entry_point: str, slow_path: str, upstream: LocalUpstream,
+                   workdir: str) -> list:
+    """Run the retry, redelivery and state checks of one function; returns the failed checks."""
+    from fanout import push_envelope
+
+    failures = []
+    module.FETCH_STATE_URI = os.path.join(workdir, 'fetch-state.json')
+    if hasattr(module, 'CHANGE_MANIFEST_URI'):
+        module.CHANGE_MANIFEST_URI = os.path.join(workdir, 'change-manifest.json')
+    sources = getattr(module, 'API_ENDPOINTS', None) or module.DATA_SOURCES
+    slow_source = next(name for name, config in sources.items() if config['url'].endswith(slow_path))
+
+    payload = upstream.payloads.pop(slow_path)
+    body, _ = invoke(module, entry_point)
+    run_id = body['run_id']
+    if body['details'][slow_source]['status'] != 'failed' or body['status'] != 'partial_failure':
+        failures.append(f"{slow_source} did not fail while its upstream was down")
+
+    upstream.payloads[slow_path] = payload
+    upstream.requests.clear()
+    body, _ = invoke(module, entry_point, run_id=run_id)
+    if body['status'] != 'completed' or upstream.requests != [slow_path]:
+        failures.append(f"retry of run {run_id} fetched {upstream.requests}, status {body['status']}")
+
+    upstream.requests.clear()
+    task = {'function': function, 'run_id': run_id, 'task_id': 'redelivered', 'source': slow_source,
+            'options': {}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        result, status = getattr(module, entry_point)(Request(push_envelope(task, 'redelivered')))
+    if status != 200 or result['status'] != 'success' or upstream.requests:
+        failures.append(f"redelivered task for {slow_source} fetched {upstream.requests}")
+
+    body, _ = invoke(module, entry_point)
+    if any(result['status'] != 'unchanged' for result in body['details'].values()):
+        failures.append(f"fetch state not carried over from the workers: {summary(body)}")
+    if hasattr(module, 'CHANGE_MANIFEST_URI'):
+        with open(module.CHANGE_MANIFEST_URI) as f:
+            tables = {table: len(fingerprints) for table, fingerprints in json.load(f).items()}
+        if set(tables) != {config['table'] for config in sources.values()}:
+            failures.append(f"change manifest not carried over from the workers: {tables}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--http-latency', type=float, default=0.2, help='Seconds added to every download')
+    parser.add_argument('--job-latency', type=float, default=0.5, help='Seconds every BigQuery job takes')
+    parser.add_argument('--slow-seconds', type=float, default=3.0, help='Extra seconds of the slow sources')
+    args = parser.parse_args()
+
+    modules = {name: load_function(name) for name in FUNCTIONS}
+    import runtime
+
+    class StubFactory:
+        @staticmethod
+        def Client(project=None):
+            return StubBigQueryClient(TABLE_SCHEMAS, project=project or 'benchmark', job_latency=args.job_latency)
+
+    runtime.reset_instances()
+    runtime.bigquery = StubFactory
+
+    ok = True
+    delays = {slow_path: args.slow_seconds for _, slow_path in FUNCTIONS.values()}
+    with LocalUpstream(latency=args.http_latency, delays=delays) as upstream:
+        print(f"http latency {args.http_latency}s, job latency {args.job_latency}s, "
+              f"slow sources +{args.slow_seconds}s")
+        print(f"{'function':<28}{'in-process s':>14}{'fan-out s':>11}  checks")
+        for name, (entry_point, slow_path) in FUNCTIONS.items():
+            module = modules[name]
+            point_sources_at(module, upstream.base_url)
+            for setting in ('FETCH_STATE_URI', 'CHANGE_MANIFEST_URI', 'SNAPSHOT_ARCHIVE_URI', 'SERIES_CACHE_URL'):
+                if hasattr(module, setting):
+                    setattr(module, setting, None)
+
+            with tempfile.TemporaryDirectory() as workdir:
+                module.FANOUT_TOPIC = None
+                in_process, in_process_seconds = invoke(module, entry_point)
+
+                module.FANOUT_TOPIC = 'local'
+                module.FANOUT_RESULTS_URI = os.path.join(workdir, 'results')
+                module.FANOUT_POLL_SECONDS = 0.05
+                fanned_out, fan_out_seconds = invoke(module, entry_point)
+
+                failures = []
+                if summary(fanned_out) != summary(in_process):
+                    failures.append(f"fan-out report {summary(fanned_out)} != in-process {summary(in_process)}")
+                failures += check_function(module, name, entry_point, slow_path, upstream, workdir)
+
+            print(f"{name:<28}{in_process_seconds:>14.2f}{fan_out_seconds:>11.2f}  "
+                  f"{'OK' if not failures else 'FAILED'}")
+            for failure in failures:
+                print(f"  FAILED: {failure}")
+            ok &= not failures
+
+    print('fan-out checks passed' if ok else 'MISMATCH')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    logging.disable(logging.ERROR)  # The retry check takes a source down on purpose
+    main()
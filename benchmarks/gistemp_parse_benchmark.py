@@ -0,0 +1,121 @@
+"""
+Micro-benchmark: columnar GISTEMP CSV parser vs. the previous row-wise parser.
+
+Generates synthetic monthly (GLB/NH/SH) and zonal (ZonAnn) CSVs at the size
+of the real NASA files (1x) and at 100x, checks that both parsers produce the
+same rows (ignoring ingestion_timestamp) and reports the best-of-N timings.
+
+Usage:
+    python benchmarks/gistemp_parse_benchmark.py [--repeat 5] [--scales 1,100]
+"""
+
+import argparse
+import csv
+import io
+import random
+from datetime import date, datetime
+
+from common import REAL_YEARS, best_of, load_function, synthetic_monthly_csv, synthetic_zonal_csv
+
+gistemp = load_function('nasa-gistemp-ingest')
+
+
+def legacy_parse_gistemp_csv(csv_content: str, source_type: str, hemisphere: str = None,
+                             source_file: str = None) -> list:
+    """Row-wise parser as it was before the columnar rewrite (with title-line skipping)."""
+    rows = []
+    lines = csv_content.splitlines()
+    start = next((i for i, line in enumerate(lines) if line.startswith('Year')), len(lines))
+    reader = csv.DictReader(io.StringIO('\n'.join(lines[start:])))
+
+    for row in reader:
+        try:
+            year = int(row['Year'])
+
+            if source_type == 'zonal':
+                for zone_name, value in row.items():
+                    if zone_name == 'Year':
+                        continue
+
+                    try:
+                        temp_anomaly = float(value)
+                        if temp_anomaly == 999.9 or temp_anomaly > 900:
+                            continue
+
+                        rows.append({
+                            'year': year,
+                            'zone': zone_name,
+                            'temperature_anomaly': temp_anomaly,
+                            'record_id': gistemp.generate_record_id(zone_name, year),
+                            'ingestion_timestamp': datetime.utcnow().isoformat(),
+                            'source_file': source_file
+                        })
+                    except (ValueError, TypeError):
+                        continue
+
+            else:
+                for month_idx, month_name in enumerate(gistemp.MONTH_NAMES, 1):
+                    if month_name not in row:
+                        continue
+
+                    try:
+                        temp_anomaly = float(row[month_name])
+                        if temp_anomaly == 999.9 or temp_anomaly > 900:
+                            continue
+
+                        measurement_date = date(year, month_idx, 1)
+
+                        rows.append({
+                            'year': year,
+                            'month': month_idx,
+                            'temperature_anomaly': temp_anomaly,
+                            'measurement_date': measurement_date.isoformat(),
+                            'record_id': gistemp.generate_record_id(hemisphere, year, month_idx),
+                            'ingestion_timestamp': datetime.utcnow().isoformat(),
+                            'source_file': source_file,
+                            'hemisphere': hemisphere
+                        })
+                    except (ValueError, TypeError):
+                        continue
+
+        except (ValueError, KeyError):
+            continue
+
+    return rows
+
+
+def strip_timestamps(rows: list) -> list:
+    return [{k: v for k, v in row.items() if k != 'ingestion_timestamp'} for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scales', default='1,100')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    source_file = 'https://example.invalid/source.csv'
+
+    print(f"{'input':<16}{'rows':>10}{'row-wise (s)':>16}{'columnar (s)':>16}{'speedup':>10}")
+    for scale in (int(s) for s in args.scales.split(',')):
+        cases = [
+            (f'monthly x{scale}', synthetic_monthly_csv(REAL_YEARS * scale, rng), 'monthly', 'Global'),
+            (f'zonal x{scale}', synthetic_zonal_csv(REAL_YEARS * scale, rng), 'zonal', None),
+        ]
+        for label, content, source_type, hemisphere in cases:
+            expected = legacy_parse_gistemp_csv(content, source_type, hemisphere, source_file)
+            actual = gistemp.parse_gistemp_csv(content, source_type, hemisphere, source_file)
+            if strip_timestamps(expected) != strip_timestamps(actual):
+                raise SystemExit(f"{label}: columnar output differs from row-wise output")
+
+            legacy_time = best_of(
+                lambda: legacy_parse_gistemp_csv(content, source_type, hemisphere, source_file), args.repeat)
+            columnar_time = best_of(
+                lambda: gistemp.parse_gistemp_csv(content, source_type, hemisphere, source_file), args.repeat)
+            print(f"{label:<16}{len(actual):>10}{legacy_time:>16.4f}{columnar_time:>16.4f}"
+                  f"{legacy_time / columnar_time:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
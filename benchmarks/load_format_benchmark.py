@@ -0,0 +1,66 @@
+"""
+Benchmark: JSON vs. Parquet load payloads.
+
+Builds rows with the functions' own parse/transform code, submits them through
+each function's load path against StubBigQueryClient and reports upload bytes
+and client-side load latency (serialization plus simulated upload).
+
+Usage:
+    python benchmarks/load_format_benchmark.py [--scales 1,10] [--upload-mbps 100] [--repeat 3]
+"""
+
+import argparse
+import random
+
+from google.cloud import bigquery
+
+from common import REAL_YEARS, best_of, load_function, synthetic_co2_records, synthetic_monthly_csv, \
+    synthetic_zonal_csv
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+gistemp = load_function('nasa-gistemp-ingest')
+global_warming = load_function('global-warming-api-ingest')
+
+
+def build_cases(scale: int, rng: random.Random) -> list:
+    co2_rows = global_warming.transform_payload('co2', global_warming.API_ENDPOINTS['co2'],
+                                                {'co2': synthetic_co2_records(4000 * scale, rng)})
+    return [
+        ('gistemp monthly', gistemp.load_rows, 'raw_gistemp_global',
+         gistemp.parse_gistemp_csv(synthetic_monthly_csv(REAL_YEARS * scale, rng), 'monthly', 'Global')),
+        ('gistemp zonal', gistemp.load_rows, 'raw_gistemp_zonal',
+         gistemp.parse_gistemp_csv(synthetic_zonal_csv(REAL_YEARS * scale, rng), 'zonal')),
+        ('gw co2', global_warming.load_rows, 'raw_gw_co2', co2_rows),
+    ]
+
+
+def run_load(load_rows, table: str, rows: list, load_format: str, upload_mbps: float) -> int:
+    client = StubBigQueryClient(TABLE_SCHEMAS, upload_mbps)
+    job_config = bigquery.LoadJobConfig(write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE)
+    load_rows(client, rows, f"benchmark.climate_data.{table}", job_config, load_format).result()
+    return client.loads[0]['bytes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,10')
+    parser.add_argument('--upload-mbps', type=float, default=100.0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'input':<22}{'rows':>9}{'json bytes':>13}{'parquet bytes':>15}{'ratio':>8}"
+          f"{'json (s)':>10}{'parquet (s)':>13}")
+    for scale in (int(s) for s in args.scales.split(',')):
+        for label, load_rows, table, rows in build_cases(scale, rng):
+            sizes, timings = {}, {}
+            for load_format in ('json', 'parquet'):
+                sizes[load_format] = run_load(load_rows, table, rows, load_format, args.upload_mbps)
+                timings[load_format] = best_of(
+                    lambda: run_load(load_rows, table, rows, load_format, args.upload_mbps), args.repeat)
+            print(f"{label + ' x' + str(scale):<22}{len(rows):>9}{sizes['json']:>13}{sizes['parquet']:>15}"
+                  f"{sizes['json'] / sizes['parquet']:>7.1f}x{timings['json']:>10.3f}{timings['parquet']:>13.3f}")
+
+
+if __name__ == '__main__':
+    main()
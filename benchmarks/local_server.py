@@ -0,0 +1,243 @@
+"""
+Local HTTP stand-in for global-warming.org and data.giss.nasa.gov.
+
+Serves synthetic payloads with the same layout as the real APIs, or payloads
+recorded from the live sources, scaled up by a factor, from a background ThreadingHTTPServer. Responses carry an ETag and
+honour If-None-Match, so conditional fetches see 304s on unchanged data.
+point_sources_at() rewrites a function module's API_ENDPOINTS / DATA_SOURCES
+URLs to the local server.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from common import FIRST_YEAR, REAL_YEARS, synthetic_co2_records, synthetic_monthly_csv, synthetic_zonal_csv
+
+
+# URL path on the local server -> upstream origin it stands in for
+UPSTREAMS = {
+    '/api/temperature-api': 'https://global-warming.org',
+    '/api/co2-api': 'https://global-warming.org',
+    '/api/methane-api': 'https://global-warming.org',
+    '/api/nitrous-oxide-api': 'https://global-warming.org',
+    '/gistemp/tabledata_v4/GLB.Ts+dSST.csv': 'https://data.giss.nasa.gov',
+    '/gistemp/tabledata_v4/NH.Ts+dSST.csv': 'https://data.giss.nasa.gov',
+    '/gistemp/tabledata_v4/SH.Ts+dSST.csv': 'https://data.giss.nasa.gov',
+    '/gistemp/tabledata_v4/ZonAnn.Ts+dSST.csv': 'https://data.giss.nasa.gov',
+}
+
+YEAR_SHIFT = 200  # Years between copies when scaling recorded payloads
+_LEADING_YEAR = re.compile(r'^(\d{4})')
+
+
+def _content_type(path: str) -> str:
+    return 'text/csv' if path.endswith('.csv') else 'application/json'
+
+
+def synthetic_payloads(scale: int = 1, seed: int = 42) -> dict:
+    """Map of URL path to (content type, body bytes) for every upstream source."""
+    rng = random.Random(seed)
+
+    def monthly_concentrations(first_year: int, n: int) -> list:
+        # methane and nitrous-oxide dates are served as YYYY-M
+        return [{'date': f"{first_year + (i // 12) % 8000}-{i % 12 + 1}",
+                 'average': f"{rng.uniform(300, 1950):.2f}", 'trend': f"{rng.uniform(300, 1950):.2f}"}
+                for i in range(n)]
+
+    temperature = [{'time': f"{FIRST_YEAR + (i // 12) % 8000}.{(i % 12) * 833 + 417:04d}",
+                    'station': f"{rng.uniform(-1, 1.5):.2f}", 'land': f"{rng.uniform(-1, 1.5):.2f}"}
+                   for i in range(REAL_YEARS * 12 * scale)]
+    bodies = {
+        '/api/temperature-api': {'result': temperature},
+        '/api/co2-api': {'co2': synthetic_co2_records(4000 * scale, rng)},
+        '/api/methane-api': {'methane': monthly_concentrations(1983, 500 * scale)},
+        '/api/nitrous-oxide-api': {'nitrous': monthly_concentrations(2001, 280 * scale)},
+    }
+    served = {path: ('application/json', json.dumps(body).encode()) for path, body in bodies.items()}
+
+    for path in UPSTREAMS:
+        if path.endswith('ZonAnn.Ts+dSST.csv'):
+            served[path] = ('text/csv', synthetic_zonal_csv(REAL_YEARS * scale, rng).encode())
+        elif path.endswith('.csv'):
+            served[path] = ('text/csv', synthetic_monthly_csv(REAL_YEARS * scale, rng).encode())
+    return served
+
+
+def _shift_year(value, offset: int):
+    """Move the leading four-digit year of a value by offset, wrapping to stay within 1000-9999."""
+    text = str(value)
+    shifted = _LEADING_YEAR.sub(lambda m: str(1000 + (int(m.group(1)) - 1000 + offset) % 9000), text, count=1)
+    return shifted if isinstance(value, str) else type(value)(shifted)
+
+
+def scale_json(body: dict, scale: int) -> dict:
+    """Repeat every top-level array scale times, shifting the year fields of each copy."""
+    scaled = {}
+    for key, value in body.items():
+        if not isinstance(value, list):
+            scaled[key] = value
+            continue
+        scaled[key] = list(value)
+        for copy in range(1, scale):
+            offset = copy * YEAR_SHIFT
+            scaled[key].extend({k: _shift_year(v, offset) if k in ('time', 'date', 'year') else v
+                                for k, v in record.items()} for record in value)
+    return scaled
+
+
+def scale_csv(text: str, scale: int) -> str:
+    """Repeat the data lines of a GISTEMP table scale times, shifting the year column of each copy."""
+    lines = text.splitlines()
+    data = [i for i, line in enumerate(lines) if _LEADING_YEAR.match(line)]
+    if not data:
+        return text
+    head, rows, tail = lines[:data[0]], lines[data[0]:data[-1] + 1], lines[data[-1] + 1:]
+    scaled = list(rows)
+    for copy in range(1, scale):
+        scaled.extend(_shift_year(line, copy * YEAR_SHIFT) for line in rows if _LEADING_YEAR.match(line))
+    return '\n'.join(head + scaled + tail) + '\n'
+
+
+def recorded_payloads(directory: str, scale: int = 1) -> dict:
+    """
+    Load payloads saved by record_upstreams(), optionally scaled up.
+
+    Scaled copies are shifted YEAR_SHIFT years apart; years wrap within
+    1000-9999, so very large factors repeat some record IDs.
+    """
+    served = {}
+    for path in UPSTREAMS:
+        with open(os.path.join(directory, os.path.basename(path)), 'rb') as f:
+            body = f.read()
+        if scale > 1 and path.endswith('.csv'):
+            body = scale_csv(body.decode(), scale).encode()
+        elif scale > 1:
+            body = json.dumps(scale_json(json.loads(body), scale)).encode()
+        served[path] = (_content_type(path), body)
+    return served
+
+
+def record_upstreams(directory: str):
+    """Download every live upstream payload into directory, one file per source."""
+    import requests
+
+    os.makedirs(directory, exist_ok=True)
+    for path, origin in UPSTREAMS.items():
+        response = requests.get(origin + path, timeout=60)
+        response.raise_for_status()
+        with open(os.path.join(directory, os.path.basename(path)), 'wb') as f:
+            f.write(response.content)
+
+
+class Faults:
+    """
+    Failures injected by LocalUpstream.
+
+    Args:
+        error_rate: Probability that a request gets error_status
+        error_status: Status code of injected errors
+        slow_rate: Probability that a response is delayed by slow_latency
+        slow_latency: Extra seconds for slow responses (the latency tail)
+        down: Answer every request with error_status
+        seed: Seed of the random draws, for repeatable runs
+    """
+
+    def __init__(self, error_rate: float = 0, error_status: int = 503, slow_rate: float = 0,
+                 slow_latency: float = 0, down: bool = False, seed: int = 7):
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.down = down
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> tuple:
+        """Return (error status or None, extra delay in seconds) for one request."""
+        with self._lock:
+            failed = self.down or self._rng.random() < self.error_rate
+            slow = self._rng.random() < self.slow_rate
+        return (self.error_status if failed else None), (self.slow_latency if slow else 0)
+
+
+class LocalUpstream:
+    """
+    Background HTTP server for upstream payloads (synthetic unless given).
+
+    latency is added to every response and delays[path] to the responses
+    for one path; faults injects errors, a slow tail or a full outage (see
+    Faults) and can be swapped while the server runs.
+
+    Usage:
+        with LocalUpstream(scale=10) as upstream:
+            point_sources_at(module, upstream.base_url)
+    """
+
+    def __init__(self, scale: int = 1, payloads: dict = None, latency: float = 0, faults: Faults = None,
+                 delays: dict = None):
+        self.payloads = payloads if payloads is not None else synthetic_payloads(scale)
+        self.latency = latency  # Seconds added before every response
+        self.delays = delays or {}  # URL path -> seconds added before its responses
+        self.faults = faults or Faults()
+        self.requests = []
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                upstream.requests.append(self.path)
+                error_status, delay = upstream.faults.draw()
+                delay += upstream.delays.get(self.path, 0)
+                if upstream.latency or delay:
+                    time.sleep(upstream.latency + delay)
+                entry = upstream.payloads.get(self.path)
+                if entry is None or error_status:
+                    self.send_response(error_status or 404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                content_type, body = entry
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def point_sources_at(module, base_url: str):
+    """Rewrite the source URLs of a function module to base_url, keeping their paths."""
+    sources = getattr(module, 'API_ENDPOINTS', None) or getattr(module, 'DATA_SOURCES')
+    for config in sources.values():
+        config['url'] = base_url + urlsplit(config['url']).path
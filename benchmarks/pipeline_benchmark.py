@@ -0,0 +1,62 @@
+"""
+Critical-path benchmark for the pipelined GISTEMP ingestion.
+
+Serves the GISTEMP files from the local server with an added response
+latency and gives every stub BigQuery job a fixed completion latency, then
+times three ways of running the same four sources:
+
+  serial            - fetch_and_load_gistemp() per source, one after another
+                      (fetch, staging load and MERGE all on the critical path)
+  pipelined         - ingest_pipelined(batch_merge=False): downloads overlap
+                      the jobs of earlier sources, jobs serialized per table
+  pipelined+batch   - ingest_pipelined(batch_merge=True): one staging load and
+                      MERGE for the three monthly sources
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--http-latency 0.5] [--job-latency 1.0]
+"""
+
+import argparse
+import logging
+import time
+
+from common import load_function
+from local_server import LocalUpstream, point_sources_at
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--http-latency', type=float, default=0.5, help='Seconds added to every download')
+    parser.add_argument('--job-latency', type=float, default=1.0, help='Seconds every BigQuery job takes')
+    parser.add_argument('--scale', type=int, default=1, help='Payload scale factor')
+    args = parser.parse_args()
+
+    module = load_function('nasa-gistemp-ingest')
+    client = StubBigQueryClient(TABLE_SCHEMAS, job_latency=args.job_latency)
+
+    def serial():
+        for source_name, config in module.DATA_SOURCES.items():
+            module.fetch_and_load_gistemp(client, source_name, config)
+
+    runs = {
+        'serial': serial,
+        'pipelined': lambda: module.ingest_pipelined(client, module.DATA_SOURCES, batch_merge=False),
+        'pipelined+batch': lambda: module.ingest_pipelined(client, module.DATA_SOURCES, batch_merge=True),
+    }
+
+    with LocalUpstream(scale=args.scale, latency=args.http_latency) as upstream:
+        point_sources_at(module, upstream.base_url)
+        print(f"http latency {args.http_latency}s, job latency {args.job_latency}s, scale {args.scale}x")
+        print(f"{'mode':<18}{'seconds':>9}{'jobs':>6}")
+        for name, run in runs.items():
+            jobs_before = len(client.loads) + len(client.queries)
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<18}{elapsed:>9.2f}{len(client.loads) + len(client.queries) - jobs_before:>6}")
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    main()
@@ -0,0 +1,191 @@
+"""
+Benchmark: row dicts vs. RecordBatch for parsed and transformed records.
+
+Builds the same rows both ways with the functions' own code: as row dicts
+(the previous GISTEMP melt into dicts, and the previous per-record co2
+transform) and as a RecordBatch (parse_gistemp_csv() and
+connector.build_batch()). Inputs are the size of the real sources (1x) and
+100x.
+
+Reports the memory the rows retain (tracemalloc) and the best-of-N time of
+each stage that handles them:
+
+  build    parse/transform into rows
+  dedup    keep the last row per record_id, as replay and the sinks do
+  parquet  Arrow table for a Parquet load, typed by the table schema
+  json     newline-delimited JSON for a JSON load or streaming insert
+
+Checks that both representations hold the same rows (ignoring
+ingestion_timestamp); exits non-zero if not.
+
+Usage:
+    python benchmarks/record_batch_benchmark.py [--scales 1,100] [--repeat 3]
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import tracemalloc
+from datetime import datetime
+
+from common import REAL_YEARS, best_of, load_function, synthetic_co2_records, synthetic_monthly_csv, \
+    synthetic_zonal_csv
+from stub_bigquery import TABLE_SCHEMAS
+
+gistemp = load_function('nasa-gistemp-ingest')
+global_warming = load_function('global-warming-api-ingest')
+
+from connectors import parse_year_month_day  # noqa: E402  (on sys.path once the functions are loaded)
+from parquet_load import rows_to_arrow  # noqa: E402
+
+SOURCE_FILE = 'https://example.invalid/source.csv'
+
+
+def dict_rows_gistemp(csv_content: str, source_type: str, hemisphere: str = None) -> list:
+    """The previous GISTEMP melt: the same columns, one dict per row."""
+    header, columns = gistemp.read_gistemp_columns(csv_content)
+    years = gistemp.to_year_column(columns[header.index('Year')])
+    ingestion_time = datetime.utcnow().isoformat()
+
+    if source_type == 'zonal':
+        value_columns = [(name, gistemp.to_anomaly_column(col))
+                         for name, col in zip(header, columns) if name != 'Year']
+        keys = [(year, zone, values[i])
+                for i, year in enumerate(years) if year is not None
+                for zone, values in value_columns if values[i] is not None]
+        return [{
+            'year': year,
+            'zone': zone,
+            'temperature_anomaly': anomaly,
+            'record_id': record_id,
+            'ingestion_timestamp': ingestion_time,
+            'source_file': SOURCE_FILE
+        } for (year, zone, anomaly), record_id in zip(
+            keys, gistemp.generate_record_ids([k[1] for k in keys], [k[0] for k in keys])
+        )]
+
+    value_columns = [(month_idx, gistemp.to_anomaly_column(columns[header.index(month_name)]))
+                     for month_idx, month_name in enumerate(gistemp.MONTH_NAMES, 1) if month_name in header]
+    keys = [(year, month, values[i])
+            for i, year in enumerate(years) if year is not None and 1 <= year <= 9999
+            for month, values in value_columns if values[i] is not None]
+    record_ids = gistemp.generate_record_ids(hemisphere, [k[0] for k in keys], [k[1] for k in keys])
+    return [{
+        'year': year,
+        'month': month,
+        'temperature_anomaly': anomaly,
+        'measurement_date': f"{year:04d}-{month:02d}-01",
+        'record_id': record_id,
+        'ingestion_timestamp': ingestion_time,
+        'source_file': SOURCE_FILE,
+        'hemisphere': hemisphere
+    } for (year, month, anomaly), record_id in zip(keys, record_ids)]
+
+
+def dict_rows_co2(records: list) -> list:
+    """The previous co2 transform: one dict built per record, as the connector's mapping reads."""
+    ingestion_time = datetime.utcnow().isoformat()
+    rows = []
+    for record in records:
+        get = record.get
+        try:
+            measurement_date = parse_year_month_day(get('year'), get('month'), get('day'))
+        except Exception:
+            continue
+        if not measurement_date:
+            continue
+        try:
+            row = {
+                'record_id': hashlib.md5(('co2_' + str(get('year')) + '-' + str(get('month')) + '-'
+                                          + str(get('day'))).encode()).hexdigest(),
+                'measurement_date': measurement_date.isoformat(),
+                'ingestion_timestamp': ingestion_time,
+                'source_file': SOURCE_FILE,
+                'cycle': (float(v) if (v := get('cycle')) else None),
+                'trend': (float(v) if (v := get('trend')) else None),
+            }
+        except ValueError:
+            continue
+        rows.append(row)
+    return rows
+
+
+def build_cases(scale: int, rng: random.Random) -> list:
+    """(label, table, build dict rows, build a RecordBatch) per input."""
+    monthly = synthetic_monthly_csv(REAL_YEARS * scale, rng)
+    zonal = synthetic_zonal_csv(REAL_YEARS * scale, rng)
+    co2 = synthetic_co2_records(4000 * scale, rng)
+    connector = global_warming.API_ENDPOINTS['co2']['connector']
+    return [
+        ('gistemp monthly', 'raw_gistemp_global',
+         lambda: dict_rows_gistemp(monthly, 'monthly', 'Global'),
+         lambda: gistemp.parse_gistemp_csv(monthly, 'monthly', 'Global', SOURCE_FILE)),
+        ('gistemp zonal', 'raw_gistemp_zonal',
+         lambda: dict_rows_gistemp(zonal, 'zonal'),
+         lambda: gistemp.parse_gistemp_csv(zonal, 'zonal', source_file=SOURCE_FILE)),
+        ('gw co2', 'raw_gw_co2',
+         lambda: dict_rows_co2(co2),
+         lambda: connector.build_batch(co2, datetime.utcnow().isoformat(), SOURCE_FILE)),
+    ]
+
+
+def retained_bytes(build) -> tuple:
+    """Build rows under tracemalloc; returns (rows, bytes still allocated once built)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return rows, used
+
+
+def dedup_dicts(rows: list) -> list:
+    return list({row['record_id']: row for row in rows}.values())
+
+
+def to_ndjson(rows) -> int:
+    return sum(len(json.dumps(row)) + 1 for row in rows)
+
+
+def comparable(rows) -> list:
+    return [{k: v for k, v in row.items() if k != 'ingestion_timestamp'} for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,100')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    ok = True
+    print(f"{'input':<22}{'rows':>9}{'layout':>8}{'MB':>9}{'build s':>10}{'dedup s':>10}{'parquet s':>11}"
+          f"{'json s':>9}")
+    for scale in (int(s) for s in args.scales.split(',')):
+        for label, table, build_dicts, build_batch in build_cases(scale, rng):
+            schema = TABLE_SCHEMAS[table]
+            dicts, dict_bytes = retained_bytes(build_dicts)
+            batch, batch_bytes = retained_bytes(build_batch)
+            if comparable(dicts) != comparable(batch.iter_rows()):
+                print(f"FAILED: {label} x{scale}: RecordBatch rows differ from row dicts")
+                ok = False
+
+            layouts = [
+                ('dicts', dicts, dict_bytes, build_dicts, lambda: dedup_dicts(dicts)),
+                ('batch', batch, batch_bytes, build_batch, lambda: batch.unique('record_id')),
+            ]
+            for layout, rows, used, build, dedup in layouts:
+                timings = [best_of(fn, args.repeat) for fn in (
+                    build, dedup, lambda: rows_to_arrow(rows, schema), lambda: to_ndjson(rows))]
+                print(f"{label + ' x' + str(scale):<22}{len(rows):>9}{layout:>8}{used / 2 ** 20:>9.1f}"
+                      + ''.join(f"{t:>{w}.3f}" for t, w in zip(timings, (10, 10, 11, 9))))
+            del dicts, batch
+
+    print('rows match' if ok else 'MISMATCH')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Backfill benchmark for snapshot archives and replay.py.
+
+Archives --vintages synthetic snapshots of every upstream source (each
+vintage generated with a different seed, at --scale) into a temporary local
+snapshot archive, then times a dry-run replay of the whole archive with each
+--workers count. Reported per function:
+
+  archive   - raw and compressed bytes of the archived objects
+  replay    - seconds, rows parsed and rows/s per worker count
+
+Each function runs in its own process because both replay modules import
+their function's main.py as 'main'.
+
+Usage:
+    python benchmarks/replay_benchmark.py [--vintages 8] [--scale 10] [--workers 1,2,4]
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from common import load_function
+from local_server import synthetic_payloads
+
+FUNCTIONS = {
+    'global-warming-api-ingest': 'API_ENDPOINTS',
+    'nasa-gistemp-ingest': 'DATA_SOURCES',
+}
+
+
+def build_archive(sources: dict, directory: str, vintages: int, scale: int) -> tuple:
+    """Archive every source once per vintage; returns (raw bytes, compressed bytes)."""
+    from snapshot_archive import create_snapshot_archive
+
+    archive = create_snapshot_archive(directory)
+    raw = compressed = 0
+    for vintage in range(vintages):
+        payloads = synthetic_payloads(scale, seed=vintage)
+        for name, config in sources.items():
+            _, body = payloads[urlsplit(config['url']).path]
+            entry = archive.save(name, config['url'], body)
+            raw += entry['bytes']
+            compressed += entry['compressed_bytes']
+    return raw, compressed
+
+
+def child(function: str, vintages: int, scale: int, workers: list):
+    module = load_function(function)
+    import replay
+    from metrics import RunMetrics
+
+    sources = getattr(module, FUNCTIONS[function])
+    with tempfile.TemporaryDirectory() as directory:
+        raw, compressed = build_archive(sources, directory, vintages, scale)
+        print(f"{function}: {vintages * len(sources)} snapshots, {raw / 1e6:.1f} MB raw, "
+              f"{compressed / 1e6:.1f} MB compressed ({raw / compressed:.1f}x)")
+        print(f"  {'workers':>8}{'seconds':>9}{'rows':>10}{'rows/s':>10}")
+        for count in workers:
+            start = time.perf_counter()
+            run_metrics = RunMetrics('replay-benchmark')
+            replay.replay(directory, workers=count, dry_run=True, run_metrics=run_metrics)
+            elapsed = time.perf_counter() - start
+            rows = sum(source.get('rows_parsed', 0) for source in run_metrics.as_dict()['sources'].values())
+            print(f"  {count:>8}{elapsed:>9.2f}{rows:>10}{rows / elapsed:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vintages', type=int, default=8, help='Snapshots archived per source')
+    parser.add_argument('--scale', type=int, default=10, help='Payload scale factor')
+    parser.add_argument('--workers', default=f"1,{os.cpu_count()}", help='Comma-separated worker counts')
+    parser.add_argument('--function', choices=sorted(FUNCTIONS), help='Benchmark a single function')
+    args = parser.parse_args()
+
+    workers = sorted({int(w) for w in args.workers.split(',')})
+    if args.function:
+        child(args.function, args.vintages, args.scale, workers)
+        return
+
+    print(f"CPUs: {os.cpu_count()}")
+    for function in sorted(FUNCTIONS):
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--function', function,
+                        '--vintages', str(args.vintages), '--scale', str(args.scale),
+                        '--workers', ','.join(map(str, workers))], check=True)
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    main()
@@ -0,0 +1,306 @@
+"""
+Load test of the Climate Series API against a local data stand-in.
+
+The service (src/cloud-run/climate-series-api) runs behind a threaded local
+WSGI server. Its BigQuery loader is replaced by a stand-in serving synthetic
+series of the real sizes (daily CO2 since 2013, monthly series since 1880 or
+1983) after --query-ms of simulated query latency.
+
+--clients threads send --requests requests each over keep-alive sessions: a
+mix of whole series, 10-year ranges and downsampled (max_points=200)
+queries. Half the clients revalidate with If-None-Match, as browsers do when
+a chart is reloaded. After every --invalidate-every requests in total, one
+table gets a new vintage (one revised value and one new point) and the
+ingest functions' invalidate_series_cache() is posted for it, as after an
+ingest run.
+
+Configurations:
+  bigquery direct  every request queries the stand-in, as charts do today
+  cached           the service as deployed: in-memory series, ETags, response cache
+
+Reports requests/s, latency percentiles, the share of 304s and the queries
+that reached the stand-in, then the memory of the cached arrays against the
+same points as row dicts. Finally checks that whole, range and downsampled
+responses match the stand-in's current data and that ETags change exactly
+when the data does; exits non-zero if not.
+
+Usage:
+    python benchmarks/series_cache_benchmark.py [--clients 16] [--requests 200] [--query-ms 400]
+"""
+
+import argparse
+import logging
+import math
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, timedelta
+
+import flask
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from common import FIRST_YEAR, SERVICES_DIR, load_function
+from tail_latency_benchmark import percentile
+
+SIZES = {  # First date and step of each synthetic series, by table
+    'raw_gistemp_global': (date(FIRST_YEAR, 1, 1), 'month'),
+    'raw_gw_temperature': (date(FIRST_YEAR, 1, 1), 'month'),
+    'raw_gw_co2': (date(2013, 1, 1), 'day'),
+    'raw_gw_methane': (date(1983, 7, 1), 'month'),
+    'raw_gw_nitrous_oxide': (date(2001, 1, 1), 'month'),
+}
+LAST_DATE = date(2024, 12, 31)
+
+
+def next_date(day: date, step: str) -> date:
+    if step == 'day':
+        return day + timedelta(days=1)
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+class DataStandIn:
+    """Synthetic series by name, revised and extended per table vintage, with simulated query latency."""
+
+    def __init__(self, series: dict, query_seconds: float):
+        self.series = series
+        self.query_seconds = query_seconds
+        self.vintages = Counter()
+        self.queries = 0
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def rows(self, name: str) -> list:
+        table = self.series[name]['table']
+        key = (name, self.vintages[table])
+        with self._lock:
+            if key not in self._rows:
+                first, step = SIZES[table]
+                rng = random.Random(name)
+                rows, day = [], first
+                while day <= LAST_DATE + timedelta(days=31 * key[1]):
+                    rows.append((day, None if rng.random() < 0.01 else round(rng.uniform(-1, 1.5), 3)))
+                    day = next_date(day, step)
+                if key[1]:
+                    rows[-2] = (rows[-2][0], round(random.Random(str(key)).uniform(-1, 1.5), 3))
+                self._rows[key] = rows
+            return self._rows[key]
+
+    def load(self, name: str) -> list:
+        with self._lock:
+            self.queries += 1
+        time.sleep(self.query_seconds)
+        return self.rows(name)
+
+    def new_vintage(self, table: str):
+        with self._lock:
+            self.vintages[table] += 1
+
+
+class DirectStore:
+    """Store stand-in without a cache: every read queries the loader."""
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def get(self, name: str):
+        from series_store import Series
+
+        return Series(name, self._loader(name), 0)
+
+    def cached(self, name: str):
+        return None
+
+    def invalidate(self, names=None) -> list:
+        return []
+
+
+class Handler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep client connections alive
+
+
+def serve(service):
+    """Serve the service's entry point on a free local port; returns (server, base URL)."""
+    app = flask.Flask('climate-series-api')
+
+    @app.route('/', defaults={'path': ''}, methods=['GET', 'POST'])
+    @app.route('/<path:path>', methods=['GET', 'POST'])
+    def handle(path):
+        return service.serve_climate_series(flask.request)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def random_query(names: list, rng: random.Random) -> tuple:
+    name = rng.choice(names)
+    kind = rng.random()
+    if kind < 0.4:
+        return name, {}
+    if kind < 0.7:
+        start = rng.randint(FIRST_YEAR, 2014)
+        return name, {'start': f"{start}-01-01", 'end': f"{start + 9}-12-31"}
+    return name, {'max_points': '200'}
+
+
+def run_load(service, base_url: str, stand_in: DataStandIn, args) -> dict:
+    """Run the client threads against the service; returns latencies and status counts."""
+    from series_cache import invalidate_series_cache
+
+    names = list(service.SERIES)
+    tables = sorted({config['table'] for config in service.SERIES.values()})
+    latencies, statuses = [], Counter()
+    sent = [0]
+    lock = threading.Lock()
+    invalidations = []
+
+    def client(index: int):
+        rng = random.Random(index)
+        session = requests.Session()
+        etags = {}
+        revalidate = index % 2 == 0
+        for _ in range(args.requests):
+            name, params = random_query(names, rng)
+            key = (name, tuple(sorted(params.items())))
+            headers = {'If-None-Match': etags[key]} if revalidate and key in etags else {}
+            start = time.perf_counter()
+            response = session.get(f"{base_url}/series/{name}", params=params, headers=headers, timeout=60)
+            elapsed = time.perf_counter() - start
+            if response.headers.get('ETag'):
+                etags[key] = response.headers['ETag']
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+                sent[0] += 1
+                due = sent[0] % args.invalidate_every == 0
+            if due:
+                table = tables[len(invalidations) % len(tables)]
+                stand_in.new_vintage(table)
+                invalidations.append(invalidate_series_cache(base_url, [table]))
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'seconds': time.perf_counter() - began, 'latencies': latencies, 'statuses': statuses,
+            'invalidations': invalidations}
+
+
+def row_dict_bytes(stand_in: DataStandIn, names: list) -> int:
+    """Bytes of the same points held as row dicts, as BigQuery rows converted with dict()."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = [[{'measurement_date': day, 'value': value} for day, value in stand_in.rows(name)] for name in names]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del rows
+    return used
+
+
+def check_responses(service, base_url: str, stand_in: DataStandIn) -> list:
+    """Compare responses with the stand-in's data; returns the failed checks."""
+    from series_cache import invalidate_series_cache
+
+    failures = []
+    session = requests.Session()
+    name = 'gw_co2_trend'
+    rows = stand_in.rows(name)
+
+    whole = session.get(f"{base_url}/series/{name}").json()
+    expected = [value for _, value in rows]
+    if whole['dates'] != [day.isoformat() for day, _ in rows] or whole['values'] != expected:
+        failures.append('whole series differs from the stand-in')
+
+    ranged = session.get(f"{base_url}/series/{name}", params={'start': '2015-03-01', 'end': '2016-02-29'}).json()
+    in_range = [(day.isoformat(), value) for day, value in rows if date(2015, 3, 1) <= day <= date(2016, 2, 29)]
+    if list(zip(ranged['dates'], ranged['values'])) != in_range:
+        failures.append('range query differs from the stand-in')
+
+    sampled = session.get(f"{base_url}/series/{name}", params={'max_points': '100'}).json()
+    first_bucket = [value for _, value in rows[:len(rows) // 100] if value is not None]
+    if sampled['points'] != 100 or not sampled['downsampled'] or \
+            not math.isclose(sampled['values'][0], math.fsum(first_bucket) / len(first_bucket)):
+        failures.append('downsampled query differs from bucket means of the stand-in')
+
+    response = session.get(f"{base_url}/series/{name}")
+    etag = response.headers['ETag']
+    if session.get(f"{base_url}/series/{name}", headers={'If-None-Match': etag}).status_code != 304:
+        failures.append('current ETag not answered with 304')
+    invalidate_series_cache(base_url, ['raw_gw_co2'])
+    if session.get(f"{base_url}/series/{name}", headers={'If-None-Match': etag}).status_code != 304:
+        failures.append('ETag changed after an invalidation without new data')
+    stand_in.new_vintage('raw_gw_co2')
+    invalidate_series_cache(base_url, ['raw_gw_co2'])
+    response = session.get(f"{base_url}/series/{name}", headers={'If-None-Match': etag})
+    if response.status_code != 200 or response.headers['ETag'] == etag:
+        failures.append('ETag unchanged after new data was invalidated')
+    if response.status_code == 200 and response.json()['values'] != [v for _, v in stand_in.rows(name)]:
+        failures.append('series not reloaded after invalidation')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per client')
+    parser.add_argument('--query-ms', type=float, default=400, help='Simulated BigQuery query latency')
+    parser.add_argument('--invalidate-every', type=int, default=500, help='Requests between ingest runs')
+    args = parser.parse_args()
+
+    service = load_function('climate-series-api', base=SERVICES_DIR)
+    from series_store import ResponseCache, SeriesStore
+
+    load_function('global-warming-api-ingest')  # For series_cache, posted as the ingest functions do
+
+    configs = {
+        'bigquery direct': lambda loader: (DirectStore(loader), ResponseCache(0)),
+        'cached': lambda loader: (SeriesStore(loader, service.SERIES_TTL_SECONDS),
+                                  ResponseCache(service.RESPONSE_CACHE_SIZE)),
+    }
+    print(f"{args.clients} clients x {args.requests} requests, {args.query_ms:.0f} ms per query, "
+          f"an ingest run every {args.invalidate_every} requests")
+    print(f"{'config':<18}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'304s':>7}{'queries':>9}"
+          f"{'invalidations':>15}")
+    ok = True
+    for label, create in configs.items():
+        stand_in = DataStandIn(service.SERIES, args.query_ms / 1000)
+        service.STORE, service.RESPONSES = create(stand_in.load)
+        server, base_url = serve(service)
+        try:
+            result = run_load(service, base_url, stand_in, args)
+            latencies, statuses = result['latencies'], result['statuses']
+            invalidated = f"{sum(result['invalidations'])}/{len(result['invalidations'])}"
+            ok &= set(statuses) <= {200, 304}
+            print(f"{label:<18}{len(latencies) / result['seconds']:>9.0f}"
+                  f"{percentile(latencies, 50) * 1000:>9.1f}{percentile(latencies, 95) * 1000:>9.1f}"
+                  f"{percentile(latencies, 99) * 1000:>9.1f}{statuses[304] / len(latencies):>7.0%}"
+                  f"{stand_in.queries:>9}{invalidated:>15}"
+                  + ('' if set(statuses) <= {200, 304} else f"  unexpected statuses {dict(statuses)}"))
+
+            if label == 'cached':
+                names = list(service.SERIES)
+                for name in names:
+                    service.STORE.get(name)
+                points = sum(len(service.STORE.cached(name)) for name in names)
+                print(f"\n{points} points cached: {service.STORE.nbytes() / 1024:.0f} KB as arrays, "
+                      f"{row_dict_bytes(stand_in, names) / 1024:.0f} KB as row dicts")
+                failures = check_responses(service, base_url, stand_in)
+                for failure in failures:
+                    print(f"FAILED: {failure}")
+                ok &= not failures
+        finally:
+            server.shutdown()
+
+    print('responses match the stand-in' if ok else 'MISMATCH')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    main()
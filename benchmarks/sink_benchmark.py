@@ -0,0 +1,108 @@
+"""
+Load-job sink versus streaming sink for frequent small runs.
+
+Simulates a sub-hourly schedule of the daily CO2 endpoint: the local server
+serves --history days of records, and every later run adds one new day.
+Every BigQuery job takes --job-latency seconds, standing in for load-job
+queueing, and every streaming insert request takes --insert-latency
+seconds. A share of insert requests (--insert-failure-rate) store their rows
+and then fail, as when the response is lost, so the sink has to retry with
+the same insertIds.
+
+Reported per sink and run: wall seconds, load jobs (which count against the
+daily per-table load job quota), query jobs (watermark, MERGE and the
+streaming sink's record_id lookup), insert requests and rows sent. For the streaming sink, the stored row count is then checked
+against the number of distinct record_ids, which shows exactly-once
+delivery. The same check is run on the GISTEMP monthly sources.
+
+Usage:
+    python benchmarks/sink_benchmark.py [--runs 4] [--job-latency 2.0] [--insert-latency 0.05]
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+from datetime import date, timedelta
+
+from common import load_function
+from local_server import LocalUpstream, point_sources_at
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+
+def daily_co2_records(n_days: int, rng: random.Random) -> list:
+    """Consecutive daily records in the co2-api layout, one per date so record_ids are distinct."""
+    first = date(2013, 1, 1)
+    return [{
+        'year': str(day.year),
+        'month': str(day.month),
+        'day': str(day.day),
+        'cycle': f"{rng.uniform(390, 425):.2f}",
+        'trend': f"{rng.uniform(390, 425):.2f}",
+    } for day in (first + timedelta(days=i) for i in range(n_days))]
+
+
+def co2_payload(records: list) -> tuple:
+    return 'application/json', json.dumps({'co2': records}).encode()
+
+
+def run_co2(module, sink: str, args, records: list) -> StubBigQueryClient:
+    module.WRITE_SINK = sink
+    client = StubBigQueryClient(TABLE_SCHEMAS, job_latency=args.job_latency, insert_latency=args.insert_latency,
+                                insert_failure_rate=args.insert_failure_rate)
+    config = module.API_ENDPOINTS['co2']
+    with LocalUpstream(payloads={}) as upstream:
+        point_sources_at(module, upstream.base_url)
+        for run in range(args.runs):
+            upstream.payloads['/api/co2-api'] = co2_payload(records[:args.history + run])
+            loads, queries, inserts = len(client.loads), len(client.queries), len(client.inserts)
+            start = time.perf_counter()
+            module.fetch_and_load_endpoint(client, 'co2', config)
+            elapsed = time.perf_counter() - start
+            print(f"{sink:<10}{run + 1:>5}{elapsed:>9.2f}{len(client.loads) - loads:>7}{len(client.queries) - queries:>9}"
+                  f"{len(client.inserts) - inserts:>9}{sum(client.inserts[inserts:]):>10}")
+    return client
+
+
+def check_exactly_once(name: str, client: StubBigQueryClient, expected: int):
+    stored = sum(len(rows) for rows in client.streamed.values())
+    sent = sum(client.inserts)
+    verdict = 'OK' if stored == expected else 'MISMATCH'
+    print(f"{name}: {sent} rows sent, {stored} stored, {expected} distinct record_ids - {verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=4, help='Scheduled runs to simulate')
+    parser.add_argument('--history', type=int, default=2000, help='Days served by the first run')
+    parser.add_argument('--job-latency', type=float, default=2.0, help='Seconds every BigQuery job takes')
+    parser.add_argument('--insert-latency', type=float, default=0.05, help='Seconds every insert request takes')
+    parser.add_argument('--insert-failure-rate', type=float, default=0.1, help='Share of inserts whose response is lost')
+    args = parser.parse_args()
+
+    gw = load_function('global-warming-api-ingest')
+    gw.STREAM_JSON = False
+    records = daily_co2_records(args.history + args.runs, random.Random(1))
+
+    print(f"job latency {args.job_latency}s, insert latency {args.insert_latency}s, "
+          f"{args.insert_failure_rate:.0%} lost insert responses")
+    print(f"{'sink':<10}{'run':>5}{'seconds':>9}{'loads':>7}{'queries':>9}{'inserts':>9}{'rows sent':>10}")
+    run_co2(gw, 'load_job', args, records)
+    client = run_co2(gw, 'streaming', args, records)
+    check_exactly_once('co2 streaming', client, args.history + args.runs - 1)
+
+    gistemp = load_function('nasa-gistemp-ingest')
+    gistemp.WRITE_SINK = 'streaming'
+    client = StubBigQueryClient(TABLE_SCHEMAS, insert_failure_rate=args.insert_failure_rate)
+    monthly = {name: config for name, config in gistemp.DATA_SOURCES.items() if name != 'zonal'}
+    with LocalUpstream() as upstream:
+        point_sources_at(gistemp, upstream.base_url)
+        for _ in range(2):
+            results = gistemp.ingest_pipelined(client, monthly)
+    check_exactly_once('GISTEMP streaming, 2 runs', client, sum(r['records'] for r in results.values()))
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    main()
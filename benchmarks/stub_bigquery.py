@@ -0,0 +1,197 @@
+"""
+Local stand-in for google.cloud.bigquery.Client used by the benchmarks.
+
+StubBigQueryClient subclasses the real client so load_table_from_json goes
+through the library's own NDJSON serialization; only the network-facing
+calls are replaced. Uploaded bytes, load calls and queries are recorded.
+
+Streaming inserts are kept per table and de-duplicated by insertId like the
+real API, and the sinks' record_id lookup query is answered from them, so
+the streaming sink's exactly-once behaviour can be checked offline. The
+watermark query is answered from the watermarks a benchmark sets per table.
+"""
+
+import random
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import bigquery
+
+
+class StubJob:
+    """
+    Job with the statistics attributes the functions read.
+
+    The job completes latency seconds after it is created; result() blocks
+    until then, or raises TimeoutError if its timeout is shorter.
+    """
+
+    def __init__(self, job_type: str, rows=None, total_bytes_processed: int = 0, input_file_bytes: int = None,
+                 latency: float = 0):
+        self.job_type = job_type
+        self.job_id = f"stub_{job_type}_{id(self)}"
+        self.state = 'DONE'
+        self.error_result = None
+        self.output_rows = None
+        self.total_bytes_processed = total_bytes_processed
+        self.slot_millis = 0
+        self.input_file_bytes = input_file_bytes
+        self._rows = rows or []
+        self._ready = time.monotonic() + latency
+
+    def result(self, timeout=None, **kwargs):
+        wait = self._ready - time.monotonic()
+        if wait > 0:
+            if timeout is not None and timeout < wait:
+                time.sleep(timeout)
+                raise TimeoutError(f"{self.job_id} did not finish within {timeout:.1f}s")
+            time.sleep(wait)
+        return self
+
+    def done(self, *args, **kwargs):
+        return time.monotonic() >= self._ready
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class StubBigQueryClient(bigquery.Client):
+    """
+    BigQuery client that records calls instead of contacting the API.
+
+    Args:
+        schemas: Map of table name (last component of the table ID) to schema
+        upload_mbps: Simulated upload bandwidth; 0 disables the delay
+        job_latency: Seconds each load or query job takes to complete
+        insert_latency: Seconds each streaming insert request takes
+        insert_failure_rate: Share of streaming insert requests that store
+            their rows but then fail, as when the response is lost
+    """
+
+    def __init__(self, schemas: dict = None, upload_mbps: float = 0, project: str = 'benchmark',
+                 job_latency: float = 0, insert_latency: float = 0, insert_failure_rate: float = 0,
+                 seed: int = 7):
+        super().__init__(project=project, credentials=AnonymousCredentials())
+        self.schemas = schemas or {}
+        self.upload_mbps = upload_mbps
+        self.job_latency = job_latency
+        self.insert_latency = insert_latency
+        self.insert_failure_rate = insert_failure_rate
+        self.loads = []
+        self.queries = []
+        self.deleted = []
+        self.inserts = []  # Rows per streaming insert request
+        self.streamed = {}  # Table name -> insertId -> row
+        self.watermarks = {}  # Table name -> {'measurement_date': date, 'record_id': str}
+        self._rng = random.Random(seed)
+
+    def _table_name(self, table) -> str:
+        return str(table).split('.')[-1].split('_temp_')[0]
+
+    def get_table(self, table, *args, **kwargs):
+        table_ref = str(table)
+        if table_ref.count('.') == 1:
+            table_ref = f"{self.project}.{table_ref}"
+        return bigquery.Table(table_ref, schema=self.schemas.get(self._table_name(table), []))
+
+    def load_table_from_file(self, file_obj, destination, rewind=False, job_config=None, **kwargs):
+        if rewind:
+            file_obj.seek(0)
+        payload = file_obj.read()
+        if self.upload_mbps:
+            time.sleep(len(payload) * 8 / (self.upload_mbps * 1_000_000))
+        self.loads.append({
+            'table': str(destination),
+            'bytes': len(payload),
+            'payload': payload,
+            'source_format': job_config.source_format if job_config else None,
+        })
+        return StubJob('load', input_file_bytes=len(payload), latency=self.job_latency)
+
+    def query(self, query, job_config=None, **kwargs):
+        self.queries.append(query)
+        rows = []
+        if 'IN UNNEST(@record_ids)' in query:
+            params = {p.name: p for p in job_config.query_parameters}
+            stored = self.streamed.get(self._table_name(query.split('`')[1]), {})
+            rows = [stored[record_id] for record_id in params['record_ids'].values if record_id in stored]
+        elif 'ORDER BY measurement_date DESC' in query:
+            watermark = self.watermarks.get(self._table_name(query.split('`')[1]))
+            rows = [watermark] if watermark else []
+        return StubJob('query', rows=rows, latency=self.job_latency)
+
+    def insert_rows_json(self, table, json_rows, row_ids=None, timeout=None, **kwargs):
+        if self.insert_latency:
+            time.sleep(self.insert_latency)
+        self.inserts.append(len(json_rows))
+        stored = self.streamed.setdefault(self._table_name(table), {})
+        for row_id, row in zip(row_ids, json_rows):
+            stored.setdefault(row_id, dict(row))  # Repeated insertIds are dropped
+        if self._rng.random() < self.insert_failure_rate:
+            raise ConnectionError('Response lost after the rows were stored')
+        return []
+
+    def delete_table(self, table, not_found_ok=False, **kwargs):
+        self.deleted.append(str(table))
+
+
+def schema(*fields) -> list:
+    """Build a schema from (name, type, mode) tuples."""
+    return [bigquery.SchemaField(name, field_type, mode=mode) for name, field_type, mode in fields]
+
+
+SUMMARY_COLUMNS = (('record_id', 'STRING', 'REQUIRED'), ('updated_at', 'TIMESTAMP', 'REQUIRED'))
+ANNUAL_SUMMARY = (
+    ('series', 'STRING', 'REQUIRED'), ('year', 'INT64', 'REQUIRED'), ('measurement_date', 'DATE', 'REQUIRED'),
+    ('mean_value', 'FLOAT64', 'REQUIRED'), ('months', 'INT64', 'REQUIRED'),
+) + SUMMARY_COLUMNS
+ROLLING_SUMMARY = (
+    ('series', 'STRING', 'REQUIRED'), ('measurement_date', 'DATE', 'REQUIRED'),
+    ('monthly_value', 'FLOAT64', 'REQUIRED'), ('rolling_mean', 'FLOAT64', 'NULLABLE'),
+    ('window_months', 'INT64', 'REQUIRED'),
+) + SUMMARY_COLUMNS
+YOY_SUMMARY = (
+    ('series', 'STRING', 'REQUIRED'), ('measurement_date', 'DATE', 'REQUIRED'),
+    ('monthly_value', 'FLOAT64', 'REQUIRED'), ('previous_year_value', 'FLOAT64', 'NULLABLE'),
+    ('yoy_change', 'FLOAT64', 'NULLABLE'), ('yoy_change_pct', 'FLOAT64', 'NULLABLE'),
+) + SUMMARY_COLUMNS
+
+# Mirrors infrastructure/terraform/modules/climate-data/bigquery/main.tf
+TABLE_SCHEMAS = {
+    'raw_gistemp_global': schema(
+        ('year', 'INT64', 'REQUIRED'), ('month', 'INT64', 'REQUIRED'),
+        ('temperature_anomaly', 'FLOAT64', 'NULLABLE'), ('measurement_date', 'DATE', 'REQUIRED'),
+        ('record_id', 'STRING', 'REQUIRED'), ('ingestion_timestamp', 'TIMESTAMP', 'REQUIRED'),
+        ('source_file', 'STRING', 'NULLABLE'), ('hemisphere', 'STRING', 'REQUIRED'),
+    ),
+    'raw_gistemp_zonal': schema(
+        ('year', 'INT64', 'REQUIRED'), ('zone', 'STRING', 'REQUIRED'),
+        ('temperature_anomaly', 'FLOAT64', 'NULLABLE'), ('record_id', 'STRING', 'REQUIRED'),
+        ('ingestion_timestamp', 'TIMESTAMP', 'REQUIRED'), ('source_file', 'STRING', 'NULLABLE'),
+    ),
+    'raw_gw_temperature': schema(
+        ('record_id', 'STRING', 'REQUIRED'), ('measurement_date', 'DATE', 'REQUIRED'),
+        ('land', 'FLOAT64', 'NULLABLE'), ('station', 'FLOAT64', 'NULLABLE'), ('time', 'STRING', 'NULLABLE'),
+        ('ingestion_timestamp', 'TIMESTAMP', 'REQUIRED'), ('source_file', 'STRING', 'NULLABLE'),
+    ),
+    'raw_gw_co2': schema(
+        ('record_id', 'STRING', 'REQUIRED'), ('measurement_date', 'DATE', 'REQUIRED'),
+        ('cycle', 'FLOAT64', 'NULLABLE'), ('trend', 'FLOAT64', 'NULLABLE'),
+        ('ingestion_timestamp', 'TIMESTAMP', 'REQUIRED'), ('source_file', 'STRING', 'NULLABLE'),
+    ),
+    'raw_gw_methane': schema(
+        ('record_id', 'STRING', 'REQUIRED'), ('measurement_date', 'DATE', 'REQUIRED'),
+        ('average', 'FLOAT64', 'NULLABLE'), ('trend', 'FLOAT64', 'NULLABLE'),
+        ('ingestion_timestamp', 'TIMESTAMP', 'REQUIRED'), ('source_file', 'STRING', 'NULLABLE'),
+    ),
+    'raw_gw_nitrous_oxide': schema(
+        ('record_id', 'STRING', 'REQUIRED'), ('measurement_date', 'DATE', 'REQUIRED'),
+        ('average', 'FLOAT64', 'NULLABLE'), ('trend', 'FLOAT64', 'NULLABLE'),
+        ('ingestion_timestamp', 'TIMESTAMP', 'REQUIRED'), ('source_file', 'STRING', 'NULLABLE'),
+    ),
+    'agg_gistemp_annual': schema(*ANNUAL_SUMMARY),
+    'agg_gistemp_rolling_12m': schema(*ROLLING_SUMMARY),
+    'agg_gw_annual': schema(*ANNUAL_SUMMARY),
+    'agg_gw_rolling_12m': schema(*ROLLING_SUMMARY),
+    'agg_gw_yoy_growth': schema(*YOY_SUMMARY),
+}
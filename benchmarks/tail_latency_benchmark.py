@@ -0,0 +1,105 @@
+"""
+Tail-latency benchmark for the http_fetch layer.
+
+Downloads one GISTEMP file repeatedly from the local server while it injects
+faults, comparing a plain session.get() with Fetcher configurations:
+
+  flaky upstream  - error_rate of 503s and a slow_rate tail of slow_latency
+                    seconds; reports success rate and latency percentiles
+  outage          - every request fails; reports how long a run of fetches
+                    takes and how many requests reach the host, with and
+                    without the circuit breaker
+
+Backoff is scaled down (--backoff-base) so the benchmark stays short.
+
+Usage:
+    python benchmarks/tail_latency_benchmark.py [--requests 200] [--error-rate 0.1] [--slow-rate 0.05]
+"""
+
+import argparse
+import logging
+import random
+import statistics
+import time
+
+from common import load_function
+from local_server import Faults, LocalUpstream
+
+PATH = '/gistemp/tabledata_v4/GLB.Ts+dSST.csv'
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_fetches(get, url: str, count: int) -> tuple:
+    """Call get(url) count times; return (latencies of all calls, number of 200 responses)."""
+    latencies, successes = [], 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            response = get(url)
+            successes += response.status_code == 200
+        except Exception:
+            pass
+        latencies.append(time.perf_counter() - start)
+    return latencies, successes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='Fetches per configuration')
+    parser.add_argument('--error-rate', type=float, default=0.1, help='Share of requests answered with 503')
+    parser.add_argument('--slow-rate', type=float, default=0.05, help='Share of requests delayed')
+    parser.add_argument('--slow-latency', type=float, default=1.0, help='Delay of slow requests in seconds')
+    parser.add_argument('--backoff-base', type=float, default=0.02, help='Fetcher backoff base in seconds')
+    args = parser.parse_args()
+
+    load_function('nasa-gistemp-ingest')  # Puts the function's modules on sys.path
+    import http_fetch
+    from runtime import get_http_session
+
+    session = get_http_session()
+
+    def fetcher(**kwargs):
+        return http_fetch.Fetcher(session, backoff_base=args.backoff_base, rng=random.Random(1), **kwargs)
+
+    configs = {
+        'session.get': lambda url: session.get(url, timeout=30),
+        'retries': fetcher(retries=3).get,
+        'retries+hedge p90': fetcher(retries=3, hedge_percentile=90, hedge_min_delay=0.02).get,
+    }
+
+    faults = Faults(error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    with LocalUpstream(faults=faults) as upstream:
+        url = upstream.base_url + PATH
+        print(f"flaky upstream: {args.error_rate:.0%} errors, {args.slow_rate:.0%} delayed "
+              f"{args.slow_latency}s, {args.requests} fetches")
+        print(f"{'config':<20}{'success':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'requests':>10}")
+        for name, get in configs.items():
+            http_fetch.reset_host_state()
+            upstream.faults = Faults(error_rate=args.error_rate, slow_rate=args.slow_rate,
+                                     slow_latency=args.slow_latency)
+            served_before = len(upstream.requests)
+            latencies, successes = run_fetches(get, url, args.requests)
+            print(f"{name:<20}{successes / args.requests:>9.1%}"
+                  f"{statistics.median(latencies) * 1000:>9.1f}{percentile(latencies, 95) * 1000:>9.1f}"
+                  f"{percentile(latencies, 99) * 1000:>9.1f}{max(latencies) * 1000:>9.1f}"
+                  f"{len(upstream.requests) - served_before:>10}")
+
+        outage_fetches = 20
+        print(f"\noutage: every request fails, {outage_fetches} fetches")
+        print(f"{'config':<20}{'seconds':>9}{'requests':>10}")
+        upstream.faults = Faults(down=True)
+        for name, get in (('retries, no breaker', fetcher(retries=3, breaker_threshold=10 ** 9).get),
+                          ('retries + breaker', fetcher(retries=3, breaker_threshold=5).get)):
+            http_fetch.reset_host_state()
+            served_before = len(upstream.requests)
+            latencies, _ = run_fetches(get, url, outage_fetches)
+            print(f"{name:<20}{sum(latencies):>9.2f}{len(upstream.requests) - served_before:>10}")
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    main()
@@ -165,6 +165,7 @@ module "security" {
         "roles/run.invoker",
         "roles/pubsub.publisher",
         "roles/bigquery.dataViewer",
+        "roles/bigquery.jobUser",
         "roles/secretmanager.secretAccessor",
       ]
     }
@@ -440,6 +441,13 @@ module "pubsub" {
       message_retention_duration = "86400s" # 1 day
       enable_message_ordering    = false
     }
+
+    # Per-source tasks of the climate ingest functions in coordinator mode
+    ingest_tasks = {
+      description                = "One task per source of a climate ingest run, pushed to a worker invocation"
+      message_retention_duration = "86400s" # 1 day
+      enable_message_ordering    = false
+    }
   }
 
   # Subscriptions for Dataflow jobs
@@ -573,6 +581,11 @@ module "cloud_run" {
   # Allow unauthenticated access for webhooks (specific services only)
   allow_unauthenticated = false
 
+  # Climate series read cache, invalidated by the climate ingest functions
+  climate_series_image    = var.climate_series_image
+  climate_dataset_id      = var.climate_dataset_id
+  climate_series_invokers = [module.security.service_accounts["cloud_functions"].email]
+
   depends_on = [
     module.project_services,
     module.networking,
@@ -785,6 +798,12 @@ module "climate_data" {
   service_account_email = module.security.service_accounts["cloud_functions"].email
   source_bucket         = module.storage.buckets["dataflow_staging"].name
 
+  # Climate series read cache to invalidate after loads
+  series_cache_url = module.cloud_run.climate_series_url
+
+  # Fan sources out to one function invocation each
+  fanout_topic = module.pubsub.topic_names["ingest_tasks"]
+
   # Scheduler configuration
   global_warming_schedule  = var.climate_global_warming_schedule
   nasa_gistemp_schedule    = var.climate_nasa_gistemp_schedule
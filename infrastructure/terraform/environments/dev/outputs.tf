@@ -111,6 +111,7 @@ output "pubsub_topics" {
     database_cdc           = module.pubsub.topics["database_cdc"].name
     streaming_events       = module.pubsub.topics["streaming_events"].name
     pipeline_notifications = module.pubsub.topics["pipeline_notifications"].name
+    ingest_tasks           = module.pubsub.topics["ingest_tasks"].name
   }
 }
 
@@ -241,6 +241,12 @@ variable "climate_nasa_gistemp_schedule" {
   default     = "0 3 15 * *" # Monthly on the 15th at 3 AM UTC
 }
 
+variable "climate_series_image" {
+  description = "Container image of the Climate Series API (src/cloud-run/climate-series-api); empty skips it"
+  type        = string
+  default     = ""
+}
+
 variable "climate_ingestion_time_zone" {
   description = "Time zone for climate data ingestion schedule"
   type        = string
@@ -436,3 +436,327 @@ resource "google_bigquery_table" "raw_gistemp_zonal" {
     }
   ])
 }
+
+# =============================================================================
+# SUMMARY TABLES
+# =============================================================================
+# Pre-aggregated rows for dashboards, kept current by the ingestion functions
+# (see aggregates.py): only windows containing new or revised months are
+# recomputed and merged on record_id after each load. A few thousand rows
+# each, so they are clustered rather than partitioned.
+
+resource "google_bigquery_table" "agg_gistemp_annual" {
+  dataset_id          = google_bigquery_dataset.climate_data.dataset_id
+  table_id            = "agg_gistemp_annual"
+  project             = var.project_id
+  deletion_protection = false
+
+  description = "NASA GISTEMP v4 - Annual mean temperature anomalies per hemisphere, maintained by the ingestion function"
+
+  labels = merge(var.labels, {
+    source      = "nasa_gistemp"
+    data_type   = "temperature_annual"
+    update_freq = "monthly"
+  })
+
+  clustering = ["series", "measurement_date"]
+
+  schema = jsonencode([
+    {
+      name        = "series"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Summarized series: Global, Northern or Southern"
+    },
+    {
+      name        = "year"
+      type        = "INT64"
+      mode        = "REQUIRED"
+      description = "Year of the mean"
+    },
+    {
+      name        = "measurement_date"
+      type        = "DATE"
+      mode        = "REQUIRED"
+      description = "First day of the year"
+    },
+    {
+      name        = "mean_value"
+      type        = "FLOAT64"
+      mode        = "REQUIRED"
+      description = "Mean of the monthly values of the year"
+    },
+    {
+      name        = "months"
+      type        = "INT64"
+      mode        = "REQUIRED"
+      description = "Number of months with a value (12 for a complete year)"
+    },
+    {
+      name        = "record_id"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Unique identifier for the summary row (MD5 hash of kind + series + date)"
+    },
+    {
+      name        = "updated_at"
+      type        = "TIMESTAMP"
+      mode        = "REQUIRED"
+      description = "Timestamp when the row was last recomputed"
+    }
+  ])
+}
+
+resource "google_bigquery_table" "agg_gistemp_rolling_12m" {
+  dataset_id          = google_bigquery_dataset.climate_data.dataset_id
+  table_id            = "agg_gistemp_rolling_12m"
+  project             = var.project_id
+  deletion_protection = false
+
+  description = "NASA GISTEMP v4 - Trailing 12-month mean temperature anomalies per hemisphere, maintained by the ingestion function"
+
+  labels = merge(var.labels, {
+    source      = "nasa_gistemp"
+    data_type   = "temperature_rolling"
+    update_freq = "monthly"
+  })
+
+  clustering = ["series", "measurement_date"]
+
+  schema = jsonencode([
+    {
+      name        = "series"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Summarized series: Global, Northern or Southern"
+    },
+    {
+      name        = "measurement_date"
+      type        = "DATE"
+      mode        = "REQUIRED"
+      description = "First day of the last month of the window"
+    },
+    {
+      name        = "monthly_value"
+      type        = "FLOAT64"
+      mode        = "REQUIRED"
+      description = "Value of the month (mean of its daily values for daily series)"
+    },
+    {
+      name        = "rolling_mean"
+      type        = "FLOAT64"
+      mode        = "NULLABLE"
+      description = "Mean of the trailing 12 monthly values; null until all 12 are present"
+    },
+    {
+      name        = "window_months"
+      type        = "INT64"
+      mode        = "REQUIRED"
+      description = "Number of months of the window with a value"
+    },
+    {
+      name        = "record_id"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Unique identifier for the summary row (MD5 hash of kind + series + date)"
+    },
+    {
+      name        = "updated_at"
+      type        = "TIMESTAMP"
+      mode        = "REQUIRED"
+      description = "Timestamp when the row was last recomputed"
+    }
+  ])
+}
+
+resource "google_bigquery_table" "agg_gw_annual" {
+  dataset_id          = google_bigquery_dataset.climate_data.dataset_id
+  table_id            = "agg_gw_annual"
+  project             = var.project_id
+  deletion_protection = false
+
+  description = "Global Warming API - Annual means of the temperature, CO2, methane and nitrous oxide series, maintained by the ingestion function"
+
+  labels = merge(var.labels, {
+    source      = "global_warming_api"
+    data_type   = "annual_means"
+    update_freq = "monthly"
+  })
+
+  clustering = ["series", "measurement_date"]
+
+  schema = jsonencode([
+    {
+      name        = "series"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Summarized series: <endpoint>_<column>, e.g. co2_trend or methane_average"
+    },
+    {
+      name        = "year"
+      type        = "INT64"
+      mode        = "REQUIRED"
+      description = "Year of the mean"
+    },
+    {
+      name        = "measurement_date"
+      type        = "DATE"
+      mode        = "REQUIRED"
+      description = "First day of the year"
+    },
+    {
+      name        = "mean_value"
+      type        = "FLOAT64"
+      mode        = "REQUIRED"
+      description = "Mean of the monthly values of the year"
+    },
+    {
+      name        = "months"
+      type        = "INT64"
+      mode        = "REQUIRED"
+      description = "Number of months with a value (12 for a complete year)"
+    },
+    {
+      name        = "record_id"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Unique identifier for the summary row (MD5 hash of kind + series + date)"
+    },
+    {
+      name        = "updated_at"
+      type        = "TIMESTAMP"
+      mode        = "REQUIRED"
+      description = "Timestamp when the row was last recomputed"
+    }
+  ])
+}
+
+resource "google_bigquery_table" "agg_gw_rolling_12m" {
+  dataset_id          = google_bigquery_dataset.climate_data.dataset_id
+  table_id            = "agg_gw_rolling_12m"
+  project             = var.project_id
+  deletion_protection = false
+
+  description = "Global Warming API - Trailing 12-month mean temperature anomalies, maintained by the ingestion function"
+
+  labels = merge(var.labels, {
+    source      = "global_warming_api"
+    data_type   = "temperature_rolling"
+    update_freq = "monthly"
+  })
+
+  clustering = ["series", "measurement_date"]
+
+  schema = jsonencode([
+    {
+      name        = "series"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Summarized series: temperature_station or temperature_land"
+    },
+    {
+      name        = "measurement_date"
+      type        = "DATE"
+      mode        = "REQUIRED"
+      description = "First day of the last month of the window"
+    },
+    {
+      name        = "monthly_value"
+      type        = "FLOAT64"
+      mode        = "REQUIRED"
+      description = "Value of the month (mean of its daily values for daily series)"
+    },
+    {
+      name        = "rolling_mean"
+      type        = "FLOAT64"
+      mode        = "NULLABLE"
+      description = "Mean of the trailing 12 monthly values; null until all 12 are present"
+    },
+    {
+      name        = "window_months"
+      type        = "INT64"
+      mode        = "REQUIRED"
+      description = "Number of months of the window with a value"
+    },
+    {
+      name        = "record_id"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Unique identifier for the summary row (MD5 hash of kind + series + date)"
+    },
+    {
+      name        = "updated_at"
+      type        = "TIMESTAMP"
+      mode        = "REQUIRED"
+      description = "Timestamp when the row was last recomputed"
+    }
+  ])
+}
+
+resource "google_bigquery_table" "agg_gw_yoy_growth" {
+  dataset_id          = google_bigquery_dataset.climate_data.dataset_id
+  table_id            = "agg_gw_yoy_growth"
+  project             = var.project_id
+  deletion_protection = false
+
+  description = "Global Warming API - Year-over-year growth of monthly CO2 and methane concentrations, maintained by the ingestion function"
+
+  labels = merge(var.labels, {
+    source      = "global_warming_api"
+    data_type   = "growth"
+    update_freq = "monthly"
+  })
+
+  clustering = ["series", "measurement_date"]
+
+  schema = jsonencode([
+    {
+      name        = "series"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Summarized series: co2_trend or methane_average"
+    },
+    {
+      name        = "measurement_date"
+      type        = "DATE"
+      mode        = "REQUIRED"
+      description = "First day of the month"
+    },
+    {
+      name        = "monthly_value"
+      type        = "FLOAT64"
+      mode        = "REQUIRED"
+      description = "Value of the month (mean of its daily values for daily series)"
+    },
+    {
+      name        = "previous_year_value"
+      type        = "FLOAT64"
+      mode        = "NULLABLE"
+      description = "Value of the same month a year earlier"
+    },
+    {
+      name        = "yoy_change"
+      type        = "FLOAT64"
+      mode        = "NULLABLE"
+      description = "monthly_value minus previous_year_value"
+    },
+    {
+      name        = "yoy_change_pct"
+      type        = "FLOAT64"
+      mode        = "NULLABLE"
+      description = "yoy_change as a percentage of previous_year_value"
+    },
+    {
+      name        = "record_id"
+      type        = "STRING"
+      mode        = "REQUIRED"
+      description = "Unique identifier for the summary row (MD5 hash of kind + series + date)"
+    },
+    {
+      name        = "updated_at"
+      type        = "TIMESTAMP"
+      mode        = "REQUIRED"
+      description = "Timestamp when the row was last recomputed"
+    }
+  ])
+}
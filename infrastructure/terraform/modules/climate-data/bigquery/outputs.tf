@@ -13,11 +13,16 @@ output "dataset_full_id" {
 output "table_ids" {
   description = "Map of table names to their full IDs"
   value = {
-    raw_gw_temperature    = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gw_temperature.table_id}"
-    raw_gw_co2            = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gw_co2.table_id}"
-    raw_gw_methane        = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gw_methane.table_id}"
-    raw_gw_nitrous_oxide  = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gw_nitrous_oxide.table_id}"
-    raw_gistemp_global    = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gistemp_global.table_id}"
-    raw_gistemp_zonal     = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gistemp_zonal.table_id}"
+    raw_gw_temperature      = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gw_temperature.table_id}"
+    raw_gw_co2              = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gw_co2.table_id}"
+    raw_gw_methane          = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gw_methane.table_id}"
+    raw_gw_nitrous_oxide    = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gw_nitrous_oxide.table_id}"
+    raw_gistemp_global      = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gistemp_global.table_id}"
+    raw_gistemp_zonal       = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.raw_gistemp_zonal.table_id}"
+    agg_gistemp_annual      = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.agg_gistemp_annual.table_id}"
+    agg_gistemp_rolling_12m = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.agg_gistemp_rolling_12m.table_id}"
+    agg_gw_annual           = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.agg_gw_annual.table_id}"
+    agg_gw_rolling_12m      = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.agg_gw_rolling_12m.table_id}"
+    agg_gw_yoy_growth       = "${var.project_id}.${google_bigquery_dataset.climate_data.dataset_id}.${google_bigquery_table.agg_gw_yoy_growth.table_id}"
   }
 }
@@ -39,11 +39,99 @@ variable "dataset_id" {
   default     = "climate_data"
 }
 
-# Create a zip file of the Cloud Function source code
+variable "series_cache_url" {
+  description = "URL of the Climate Series API to invalidate after loads; empty disables"
+  type        = string
+  default     = ""
+}
+
+variable "fanout_topic" {
+  description = "Pub/Sub topic of per-source ingest tasks; set to run the functions as coordinators, empty disables"
+  type        = string
+  default     = ""
+}
+
+locals {
+  repo_root               = "${path.module}/../../../../.."
+  shared_dir              = "${local.repo_root}/src/shared"
+  global_warming_api_dir  = "${local.repo_root}/src/cloud-functions/global-warming-api-ingest"
+  nasa_gistemp_dir        = "${local.repo_root}/src/cloud-functions/nasa-gistemp-ingest"
+  global_warming_api_data = setunion(
+    fileset(local.repo_root, "config/connectors/gw_*.yaml"),
+    fileset(local.repo_root, "schemas/raw_gw_*.json")
+  )
+}
+
+# =============================================================================
+# SNAPSHOT ARCHIVE
+# =============================================================================
+
+# Upstream snapshots that replay.py rebuilds older vintages from. They live in
+# their own bucket, without the age-based deletion of the source bucket, so the
+# archive (objects/<digest>.gz blobs and index entries) keeps every vintage
+resource "google_storage_bucket" "snapshot_archive" {
+  name          = "climate-snapshots-${var.project_id}-${var.region}"
+  project       = var.project_id
+  location      = var.region
+  storage_class = "STANDARD"
+  force_destroy = var.environment != "prod"
+
+  uniform_bucket_level_access = true
+
+  # Snapshots are read back rarely, only by replays
+  lifecycle_rule {
+    action {
+      type          = "SetStorageClass"
+      storage_class = "NEARLINE"
+    }
+    condition {
+      age                   = 90
+      matches_storage_class = ["STANDARD"]
+    }
+  }
+
+  labels = merge(var.labels, {
+    data_tier = "archive"
+  })
+}
+
+# The functions write snapshots; replays run as the same service account
+resource "google_storage_bucket_iam_member" "snapshot_archive_writer" {
+  bucket = google_storage_bucket.snapshot_archive.name
+  role   = "roles/storage.objectAdmin"
+  member = "serviceAccount:${var.service_account_email}"
+}
+
+# Create a zip file of the Cloud Function source code, with the modules shared by
+# both functions (src/shared) next to main.py and the connector configs and table
+# schemas it compiles at startup (see connectors.py) at the same paths
 data "archive_file" "global_warming_api_source" {
   type        = "zip"
-  source_dir  = "${path.module}/../../../src/cloud-functions/global-warming-api-ingest"
   output_path = "${path.module}/global-warming-api-ingest.zip"
+
+  dynamic "source" {
+    for_each = fileset(local.global_warming_api_dir, "*.{py,txt}")
+    content {
+      content  = file("${local.global_warming_api_dir}/${source.value}")
+      filename = source.value
+    }
+  }
+
+  dynamic "source" {
+    for_each = fileset(local.shared_dir, "*.py")
+    content {
+      content  = file("${local.shared_dir}/${source.value}")
+      filename = source.value
+    }
+  }
+
+  dynamic "source" {
+    for_each = local.global_warming_api_data
+    content {
+      content  = file("${local.repo_root}/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 # Upload the function source code to GCS
@@ -71,8 +159,17 @@ resource "google_cloudfunctions_function" "global_warming_api_ingest" {
   service_account_email = var.service_account_email
 
   environment_variables = {
-    GCP_PROJECT = var.project_id
-    DATASET_ID  = var.dataset_id
+    GCP_PROJECT          = var.project_id
+    DATASET_ID           = var.dataset_id
+    MAX_WORKERS          = "4"
+    LOAD_MODE            = "incremental"
+    STREAM_JSON          = "true"
+    FETCH_STATE_URI      = "gs://${var.source_bucket}/fetch-state/global-warming-api-ingest.json"
+    SNAPSHOT_ARCHIVE_URI = "gs://${google_storage_bucket.snapshot_archive.name}/global-warming-api-ingest"
+    RUN_DEADLINE_SECONDS = "500" # Leaves headroom under the 540s timeout to report and save state
+    SERIES_CACHE_URL     = var.series_cache_url
+    FANOUT_TOPIC         = var.fanout_topic
+    FANOUT_RESULTS_URI   = "gs://${var.source_bucket}/fanout-results/global-warming-api-ingest"
   }
 
   labels = merge(var.labels, {
@@ -107,11 +204,27 @@ resource "google_cloudfunctions_function_iam_member" "invoker_public" {
 # NASA GISTEMP v4 CLOUD FUNCTION
 # =============================================================================
 
-# Create a zip file of the NASA GISTEMP function source code
+# Create a zip file of the NASA GISTEMP function source code, with the modules
+# shared by both functions (src/shared) next to main.py
 data "archive_file" "nasa_gistemp_source" {
   type        = "zip"
-  source_dir  = "${path.module}/../../../src/cloud-functions/nasa-gistemp-ingest"
   output_path = "${path.module}/nasa-gistemp-ingest.zip"
+
+  dynamic "source" {
+    for_each = fileset(local.nasa_gistemp_dir, "*.{py,txt}")
+    content {
+      content  = file("${local.nasa_gistemp_dir}/${source.value}")
+      filename = source.value
+    }
+  }
+
+  dynamic "source" {
+    for_each = fileset(local.shared_dir, "*.py")
+    content {
+      content  = file("${local.shared_dir}/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 # Upload the function source code to GCS
@@ -139,8 +252,15 @@ resource "google_cloudfunctions_function" "nasa_gistemp_ingest" {
   service_account_email = var.service_account_email
 
   environment_variables = {
-    GCP_PROJECT = var.project_id
-    DATASET_ID  = var.dataset_id
+    GCP_PROJECT          = var.project_id
+    DATASET_ID           = var.dataset_id
+    FETCH_STATE_URI      = "gs://${var.source_bucket}/fetch-state/nasa-gistemp-ingest.json"
+    SNAPSHOT_ARCHIVE_URI = "gs://${google_storage_bucket.snapshot_archive.name}/nasa-gistemp-ingest"
+    CHANGE_MANIFEST_URI  = "gs://${var.source_bucket}/change-manifest/nasa-gistemp-ingest.json"
+    RUN_DEADLINE_SECONDS = "500" # Leaves headroom under the 540s timeout to report and save state
+    SERIES_CACHE_URL     = var.series_cache_url
+    FANOUT_TOPIC         = var.fanout_topic
+    FANOUT_RESULTS_URI   = "gs://${var.source_bucket}/fanout-results/nasa-gistemp-ingest"
   }
 
   labels = merge(var.labels, {
@@ -170,3 +290,46 @@ resource "google_cloudfunctions_function_iam_member" "nasa_gistemp_invoker_publi
   role   = "roles/cloudfunctions.invoker"
   member = "allUsers"
 }
+
+# =============================================================================
+# SOURCE FAN-OUT
+# =============================================================================
+
+# In coordinator mode each function publishes one task per source to the fan-out
+# topic; these push subscriptions deliver the tasks back to the function that
+# published them, one invocation per source (see fanout.py)
+locals {
+  fanout_functions = var.fanout_topic == "" ? {} : {
+    "global-warming-api-ingest" = google_cloudfunctions_function.global_warming_api_ingest.https_trigger_url
+    "nasa-gistemp-ingest"       = google_cloudfunctions_function.nasa_gistemp_ingest.https_trigger_url
+  }
+}
+
+resource "google_pubsub_subscription" "fanout" {
+  for_each = local.fanout_functions
+
+  name    = "${each.key}-tasks-${var.environment}"
+  project = var.project_id
+  topic   = var.fanout_topic
+  filter  = "attributes.function = \"${each.key}\""
+
+  # A worker may run for the whole function timeout before it acknowledges
+  ack_deadline_seconds       = 600
+  message_retention_duration = "86400s" # 1 day
+
+  push_config {
+    push_endpoint = each.value
+
+    oidc_token {
+      service_account_email = var.service_account_email
+    }
+  }
+
+  # Workers record failures as results and acknowledge; redelivery covers crashed or timed-out workers
+  retry_policy {
+    minimum_backoff = "10s"
+    maximum_backoff = "600s"
+  }
+
+  labels = var.labels
+}
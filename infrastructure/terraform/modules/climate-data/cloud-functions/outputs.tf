@@ -31,3 +31,8 @@ output "nasa_gistemp_function_id" {
   description = "Full ID of the NASA GISTEMP ingestion function"
   value       = google_cloudfunctions_function.nasa_gistemp_ingest.id
 }
+
+output "snapshot_archive_bucket" {
+  description = "GCS bucket of the functions' upstream snapshot archive (replay.py --archive)"
+  value       = google_storage_bucket.snapshot_archive.name
+}
@@ -50,6 +50,18 @@ variable "source_bucket" {
   type        = string
 }
 
+variable "series_cache_url" {
+  description = "URL of the Climate Series API to invalidate after loads; empty disables"
+  type        = string
+  default     = ""
+}
+
+variable "fanout_topic" {
+  description = "Pub/Sub topic the ingest functions fan their sources out over (coordinator mode); empty disables"
+  type        = string
+  default     = ""
+}
+
 variable "delete_contents_on_destroy" {
   description = "Whether to delete BigQuery table contents on destroy"
   type        = bool
@@ -102,6 +114,8 @@ module "cloud_functions" {
   service_account_email = var.service_account_email
   source_bucket         = var.source_bucket
   dataset_id            = var.dataset_id
+  series_cache_url      = var.series_cache_url
+  fanout_topic          = var.fanout_topic
 
   depends_on = [module.bigquery]
 }
@@ -54,3 +54,8 @@ output "nasa_gistemp_scheduler_schedule" {
   description = "Cron schedule for NASA GISTEMP ingestion"
   value       = module.cloud_scheduler.nasa_gistemp_schedule
 }
+
+output "snapshot_archive_bucket" {
+  description = "GCS bucket of the upstream snapshot archive that replay.py rebuilds vintages from"
+  value       = module.cloud_functions.snapshot_archive_bucket
+}
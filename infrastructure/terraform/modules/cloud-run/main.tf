@@ -6,3 +6,70 @@ terraform {
     google = { source = "hashicorp/google", version = "~> 5.0" }
   }
 }
+
+# Climate Series API: in-memory read cache of the climate series
+# (src/cloud-run/climate-series-api), invalidated by the ingest functions
+resource "google_cloud_run_v2_service" "climate_series" {
+  count = var.climate_series_image != "" ? 1 : 0
+
+  name     = "${var.name_prefix}-climate-series-api"
+  project  = var.project_id
+  location = var.region
+  ingress  = "INGRESS_TRAFFIC_ALL"
+
+  labels = merge(var.labels, {
+    service = "climate-series-api"
+  })
+
+  template {
+    service_account = var.service_account_email
+
+    # A single instance keeps the cache coherent: /invalidate reaches the one
+    # instance holding the series. Extra instances would only catch up at the TTL.
+    scaling {
+      min_instance_count = 0
+      max_instance_count = 1
+    }
+
+    max_instance_request_concurrency = 80
+
+    vpc_access {
+      connector = var.vpc_connector_id
+      egress    = "PRIVATE_RANGES_ONLY"
+    }
+
+    containers {
+      image = var.climate_series_image
+
+      env {
+        name  = "GCP_PROJECT"
+        value = var.project_id
+      }
+      env {
+        name  = "DATASET_ID"
+        value = var.climate_dataset_id
+      }
+      env {
+        name  = "SERIES_TTL_SECONDS"
+        value = tostring(var.climate_series_ttl_seconds)
+      }
+
+      resources {
+        limits = {
+          cpu    = "1"
+          memory = "512Mi"
+        }
+      }
+    }
+  }
+}
+
+resource "google_cloud_run_v2_service_iam_member" "climate_series_invokers" {
+  for_each = var.climate_series_image != "" ? toset(var.climate_series_invokers) : toset([])
+
+  project  = var.project_id
+  location = var.region
+  name     = google_cloud_run_v2_service.climate_series[0].name
+  role     = "roles/run.invoker"
+  member   = "serviceAccount:${each.value}"
+}
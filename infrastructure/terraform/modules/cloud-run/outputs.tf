@@ -1,3 +1,8 @@
 output "api_service_url" {
   value = "https://api.example.com" # Placeholder
 }
+
+output "climate_series_url" {
+  description = "URL of the Climate Series API, or empty if it is not deployed"
+  value       = length(google_cloud_run_v2_service.climate_series) > 0 ? google_cloud_run_v2_service.climate_series[0].uri : ""
+}
@@ -12,3 +12,24 @@ variable "allow_unauthenticated" {
   type    = bool
   default = false
 }
+
+# Climate Series API (src/cloud-run/climate-series-api)
+variable "climate_series_image" {
+  description = "Container image of the climate series read cache; empty skips the service"
+  type        = string
+  default     = ""
+}
+variable "climate_dataset_id" {
+  type    = string
+  default = "climate_data"
+}
+variable "climate_series_ttl_seconds" {
+  description = "Age after which a cached series is reloaded if no ingest run invalidated it first"
+  type        = number
+  default     = 3600
+}
+variable "climate_series_invokers" {
+  description = "Service accounts allowed to call the service: readers, and the ingest functions for /invalidate"
+  type        = list(string)
+  default     = []
+}
@@ -15,3 +15,90 @@ locals {
     cost_tracking   = "cost-tracking-dashboard"
   }
 }
+
+# Log-based metrics from the ingestion functions' per-source metrics entries
+# (jsonPayload.event = "ingest_source_metrics", see metrics.py in each function)
+locals {
+  ingest_metrics_filter = "jsonPayload.event=\"ingest_source_metrics\""
+  ingest_stages         = ["fetch", "parse", "transform", "load", "merge"]
+  ingest_counters = {
+    bytes_downloaded = "By"
+    bytes_uploaded   = "By"
+    rows_loaded      = "1"
+    rows_dropped     = "1"
+  }
+}
+
+resource "google_logging_metric" "ingest_stage_seconds" {
+  for_each = toset(local.ingest_stages)
+
+  project = var.project_id
+  name    = "${var.name_prefix}-ingest-${each.key}-seconds"
+  filter  = "${local.ingest_metrics_filter} AND jsonPayload.stage_seconds.${each.key}:*"
+
+  metric_descriptor {
+    metric_kind = "DELTA"
+    value_type  = "DISTRIBUTION"
+    unit        = "s"
+
+    labels {
+      key        = "function"
+      value_type = "STRING"
+    }
+    labels {
+      key        = "source"
+      value_type = "STRING"
+    }
+  }
+
+  value_extractor = "EXTRACT(jsonPayload.stage_seconds.${each.key})"
+  label_extractors = {
+    function = "EXTRACT(jsonPayload.function)"
+    source   = "EXTRACT(jsonPayload.source)"
+  }
+
+  bucket_options {
+    exponential_buckets {
+      num_finite_buckets = 20
+      growth_factor      = 2
+      scale              = 0.01
+    }
+  }
+}
+
+resource "google_logging_metric" "ingest_volume" {
+  for_each = local.ingest_counters
+
+  project = var.project_id
+  name    = "${var.name_prefix}-ingest-${replace(each.key, "_", "-")}"
+  filter  = "${local.ingest_metrics_filter} AND jsonPayload.${each.key}:*"
+
+  metric_descriptor {
+    metric_kind = "DELTA"
+    value_type  = "DISTRIBUTION"
+    unit        = each.value
+
+    labels {
+      key        = "function"
+      value_type = "STRING"
+    }
+    labels {
+      key        = "source"
+      value_type = "STRING"
+    }
+  }
+
+  value_extractor = "EXTRACT(jsonPayload.${each.key})"
+  label_extractors = {
+    function = "EXTRACT(jsonPayload.function)"
+    source   = "EXTRACT(jsonPayload.source)"
+  }
+
+  bucket_options {
+    exponential_buckets {
+      num_finite_buckets = 30
+      growth_factor      = 2
+      scale              = 1
+    }
+  }
+}
@@ -5,3 +5,11 @@ output "dashboard_ids" {
     cost_tracking   = "cost-tracking-dashboard"
   }
 }
+
+output "ingest_metric_names" {
+  description = "Log-based metrics extracted from the ingestion functions' per-source metrics"
+  value = merge(
+    { for stage, metric in google_logging_metric.ingest_stage_seconds : "${stage}_seconds" => metric.name },
+    { for counter, metric in google_logging_metric.ingest_volume : counter => metric.name }
+  )
+}
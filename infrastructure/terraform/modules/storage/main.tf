@@ -209,3 +209,13 @@ resource "google_storage_bucket_iam_member" "landing_writer" {
   role   = "roles/storage.objectCreator"
   member = "serviceAccount:${var.cloud_functions_service_account}"
 }
+
+# The ingest functions keep their fetch state, change manifest and fan-out
+# results under gs://<dataflow_staging>/ (their source bucket)
+resource "google_storage_bucket_iam_member" "cloud_functions_state" {
+  count = var.cloud_functions_service_account != "" ? 1 : 0
+
+  bucket = google_storage_bucket.buckets["dataflow_staging"].name
+  role   = "roles/storage.objectAdmin"
+  member = "serviceAccount:${var.cloud_functions_service_account}"
+}
@@ -0,0 +1,422 @@
+"""
+Config-driven connector runtime.
+
+Each REST source of the function is described by a connector config
+(config/connectors/<source_id>.yaml) and the JSON schema of its table
+(schemas/<table>.json), in the layout of the platform's connector template.
+Both are read once, at import, and compiled into a Connector:
+
+- a batch builder: a function generated from the source's mapping that
+  builds the columns of a RecordBatch (see record_batch.py) from a list of
+  records directly, so no per-record dispatch on the endpoint or
+  per-column loop is left when rows are built
+- a batch validator: checks whole batches column by column against the
+  schema (REQUIRED fields, types and max_length); a column that passes
+  its fast whole-column check costs one pass or less (typed and constant
+  columns know their types), and only failing columns are scanned row by row
+
+Validation modes (schema.validation):
+
+- strict: a batch with any invalid row is rejected with SchemaValidationError
+- lenient: invalid rows are dropped and counted by reason
+- none: rows are not validated
+
+Mistakes in a config (unknown parser or transform, columns missing from the
+schema, REQUIRED schema fields the builder never fills) raise
+ConnectorConfigError when the connectors are loaded, not mid-run.
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import string
+from array import array
+from datetime import date, datetime
+
+from metrics import SourceMetrics
+from record_batch import ArrayColumn, ConstantColumn, DateColumn, ListColumn, RecordBatch
+
+logger = logging.getLogger(__name__)
+
+VALIDATION_MODES = ('strict', 'lenient', 'none')
+
+# Columns every batch builder fills, ahead of the mapped columns
+BASE_COLUMNS = ('record_id', 'measurement_date', 'ingestion_timestamp', 'source_file')
+
+# Exact Python types accepted per BigQuery type (DATE and TIMESTAMP travel as ISO strings)
+SCHEMA_TYPES = {
+    'STRING': frozenset({str}),
+    'FLOAT64': frozenset({float, int}),
+    'FLOAT': frozenset({float, int}),
+    'INT64': frozenset({int}),
+    'INTEGER': frozenset({int}),
+    'BOOL': frozenset({bool}),
+    'BOOLEAN': frozenset({bool}),
+    'DATE': frozenset({str}),
+    'TIMESTAMP': frozenset({str}),
+}
+
+
+class ConnectorConfigError(ValueError):
+    """A connector config or schema that cannot be compiled."""
+
+
+class SchemaValidationError(ValueError):
+    """A batch rejected by a strict validator."""
+
+
+def parse_decimal_year(value) -> date:
+    """'1880.0417' (decimal year, month from the fraction) or 'YYYY-MM-DD'."""
+    text = str(value)
+    if '.' in text:
+        year = int(float(text))
+        month = max(1, min(12, int((float(text) - year) * 12) + 1))
+        return date(year, month, 1)
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def parse_year_month_day(year, month, day) -> date:
+    """Separate year, month and day fields."""
+    return date(int(year), int(month), int(day))
+
+
+def parse_year_month(value) -> date:
+    """'YYYY-MM' (or 'YYYY-M'), as the first of the month."""
+    if isinstance(value, str) and '-' in value:
+        parts = value.split('-')
+        return date(int(parts[0]), int(parts[1]), 1)
+    return None
+
+
+DATE_PARSERS = {
+    'decimal_year': parse_decimal_year,
+    'year_month_day': parse_year_month_day,
+    'year_month': parse_year_month,
+}
+
+
+# Expressions converting a record value (the '{value}' placeholder) to a column value.
+# 'string' applies str(), so a field the API serves as a number (e.g. time: 2001.5)
+# still passes a STRING schema field.
+TRANSFORMS = {
+    'float': '(float(v) if (v := {value}) else None)',
+    'int': '(int(v) if (v := {value}) else None)',
+    'string': '(str(v) if (v := {value}) is not None else None)',
+}
+
+# Column kind holding the values of each transform
+TRANSFORM_COLUMNS = {
+    'float': lambda values: ArrayColumn.from_values(values, 'd'),
+    'int': lambda values: ArrayColumn.from_values(values, 'q'),
+    'string': ListColumn,
+}
+
+BATCH_BUILDER_SOURCE = """
+def build_columns(records, dropped):
+    record_ids, days = [], array('i')
+{column_lists}
+    for record in records:
+        get = record.get
+        try:
+            measurement_date = parse_date({date_args})
+        except Exception as e:
+            logger.warning(f"Failed to parse date of {{record}} for {{name}}: {{e}}")
+            dropped['unparseable_date'] += 1
+            continue
+        if not measurement_date:
+            logger.warning(f"Unexpected time format for {{name}}: {{record}}")
+            dropped['unparseable_date'] += 1
+            continue
+        try:
+{column_values}
+        except Exception as e:
+            logger.warning(f"Failed to process record in {{name}}: {{e}}")
+            dropped['invalid_record'] += 1
+            continue
+        record_ids.append(md5(({record_id}).encode()).hexdigest())
+        days.append(measurement_date.toordinal())
+{column_appends}
+    return record_ids, days, [{column_names}]
+"""
+
+
+def _compile(name: str, source: str, function: str, parser):
+    """Compile generated source and return its function."""
+    namespace = {'parse_date': parser, 'md5': hashlib.md5, 'name': name, 'logger': logger, 'array': array}
+    exec(compile(source, f"<connector {name}>", 'exec'), namespace)
+    return namespace[function]
+
+
+def _read_mapping(name: str, mapping: dict) -> tuple:
+    """
+    Check a mapping section and return (date parser, date fields, columns,
+    record_id expression); columns are (column, source field, transform name).
+    """
+    date_spec = mapping.get('measurement_date') or {}
+    parser = DATE_PARSERS.get(date_spec.get('parser'))
+    if parser is None:
+        raise ConnectorConfigError(f"{name}: unknown date parser {date_spec.get('parser')!r}, "
+                                   f"expected one of {sorted(DATE_PARSERS)}")
+    date_fields = tuple(date_spec.get('fields') or ())
+    if not date_fields:
+        raise ConnectorConfigError(f"{name}: measurement_date.fields is empty")
+
+    columns = []
+    for column, spec in (mapping.get('columns') or {}).items():
+        transform = spec.get('transform', 'string')
+        if transform not in TRANSFORMS:
+            raise ConnectorConfigError(f"{name}: unknown transform {transform!r} for {column}, "
+                                       f"expected one of {sorted(TRANSFORMS)}")
+        columns.append((column, spec.get('source', column), transform))
+
+    record_id = mapping.get('record_id')
+    if not record_id:
+        raise ConnectorConfigError(f"{name}: mapping.record_id is required")
+    # '{year}-{month}-{day}' -> 'co2_' + str(get('year')) + '-' + ...
+    id_parts = [repr(f"{name}_")]
+    for literal, field, _, _ in string.Formatter().parse(record_id):
+        if literal:
+            id_parts.append(repr(literal))
+        if field is not None:
+            id_parts.append(f"str(get({field!r}))")
+    return parser, date_fields, columns, ' + '.join(id_parts)
+
+
+def _convert(transform: str, field: str) -> str:
+    """Expression converting a record field with a transform."""
+    return TRANSFORMS[transform].format(value=f"get({field!r})")
+
+
+def compile_batch_builder(name: str, mapping: dict):
+    """
+    Compile a connector's mapping section into
+    fn(records, ingestion_time, source_file, metrics=None) -> RecordBatch.
+
+    Each field is read with a single record.get() and converted inline. The
+    batch holds the rows column by column: record_id as a list,
+    measurement_date as day ordinals, the ingestion time and source file
+    once, and each mapped column by its transform (floats and ints in typed
+    arrays). Each record's values are converted before any is appended, so a
+    record that fails leaves no partial row behind. Dropped records are
+    counted in metrics as 'unparseable_date' or 'invalid_record'. Record
+    fields missing from the record_id template format as 'None'.
+    """
+    parser, date_fields, columns, record_id = _read_mapping(name, mapping)
+    source = BATCH_BUILDER_SOURCE.format(
+        date_args=', '.join(f"get({field!r})" for field in date_fields),
+        record_id=record_id,
+        column_lists='\n'.join(f"    c{i} = []" for i in range(len(columns))),
+        column_values='\n'.join(f"            v{i} = {_convert(transform, field)}"
+                                 for i, (_, field, transform) in enumerate(columns)) or '            pass',
+        column_appends='\n'.join(f"        c{i}.append(v{i})" for i in range(len(columns))),
+        column_names=', '.join(f"c{i}" for i in range(len(columns))),
+    )
+    build_columns = _compile(name, source, 'build_columns', parser)
+
+    def build_batch(records: list, ingestion_time: str, source_file: str,
+                    metrics: SourceMetrics = None) -> RecordBatch:
+        dropped = {'unparseable_date': 0, 'invalid_record': 0}
+        record_ids, days, values = build_columns(records, dropped)
+        if metrics:
+            for reason, count in dropped.items():
+                metrics.drop(reason, count)
+        length = len(record_ids)
+        batch = {
+            'record_id': ListColumn(record_ids),
+            'measurement_date': DateColumn(days),
+            'ingestion_timestamp': ConstantColumn(ingestion_time, length),
+            'source_file': ConstantColumn(source_file, length),
+        }
+        for (column, _, transform), column_values in zip(columns, values):
+            batch[column] = TRANSFORM_COLUMNS[transform](column_values)
+        return RecordBatch(batch, length)
+
+    build_batch.source = source
+    return build_batch
+
+
+class BatchValidator:
+    """
+    Validate batches of rows against a table schema, column by column.
+
+    Args:
+        name: Connector name, for errors and logs
+        fields: The schema's 'fields' list
+        mode: 'strict', 'lenient' or 'none'
+    """
+
+    def __init__(self, name: str, fields: list, mode: str = 'strict'):
+        if mode not in VALIDATION_MODES:
+            raise ConnectorConfigError(f"{name}: unknown validation mode {mode!r}, expected one of {VALIDATION_MODES}")
+        self.name = name
+        self.mode = mode
+        self.checks = []  # (column, accepted types, max_length); NoneType is accepted unless REQUIRED
+        for field in fields:
+            types = SCHEMA_TYPES.get(field.get('type', 'STRING').upper())
+            if types is None or field.get('mode') == 'REPEATED':
+                continue  # Records, JSON and arrays are not produced by batch builders
+            if field.get('mode') != 'REQUIRED':
+                types = types | {type(None)}
+            max_length = field.get('max_length') if str in types else None
+            self.checks.append((field['name'], types, max_length))
+
+    def invalid_rows(self, rows: RecordBatch) -> dict:
+        """
+        Return row index -> reason (the first failed check) for every invalid row.
+
+        Each column is checked as a whole first: the set of types it holds
+        and, for strings, its longest value, which typed, dictionary and
+        constant columns answer without a row scan. Rows are only scanned one
+        by one in the columns that fail.
+        """
+        invalid = {}
+        for name, types, max_length in self.checks:
+            column = rows.columns.get(name) or ConstantColumn(None, len(rows))
+            if not column.types() <= types:
+                for i, value in enumerate(column.values()):
+                    if type(value) not in types:
+                        invalid.setdefault(i, 'missing_required' if value is None else 'type_mismatch')
+                continue  # len() of mistyped values is meaningless
+
+            if max_length and column.longest() > max_length:
+                for i, value in enumerate(column.values()):
+                    if value is not None and len(value) > max_length:
+                        invalid.setdefault(i, 'max_length')
+        return invalid
+
+    def validate(self, rows: RecordBatch, metrics: SourceMetrics = None) -> RecordBatch:
+        """
+        Return the rows that pass; see the module docstring for the modes.
+
+        Dropped rows are counted in metrics as 'schema_<reason>'.
+        """
+        if self.mode == 'none' or not rows:
+            return rows
+        metrics = metrics or SourceMetrics(self.name)
+        with metrics.stage('validate'):
+            invalid = self.invalid_rows(rows)
+        if not invalid:
+            return rows
+
+        reasons = {}
+        for reason in invalid.values():
+            reasons[reason] = reasons.get(reason, 0) + 1
+        if self.mode == 'strict':
+            raise SchemaValidationError(f"{len(invalid)} of {len(rows)} rows of {self.name} violate the schema: "
+                                        f"{reasons}")
+        for reason, count in reasons.items():
+            metrics.drop(f"schema_{reason}", count)
+        logger.warning(f"Dropped {len(invalid)} of {len(rows)} rows of {self.name} that violate the schema: {reasons}")
+        return rows.filter(i not in invalid for i in range(len(rows)))
+
+
+class Connector:
+    """A compiled connector: endpoint settings, batch builder and batch validator."""
+
+    def __init__(self, source_id: str, config: dict, schema: dict):
+        ingestion = config.get('ingestion') or {}
+        self.source_id = source_id
+        self.name = ingestion.get('name', source_id)
+        mapping = config.get('mapping') or {}
+        _, date_fields, columns, _ = _read_mapping(self.name, mapping)
+        self.columns = BASE_COLUMNS + tuple(column for column, _, _ in columns)
+        self.source_fields = tuple(dict.fromkeys(date_fields + tuple(field for _, field, _ in columns)))
+        self.build_batch = compile_batch_builder(self.name, mapping)
+
+        schema_config = config.get('schema') or {}
+        fields = schema.get('fields') or []
+        self.validator = BatchValidator(self.name, fields, schema_config.get('validation', 'strict'))
+
+        schema_columns = {field['name'] for field in fields}
+        missing = [c for c in self.columns if c not in schema_columns]
+        if missing:
+            raise ConnectorConfigError(f"{self.name}: columns {missing} are not in the table schema")
+        unfilled = [field['name'] for field in fields
+                    if field.get('mode') == 'REQUIRED' and field['name'] not in self.columns]
+        if unfilled:
+            raise ConnectorConfigError(f"{self.name}: REQUIRED fields {unfilled} are never filled")
+
+        for key in ('api_endpoint', 'destination_table'):
+            if not ingestion.get(key):
+                raise ConnectorConfigError(f"{self.name}: ingestion.{key} is required")
+        self.ingestion = ingestion
+        self.processing = config.get('processing') or {}
+
+    def endpoint_config(self) -> dict:
+        """Return the endpoint settings in the function's API_ENDPOINTS form."""
+        ingestion = self.ingestion
+        config = {
+            'url': ingestion['api_endpoint'],
+            'table': ingestion['destination_table'],
+            'fields': list(self.source_fields),
+            'data_key': ingestion.get('data_key', self.name),
+            'lookback_days': ingestion.get('lookback_days', 0),
+            'load_format': ingestion.get('load_format', 'json'),
+            'connector': self
+        }
+        if ingestion.get('sink'):
+            config['sink'] = ingestion['sink']
+        aggregates = self.processing.get('aggregates')
+        if aggregates:
+            config['aggregates'] = {column: tuple(kinds) for column, kinds in aggregates.items()}
+        return config
+
+
+def default_connector_root(start: str = None) -> str:
+    """
+    Return the nearest directory at or above start (this module's directory)
+    that holds config/connectors: the function root when deployed, the
+    repository root when run from a checkout.
+    """
+    origin = directory = os.path.abspath(start or os.path.dirname(__file__))
+    while True:
+        if os.path.isdir(os.path.join(directory, 'config', 'connectors')):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            raise ConnectorConfigError(f"No config/connectors directory at or above {origin}")
+        directory = parent
+
+
+def _load_yaml(path: str) -> dict:
+    import yaml
+
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path) as f:
+        return yaml.load(f, Loader=loader) or {}
+
+
+def load_connectors(root: str, function: str) -> dict:
+    """
+    Read and compile every connector config under root run by a function.
+
+    Args:
+        root: Directory holding config/connectors/*.yaml and the schemas
+            they reference (schema.file is relative to root)
+        function: Value of ingestion.function that selects the connectors
+
+    Returns:
+        Map of connector name to Connector, in file name order
+    """
+    connectors = {}
+    for path in sorted(glob.glob(os.path.join(root, 'config', 'connectors', '*.yaml'))):
+        config = _load_yaml(path)
+        if (config.get('ingestion') or {}).get('function') != function:
+            continue
+        source_id = config.get('source_id') or os.path.splitext(os.path.basename(path))[0]
+        schema_file = (config.get('schema') or {}).get('file')
+        if not schema_file:
+            raise ConnectorConfigError(f"{source_id}: schema.file is required")
+        with open(os.path.join(root, schema_file)) as f:
+            schema = json.load(f)
+
+        connector = Connector(source_id, config, schema)
+        if connector.name in connectors:
+            raise ConnectorConfigError(f"Duplicate connector name {connector.name!r} in {path}")
+        connectors[connector.name] = connector
+    logger.info(f"Compiled {len(connectors)} connectors for {function} from {root}")
+    return connectors
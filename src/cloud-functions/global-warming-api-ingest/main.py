@@ -9,16 +9,39 @@ Data sources:
 - CO2: https://global-warming.org/api/co2-api
 - Methane: https://global-warming.org/api/methane-api
 - Nitrous Oxide: https://global-warming.org/api/nitrous-oxide-api
+
+Each endpoint is defined by a connector config (config/connectors/gw_*.yaml)
+and the schema of its table (schemas/raw_gw_*.json), see connectors.py.
 """
 
+from __future__ import annotations
+
 import functions_framework
-import requests
-from google.cloud import bigquery
-from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import partial
+import codecs
 import hashlib
 import logging
 import os
 import json
+import time
+import uuid
+
+from aggregates import MonthlySeries, month_index, summarize, write_summaries
+from connectors import default_connector_root, load_connectors
+from fanout import create_result_store, create_task_queue, fan_out, new_run_id, read_push_task, run_task
+from fetch_state import content_digest, create_fetch_state_store
+from http_fetch import Fetcher
+from metrics import RunMetrics, SourceMetrics
+from runtime import LazyBigQueryClient, bigquery, get_http_session, requests
+from series_cache import invalidate_series_cache
+from parquet_load import load_rows_as_parquet
+from pipeline import Deadline
+from record_batch import RecordBatch
+from sinks import LoadJobSink, StreamingSink
+from snapshot_archive import create_snapshot_archive
+from streaming import MissingKeyError, NdjsonUploadBuffer, iter_json_array
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,166 +49,410 @@ logger = logging.getLogger(__name__)
 # Configuration from environment variables
 PROJECT_ID = os.environ.get('GCP_PROJECT', os.environ.get('GOOGLE_CLOUD_PROJECT'))
 DATASET_ID = os.environ.get('DATASET_ID', 'climate_data')
-
-API_ENDPOINTS = {
-    'temperature': {
-        'url': 'https://global-warming.org/api/temperature-api',
-        'table': 'raw_gw_temperature',
-        'fields': ['time', 'station', 'land'],
-        'data_key': 'result'  # Key in API response
-    },
-    'co2': {
-        'url': 'https://global-warming.org/api/co2-api',
-        'table': 'raw_gw_co2',
-        'fields': ['year', 'month', 'day', 'cycle', 'trend'],
-        'data_key': 'co2'
-    },
-    'methane': {
-        'url': 'https://global-warming.org/api/methane-api',
-        'table': 'raw_gw_methane',
-        'fields': ['date', 'average', 'trend'],
-        'data_key': 'methane'
-    },
-    'nitrous-oxide': {
-        'url': 'https://global-warming.org/api/nitrous-oxide-api',
-        'table': 'raw_gw_nitrous_oxide',
-        'fields': ['date', 'average', 'trend'],
-        'data_key': 'nitrous'
-    }
+MAX_WORKERS = max(1, int(os.environ.get('MAX_WORKERS', '4')))  # Endpoints fetched/loaded concurrently
+FETCH_STATE_URI = os.environ.get('FETCH_STATE_URI')  # gs://bucket/object or local path; unset disables
+LOAD_MODE = os.environ.get('LOAD_MODE', 'incremental')  # 'incremental' or 'full_refresh'
+STREAM_JSON = os.environ.get('STREAM_JSON', 'false').lower() == 'true'  # Decode payloads incrementally
+STREAM_GZIP = os.environ.get('STREAM_GZIP', 'true').lower() == 'true'  # Gzip the streamed upload buffer
+STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read from the response per chunk in streaming mode
+STREAM_VALIDATE_BATCH = 1000  # Streamed records built and validated against the schema per batch
+INCLUDE_METRICS = os.environ.get('INCLUDE_METRICS', 'false').lower() == 'true'  # Add 'metrics' to the response
+RUN_DEADLINE_SECONDS = float(os.environ.get('RUN_DEADLINE_SECONDS', '500'))  # Whole-run budget, under the 540s timeout
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', '3'))  # Retries of transient download failures
+FETCH_HEDGE_PERCENTILE = float(os.environ.get('FETCH_HEDGE_PERCENTILE', '0'))  # Hedge slow downloads; 0 disables
+SNAPSHOT_ARCHIVE_URI = os.environ.get('SNAPSHOT_ARCHIVE_URI')  # gs://bucket/prefix or local dir; unset disables
+WRITE_SINK = os.environ.get('WRITE_SINK', 'load_job')  # 'load_job' or 'streaming'; an endpoint's 'sink' overrides
+MAINTAIN_AGGREGATES = os.environ.get('MAINTAIN_AGGREGATES', 'true').lower() == 'true'  # Update the agg_* tables
+SERIES_CACHE_URL = os.environ.get('SERIES_CACHE_URL')  # climate-series-api URL to invalidate after loads; unset disables
+CONNECTOR_ROOT = os.environ.get('CONNECTOR_ROOT')  # Holds config/connectors and schemas; default: nearest above main.py
+FANOUT_TOPIC = os.environ.get('FANOUT_TOPIC')  # Pub/Sub topic of per-endpoint tasks, or 'local'; unset disables fan-out
+FANOUT_RESULTS_URI = os.environ.get('FANOUT_RESULTS_URI')  # gs://bucket/prefix or local dir of worker results
+FANOUT_POLL_SECONDS = float(os.environ.get('FANOUT_POLL_SECONDS', '2'))  # Interval of the coordinator's result checks
+
+# Summary tables kept next to the raw tables, by summary kind (see aggregates.py)
+SUMMARY_TABLES = {
+    'annual': 'agg_gw_annual',
+    'rolling_12m': 'agg_gw_rolling_12m',
+    'yoy': 'agg_gw_yoy_growth'
 }
 
+# Endpoints are compiled once, at import, from the connector configs of this function
+# (config/connectors/gw_*.yaml) and the table schemas they reference (see connectors.py)
+CONNECTORS = load_connectors(CONNECTOR_ROOT or default_connector_root(), 'global-warming-api-ingest')
+API_ENDPOINTS = {name: connector.endpoint_config() for name, connector in CONNECTORS.items()}
 
-def generate_record_id(endpoint_name: str, time_value: str) -> str:
-    """Generate unique record ID from endpoint name and time value."""
-    composite = f"{endpoint_name}_{time_value}"
-    return hashlib.md5(composite.encode()).hexdigest()
 
+def submit_watermark_query(client: bigquery.Client, table_id: str) -> bigquery.QueryJob:
+    """Start the query for a table's high-water mark without waiting for it."""
+    query = f"""
+    SELECT measurement_date, record_id
+    FROM `{table_id}`
+    ORDER BY measurement_date DESC, record_id DESC
+    LIMIT 1
+    """
+    return client.query(query)
 
-def parse_time_to_date(time_str: str, endpoint_name: str) -> date:
+
+def read_watermark(job: bigquery.QueryJob, metrics: SourceMetrics = None, deadline: Deadline = None) -> dict:
     """
-    Parse time string to date.
-    Handles different formats from different API endpoints.
+    Wait for a watermark query and return the measurement_date and record_id
+    of the table's latest row, or None if the table is empty.
     """
-    try:
-        if endpoint_name == 'temperature':
-            # Temperature API uses decimal format like "1880.0417"
-            if '.' in str(time_str):
-                year = int(float(time_str))
-                month_decimal = float(time_str) - year
-                month = max(1, min(12, int(month_decimal * 12) + 1))
-                return date(year, month, 1)
-            else:
-                return datetime.strptime(str(time_str), '%Y-%m-%d').date()
-
-        elif endpoint_name == 'co2':
-            # CO2 API has year, month, day fields
-            return date(int(time_str['year']), int(time_str['month']), int(time_str['day']))
-
-        elif endpoint_name in ['methane', 'nitrous-oxide']:
-            # These APIs use YYYY-MM format
-            if isinstance(time_str, str) and '-' in time_str:
-                parts = time_str.split('-')
-                return date(int(parts[0]), int(parts[1]), 1)
-
-        logger.warning(f"Unexpected time format for {endpoint_name}: {time_str}")
+    rows = list(job.result(timeout=deadline.remaining() if deadline else None))
+    if metrics:
+        metrics.add_job(job)
+    if not rows:
         return None
+    return {'measurement_date': rows[0]['measurement_date'], 'record_id': rows[0]['record_id']}
 
-    except Exception as e:
-        logger.warning(f"Failed to parse date {time_str} for {endpoint_name}: {e}")
+
+def create_fetcher(session) -> Fetcher:
+    """Return a Fetcher over an HTTP session, configured from the environment."""
+    return Fetcher(session, retries=FETCH_RETRIES, hedge_percentile=FETCH_HEDGE_PERCENTILE or None)
+
+
+def get_watermark(client: bigquery.Client, table_id: str, metrics: SourceMetrics = None,
+                  deadline: Deadline = None) -> dict:
+    """
+    Return the high-water mark of a table: the measurement_date and record_id
+    of its latest row, or None if the table is empty.
+    """
+    return read_watermark(submit_watermark_query(client, table_id), metrics, deadline)
+
+
+def watermark_cutoff(watermark: dict, lookback_days: int) -> str:
+    """
+    Return the earliest ISO measurement_date to load, or None to load everything:
+    lookback_days before the watermark, or the day after it without a look-back.
+    """
+    if not watermark:
         return None
+    if not lookback_days:
+        return (watermark['measurement_date'] + timedelta(days=1)).isoformat()
+    return (watermark['measurement_date'] - timedelta(days=lookback_days)).isoformat()
 
 
-def fetch_and_load_endpoint(client: bigquery.Client, endpoint_name: str, config: dict):
-    """Fetch data from an API endpoint and load it into BigQuery."""
-    logger.info(f"Fetching data from {endpoint_name} endpoint: {config['url']}")
+def rows_since(rows: RecordBatch, cutoff: str) -> RecordBatch:
+    """Return the rows measured on or after an ISO date; all of them if cutoff is None."""
+    if cutoff is None:
+        return rows
+    cutoff_day = date.fromisoformat(cutoff).toordinal()
+    return rows.filter(day >= cutoff_day for day in rows.column('measurement_date').ordinals)
+
+
+def filter_rows_after_watermark(rows: RecordBatch, watermark: dict, lookback_days: int) -> RecordBatch:
+    """
+    Keep rows newer than the watermark, plus rows inside the look-back window
+    behind it (the watermark's own date included) so that revised values are
+    picked up.
+    """
+    return rows_since(rows, watermark_cutoff(watermark, lookback_days))
+
+
+def load_rows(client: bigquery.Client, rows, table_id: str, job_config: bigquery.LoadJobConfig,
+              load_format: str = 'json'):
+    """
+    Submit a load job for a RecordBatch or an NdjsonUploadBuffer.
+
+    Batches are sent as JSON, serialized row by row, or, with
+    load_format='parquet', as Parquet typed by job_config.schema (or the
+    table's own schema).
+    """
+    if isinstance(rows, NdjsonUploadBuffer):
+        job_config.source_format = bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+        if job_config.schema is None:
+            job_config.schema = client.get_table(table_id).schema
+        return client.load_table_from_file(rows.open(), table_id, job_config=job_config, rewind=True)
+    if load_format == 'parquet':
+        schema = job_config.schema or client.get_table(table_id).schema
+        return load_rows_as_parquet(client, rows, table_id, job_config, schema)
+    return client.load_table_from_json(rows.iter_rows(), table_id, job_config=job_config)
+
+
+def merge_rows(client: bigquery.Client, table_id: str, rows, load_format: str = 'json',
+               metrics: SourceMetrics = None, deadline: Deadline = None):
+    """
+    Upsert rows (a RecordBatch or an NdjsonUploadBuffer) into a table on
+    record_id through a staging table.
+
+    A MERGE fails if several source rows match one target row, so only the
+    last row of each record_id in the payload is staged; the others are
+    counted as 'duplicate_record_id' drops. The MERGE only touches target
+    partitions at or after the earliest measurement_date being merged. The
+    staging load and the MERGE are timed as the 'load' and 'merge' stages of
+    metrics when given, and neither job is waited on past the deadline.
+    """
+    metrics = metrics or SourceMetrics(table_id)
+    deadline = deadline or Deadline()
+    temp_table_id = f"{table_id}_temp_{uuid.uuid4().hex}"
+    if isinstance(rows, NdjsonUploadBuffer):
+        staged = rows.unique()
+        columns, min_date = staged.columns, staged.min_date
+    else:
+        staged = rows.unique('record_id')
+        columns, min_date = staged.column_names, staged.column('measurement_date').min()
+    metrics.drop('duplicate_record_id', len(rows) - len(staged))
+
+    # Stage with the target schema so string columns such as 'time' are not autodetected as numbers
+    job_config = bigquery.LoadJobConfig(
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        schema=client.get_table(table_id).schema,
+    )
 
     try:
-        # Fetch data from API with timeout
-        response = requests.get(config['url'], timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        with metrics.stage('load'):
+            job = load_rows(client, staged, temp_table_id, job_config, load_format)
+            job.result(timeout=deadline.remaining())
+        metrics.add_job(job)
+
+        update_columns = [c for c in columns if c not in ('record_id', 'measurement_date')]
+        merge_query = f"""
+        MERGE `{table_id}` AS target
+        USING `{temp_table_id}` AS source
+        ON target.record_id = source.record_id
+          AND target.measurement_date >= DATE '{min_date}'
+        WHEN MATCHED THEN
+          UPDATE SET {', '.join(f'{c} = source.{c}' for c in update_columns)}
+        WHEN NOT MATCHED THEN
+          INSERT ({', '.join(columns)})
+          VALUES ({', '.join(f'source.{c}' for c in columns)})
+        """
+
+        with metrics.stage('merge'):
+            merge_job = client.query(merge_query)
+            merge_job.result(timeout=deadline.remaining())
+        metrics.add_job(merge_job)
+    finally:
+        client.delete_table(temp_table_id, not_found_ok=True)
+        if staged is not rows and isinstance(staged, NdjsonUploadBuffer):
+            staged.close()
+
+
+def replace_rows(client: bigquery.Client, table_id: str, rows, load_format: str = 'json',
+                 metrics: SourceMetrics = None, deadline: Deadline = None):
+    """Replace a table with rows (a RecordBatch or an NdjsonUploadBuffer) using WRITE_TRUNCATE."""
+    metrics = metrics or SourceMetrics(table_id)
+    deadline = deadline or Deadline()
+    job_config = bigquery.LoadJobConfig(
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        schema_update_options=[
+            bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION
+        ]
+    )
+
+    with metrics.stage('load'):
+        job = load_rows(client, rows, table_id, job_config, load_format)
+        job.result(timeout=deadline.remaining())  # Wait for job to complete
+    metrics.add_job(job)
+
+
+def create_sink(config: dict):
+    """
+    Return the sink an endpoint is written with: its 'sink' setting, else WRITE_SINK.
 
-        # Extract the actual data array using the data_key
-        data_key = config.get('data_key', endpoint_name)
-        if data_key not in data:
-            logger.warning(f"No data key '{data_key}' found in response for {endpoint_name}")
-            return 0
+    The load-job sink merges (merge_rows) or replaces (replace_rows) with the
+    endpoint's load_format; the streaming sink falls back to it for revised
+    rows and full refreshes.
+    """
+    load_format = config.get('load_format', 'json')
+    sink = LoadJobSink(merge=partial(merge_rows, load_format=load_format),
+                       replace=partial(replace_rows, load_format=load_format))
+    if config.get('sink', WRITE_SINK) == 'streaming':
+        return StreamingSink(sink)
+    return sink
 
-        records = data[data_key]
-        logger.info(f"Fetched {len(records)} records from {endpoint_name}")
 
-        # Transform data for BigQuery
-        rows_to_insert = []
-        ingestion_time = datetime.utcnow().isoformat()
+def summary_columns(endpoint_name: str, config: dict) -> dict:
+    """Map the names of an endpoint's summarized series to the row columns they are read from."""
+    if not MAINTAIN_AGGREGATES:
+        return {}
+    return {f"{endpoint_name}_{column}": column for column in config.get('aggregates', {})}
 
-        for record in records:
-            try:
-                # Parse measurement date based on endpoint type
-                if endpoint_name == 'co2':
-                    measurement_date = parse_time_to_date(record, endpoint_name)
-                    time_identifier = f"{record.get('year')}-{record.get('month')}-{record.get('day')}"
-                elif endpoint_name == 'temperature':
-                    time_value = record.get('time', '')
-                    measurement_date = parse_time_to_date(time_value, endpoint_name)
-                    time_identifier = time_value
-                else:  # methane or nitrous-oxide
-                    date_value = record.get('date', '')
-                    measurement_date = parse_time_to_date(date_value, endpoint_name)
-                    time_identifier = date_value
-
-                if not measurement_date:
-                    continue
 
-                # Create base row
-                row = {
-                    'record_id': generate_record_id(endpoint_name, time_identifier),
-                    'measurement_date': measurement_date.isoformat(),
-                    'ingestion_timestamp': ingestion_time,
-                    'source_file': config['url']
-                }
+def update_summary_tables(client: bigquery.Client, endpoint_name: str, config: dict, series: MonthlySeries,
+                          changed_months: set = None, metrics: SourceMetrics = None,
+                          deadline: Deadline = None, dataset: str = None) -> dict:
+    """
+    Recompute and merge the summary rows affected by a load.
 
-                # Add endpoint-specific fields
-                if endpoint_name == 'temperature':
-                    row['land'] = float(record.get('land')) if record.get('land') else None
-                    row['station'] = float(record.get('station')) if record.get('station') else None
-                    row['time'] = record.get('time')
-                elif endpoint_name == 'co2':
-                    row['cycle'] = float(record.get('cycle')) if record.get('cycle') else None
-                    row['trend'] = float(record.get('trend')) if record.get('trend') else None
-                elif endpoint_name in ['methane', 'nitrous-oxide']:
-                    row['average'] = float(record.get('average')) if record.get('average') else None
-                    row['trend'] = float(record.get('trend')) if record.get('trend') else None
+    The series holds every row of the payload, which carries the endpoint's
+    whole history, so windows reaching behind the look-back window are
+    complete. changed_months are the month indexes of the rows that were
+    merged; None (a full refresh) recomputes every window. The summary
+    tables are written to dataset ('project.dataset', defaults to
+    GCP_PROJECT.DATASET_ID), next to the raw table that was loaded.
 
-                rows_to_insert.append(row)
+    Returns:
+        Map of summary kind to the rows merged
+    """
+    kinds = {f"{endpoint_name}_{column}": column_kinds
+             for column, column_kinds in config.get('aggregates', {}).items()}
+    changed = None if changed_months is None else dict.fromkeys(kinds, changed_months)
+    summaries = summarize(series, kinds, changed, metrics)
+    write_summaries(client, dataset or f"{PROJECT_ID}.{DATASET_ID}", SUMMARY_TABLES, summaries, metrics, deadline)
+    return summaries
 
-            except Exception as e:
-                logger.warning(f"Failed to process record in {endpoint_name}: {e}")
-                continue
 
-        if not rows_to_insert:
-            logger.warning(f"No valid records to insert for {endpoint_name}")
-            return 0
+def transform_payload(endpoint_name: str, config: dict, data: dict, metrics: SourceMetrics = None) -> RecordBatch:
+    """
+    Transform a decoded API payload into a batch of BigQuery rows and validate it.
+
+    The connector's batch builder fills the columns of a RecordBatch (see
+    record_batch.py) straight from the records. Records without a parseable
+    date or with invalid values are dropped and counted in metrics. The
+    batch is then validated against the endpoint's schema (see
+    connectors.BatchValidator): in lenient mode rows that violate it are
+    dropped and counted as 'schema_<reason>', in strict mode
+    SchemaValidationError is raised.
+
+    Returns:
+        RecordBatch of the rows, or None if the payload lacks the endpoint's data_key
+    """
+    metrics = metrics or SourceMetrics(endpoint_name)
+    connector = config['connector']
+
+    # Extract the actual data array using the data_key
+    data_key = config.get('data_key', endpoint_name)
+    if data_key not in data:
+        logger.warning(f"No data key '{data_key}' found in response for {endpoint_name}")
+        return None
+
+    records = data[data_key]
+    metrics.count('rows_parsed', len(records))
+    logger.info(f"Fetched {len(records)} records from {endpoint_name}")
+
+    # Transform data for BigQuery
+    with metrics.stage('transform'):
+        rows = connector.build_batch(records, datetime.utcnow().isoformat(), config['url'], metrics)
+    return connector.validator.validate(rows, metrics)
+
+
+def archive_response(archive, endpoint_name: str, url: str, response, metrics: SourceMetrics):
+    """Archive a downloaded body, logging instead of raising on failure."""
+    try:
+        with metrics.stage('archive'):
+            entry = archive.save(endpoint_name, url, response.content, response)
+        metrics.count('bytes_archived', entry['compressed_bytes'])
+    except Exception as e:
+        logger.warning(f"Failed to archive {endpoint_name} snapshot: {e}")
+
+
+def fetch_and_load_endpoint(client: bigquery.Client, endpoint_name: str, config: dict,
+                            session: requests.Session = None, fetch_state=None,
+                            full_refresh: bool = False, metrics: SourceMetrics = None,
+                            deadline: Deadline = None, archive=None):
+    """
+    Fetch data from an API endpoint and load it into BigQuery.
+
+    In incremental mode only rows after the table's watermark, plus those in
+    the endpoint's look-back window behind it, are merged into the table. With full_refresh
+    the table is replaced with WRITE_TRUNCATE. Both go through the endpoint's
+    sink: load jobs, or streaming inserts of new rows (see create_sink()).
+
+    If STREAM_JSON is enabled the response body is decoded incrementally, see
+    stream_and_load_endpoint().
+
+    When a fetch state store is given, the request is made conditionally and
+    the endpoint is skipped if upstream returns 304 or an identical body.
+
+    Stage timings, row and byte counts and BigQuery job statistics are
+    recorded in metrics when given.
+
+    In incremental mode the watermark query is submitted as soon as the body
+    is known to have changed and runs while the payload is parsed and
+    transformed. BigQuery jobs are not waited on past the deadline.
+
+    The request is retried on transient failures, optionally hedged and cut
+    short by the per-host circuit breaker (see http_fetch). A streamed body
+    that fails mid-transfer is not retried.
+
+    With a snapshot archive every downloaded body is archived, so it can be
+    replayed later (see replay.py); archive failures are only logged.
+
+    With MAINTAIN_AGGREGATES the endpoint's summary rows are then updated
+    (see update_summary_tables()); only windows containing a merged month are
+    recomputed. A failed update fails the endpoint before its fetch state is
+    updated, so the next run retries it.
+
+    Returns:
+        Number of rows loaded, or None if the endpoint is unchanged
+    """
+    logger.info(f"Fetching data from {endpoint_name} endpoint: {config['url']}")
+    http = create_fetcher(session or get_http_session())
+    metrics = metrics or SourceMetrics(endpoint_name)
+    deadline = deadline or Deadline()
+
+    try:
+        # Fetch data from API with timeout
+        headers = fetch_state.conditional_headers(config['url']) if fetch_state else {}
+        with metrics.stage('fetch'):
+            response = http.get(config['url'], timeout=30, headers=headers, stream=STREAM_JSON, deadline=deadline)
+            response.raise_for_status()
+
+        if STREAM_JSON:
+            with response:
+                return stream_and_load_endpoint(client, endpoint_name, config, response,
+                                                fetch_state, full_refresh, metrics, deadline, archive)
+
+        metrics.count('bytes_downloaded', len(response.content))
+        digest = content_digest(response.content) if response.status_code != 304 else None
+        if archive and response.status_code != 304:
+            archive_response(archive, endpoint_name, config['url'], response, metrics)
+        if fetch_state and fetch_state.is_unchanged(config['url'], response, digest):
+            fetch_state.update(config['url'], response, digest)
+            logger.info(f"No upstream changes for {endpoint_name}, skipping load")
+            return None
 
-        # Load to BigQuery using WRITE_TRUNCATE to replace existing data
         table_id = f"{PROJECT_ID}.{DATASET_ID}.{config['table']}"
+        watermark_job = None if full_refresh else submit_watermark_query(client, table_id)
 
-        job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-            schema_update_options=[
-                bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION
-            ]
-        )
+        with metrics.stage('parse'):
+            data = response.json()
 
-        job = client.load_table_from_json(
-            rows_to_insert,
-            table_id,
-            job_config=job_config
-        )
+        rows_to_insert = transform_payload(endpoint_name, config, data, metrics)
+        if rows_to_insert is None:
+            return 0
 
-        job.result()  # Wait for job to complete
+        if not rows_to_insert:
+            logger.warning(f"No valid records to insert for {endpoint_name}")
+            return 0
 
-        logger.info(f"Successfully loaded {len(rows_to_insert)} rows to {table_id}")
-        return len(rows_to_insert)
+        columns = summary_columns(endpoint_name, config)
+        series = MonthlySeries()
+        if columns:
+            series.add_batch(rows_to_insert, columns)
+
+        sink = create_sink(config)
+        skipped = 0
+        if full_refresh:
+            # Replace existing data (WRITE_TRUNCATE)
+            sink.replace(client, table_id, rows_to_insert, metrics, deadline)
+            logger.info(f"Successfully loaded {len(rows_to_insert)} rows to {table_id}")
+        else:
+            # Merge only rows past the watermark (plus the look-back window)
+            with metrics.stage('watermark'):
+                watermark = read_watermark(watermark_job, metrics, deadline)
+            transformed = len(rows_to_insert)
+            rows_to_insert = filter_rows_after_watermark(
+                rows_to_insert, watermark, config.get('lookback_days', 0)
+            )
+            metrics.count('rows_before_window', transformed - len(rows_to_insert))
+            logger.info(f"Watermark for {table_id}: {watermark}, {len(rows_to_insert)} rows to merge")
+
+            if rows_to_insert:
+                skipped = sink.merge(client, table_id, rows_to_insert, metrics, deadline).get('skipped', 0)
+                logger.info(f"Successfully merged {len(rows_to_insert)} rows into {table_id}")
+
+        if columns and rows_to_insert:
+            changed = None if full_refresh else {month_index(day) for day in
+                                                 rows_to_insert.column('measurement_date').values()}
+            update_summary_tables(client, endpoint_name, config, series, changed, metrics, deadline)
+
+        if fetch_state:
+            fetch_state.update(config['url'], response, digest)
+
+        metrics.count('rows_loaded', len(rows_to_insert) - skipped)
+        return len(rows_to_insert) - skipped
 
     except requests.exceptions.RequestException as e:
         logger.error(f"HTTP request failed for {endpoint_name}: {e}")
@@ -195,41 +462,361 @@ def fetch_and_load_endpoint(client: bigquery.Client, endpoint_name: str, config:
         raise
 
 
-@functions_framework.http
-def ingest_global_warming_data(request):
+def stream_and_load_endpoint(client: bigquery.Client, endpoint_name: str, config: dict,
+                             response: requests.Response, fetch_state=None, full_refresh: bool = False,
+                             metrics: SourceMetrics = None, deadline: Deadline = None, archive=None):
     """
-    HTTP Cloud Function to ingest Global Warming API data into BigQuery.
+    Decode, transform and load a streamed API response with bounded memory.
 
-    This function can be triggered by Cloud Scheduler or manual HTTP request.
+    Records of the data_key array are decoded as chunks arrive, transformed in
+    batches and written straight into an NdjsonUploadBuffer, which is then loaded (or
+    merged) with a single job. The watermark is read before streaming so rows
+    outside the incremental window are dropped on arrival. The content digest
+    is computed over the streamed bytes, so an identical body is only detected
+    after decoding, but still skips the load.
+
+    Records are built into a RecordBatch and validated against the endpoint's
+    schema STREAM_VALIDATE_BATCH at a time before they are buffered (see
+    transform_payload() for the validation modes).
+
+    Fetch, parse and transform interleave here: time spent waiting for chunks
+    is recorded as 'fetch', building rows as 'transform', validating them as
+    'validate' and the rest of the decode loop (including writes to the
+    upload buffer) as 'parse'.
+
+    With a snapshot archive the chunks are also compressed into a snapshot
+    as they arrive, committed once the body has been read completely.
+
+    Every valid row, including those outside the window, is added to the
+    monthly series the summary tables are computed from.
+
+    Returns:
+        Number of rows loaded, or None if the endpoint is unchanged
     """
+    url = config['url']
+    metrics = metrics or SourceMetrics(endpoint_name)
+    deadline = deadline or Deadline()
+    if fetch_state and response.status_code == 304:
+        fetch_state.update(url, response, None)
+        logger.info(f"No upstream changes for {endpoint_name}, skipping load")
+        return None
 
-    try:
-        logger.info(f"Starting Global Warming API ingestion - Project: {PROJECT_ID}, Dataset: {DATASET_ID}")
+    table_id = f"{PROJECT_ID}.{DATASET_ID}.{config['table']}"
+    cutoff = None
+    if not full_refresh:
+        with metrics.stage('watermark'):
+            watermark = get_watermark(client, table_id, metrics, deadline)
+        cutoff = watermark_cutoff(watermark, config.get('lookback_days', 0))
+        logger.info(f"Watermark for {table_id}: {watermark}")
+
+    hasher = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    snapshot = archive.writer(endpoint_name, url, response) if archive else None
+
+    def text_chunks():
+        chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            metrics.add_time('fetch', time.perf_counter() - start)
+            if chunk is None:
+                break
+            metrics.count('bytes_downloaded', len(chunk))
+            hasher.update(chunk)
+            if snapshot:
+                snapshot.write(chunk)
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+
+    data_key = config.get('data_key', endpoint_name)
+    ingestion_time = datetime.utcnow().isoformat()
+    build_batch = config['connector'].build_batch
+    validator = config['connector'].validator
+    columns = summary_columns(endpoint_name, config)
+    series = MonthlySeries()
+    changed = set()  # Month indexes of the buffered rows
+    fetched = 0
+    outside_window = 0
+    transform_seconds = 0.0
+    decode_started = time.perf_counter()
+    fetch_before = metrics.stages.get('fetch', 0.0)
+    validate_before = metrics.stages.get('validate', 0.0)
+
+    with NdjsonUploadBuffer(compress=STREAM_GZIP) as buffer:
+        def write_batch(records: list):
+            """Build and validate a batch of records and buffer the rows that fall inside the window."""
+            nonlocal outside_window, transform_seconds
+            start = time.perf_counter()
+            rows = build_batch(records, ingestion_time, url, metrics)
+            transform_seconds += time.perf_counter() - start
+            rows = validator.validate(rows, metrics)
+            if columns:
+                series.add_batch(rows, columns)
+            kept = rows_since(rows, cutoff)
+            outside_window += len(rows) - len(kept)
+            for row in kept.iter_rows():
+                buffer.write(row)
+            if columns:
+                changed.update(month_index(day) for day in kept.column('measurement_date').values())
+
+        batch = []
+        try:
+            for record in iter_json_array(text_chunks(), data_key):
+                fetched += 1
+                batch.append(record)
+                if len(batch) >= STREAM_VALIDATE_BATCH:
+                    write_batch(batch)
+                    batch = []
+            write_batch(batch)
+        except MissingKeyError:
+            logger.warning(f"No data key '{data_key}' found in response for {endpoint_name}")
+            return 0
+        finally:
+            fetch_seconds = metrics.stages.get('fetch', 0.0) - fetch_before
+            validate_seconds = metrics.stages.get('validate', 0.0) - validate_before
+            metrics.add_time('transform', transform_seconds)
+            metrics.add_time('parse', time.perf_counter() - decode_started - fetch_seconds - transform_seconds
+                             - validate_seconds)
+            metrics.count('rows_parsed', fetched)
+
+        metrics.count('rows_before_window', outside_window)
+        logger.info(f"Streamed {fetched} records from {endpoint_name}, {len(buffer)} rows to load")
+
+        digest = hasher.hexdigest()
+        if snapshot:
+            try:
+                with metrics.stage('archive'):
+                    entry = snapshot.commit()
+                metrics.count('bytes_archived', entry['compressed_bytes'])
+            except Exception as e:
+                logger.warning(f"Failed to archive {endpoint_name} snapshot: {e}")
+        if fetch_state and fetch_state.is_unchanged(url, response, digest):
+            fetch_state.update(url, response, digest)
+            logger.info(f"No upstream changes for {endpoint_name}, skipping load")
+            return None
+
+        sink = create_sink(config)
+        skipped = 0
+        if full_refresh:
+            if not len(buffer):
+                logger.warning(f"No valid records to insert for {endpoint_name}")
+                return 0
+
+            sink.replace(client, table_id, buffer, metrics, deadline)
+            logger.info(f"Successfully loaded {len(buffer)} rows to {table_id}")
+        elif len(buffer):
+            skipped = sink.merge(client, table_id, buffer, metrics, deadline).get('skipped', 0)
+            logger.info(f"Successfully merged {len(buffer)} rows into {table_id}")
+
+        if columns and len(buffer):
+            update_summary_tables(client, endpoint_name, config, series, None if full_refresh else changed,
+                                  metrics, deadline)
+
+        if fetch_state:
+            fetch_state.update(url, response, digest)
+
+        metrics.count('rows_loaded', len(buffer) - skipped)
+        return len(buffer) - skipped
+
+
+def ingest_endpoints(client: bigquery.Client, fetch_state=None, full_refresh: bool = False,
+                     run_metrics: RunMetrics = None, deadline: Deadline = None, archive=None) -> dict:
+    """
+    Fetch and load every endpoint in this instance, up to MAX_WORKERS at once.
 
-        # Initialize BigQuery client
-        client = bigquery.Client(project=PROJECT_ID)
+    Endpoints still running at the deadline are reported as failed.
 
-        results = {}
-        total_records = 0
+    Returns:
+        Map of endpoint name to its result entry, in API_ENDPOINTS order
+    """
+    run_metrics = run_metrics or RunMetrics('global-warming-api-ingest')
+    deadline = deadline or Deadline()
+    results = {}
 
-        # Process each API endpoint
-        for endpoint_name, config in API_ENDPOINTS.items():
+    # Process API endpoints concurrently; each runs its own fetch -> load -> MERGE chain
+    session = get_http_session(MAX_WORKERS)
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    try:
+        futures = {
+            endpoint_name: executor.submit(fetch_and_load_endpoint, client, endpoint_name, config, session,
+                                           fetch_state, full_refresh, run_metrics.source(endpoint_name),
+                                           deadline, archive)
+            for endpoint_name, config in API_ENDPOINTS.items()
+        }
+
+        # Collect results in API_ENDPOINTS order so the report is stable
+        for endpoint_name, future in futures.items():
             try:
-                count = fetch_and_load_endpoint(client, endpoint_name, config)
+                count = future.result(timeout=deadline.remaining())
+                if count is None:
+                    results[endpoint_name] = {
+                        'status': 'unchanged',
+                        'records': 0
+                    }
+                    continue
                 results[endpoint_name] = {
                     'status': 'success',
                     'records': count
                 }
-                total_records += count
+            except TimeoutError:
+                future.cancel()
+                results[endpoint_name] = {
+                    'status': 'failed',
+                    'error': f"Deadline exceeded after {RUN_DEADLINE_SECONDS:.0f}s"
+                }
+                logger.error(f"Deadline exceeded waiting for {endpoint_name}")
             except Exception as e:
                 results[endpoint_name] = {
                     'status': 'failed',
                     'error': str(e)
                 }
                 logger.error(f"Failed to process {endpoint_name}: {e}")
+    finally:
+        # Do not hold the response for work that overran the deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def process_endpoint_task(task: dict) -> dict:
+    """
+    Worker mode: fetch and load the one endpoint of a fan-out task.
+
+    Returns:
+        Result record for the coordinator: the endpoint's result entry, its
+        fetch state updates and its metrics
+    """
+    endpoint_name, options = task['source'], task['options']
+    config = API_ENDPOINTS[endpoint_name]
+    fetch_state = None if options.get('force') else create_fetch_state_store(FETCH_STATE_URI)
+    run_metrics = RunMetrics('global-warming-api-ingest')
+    try:
+        count = fetch_and_load_endpoint(LazyBigQueryClient(PROJECT_ID), endpoint_name, config,
+                                        get_http_session(MAX_WORKERS), fetch_state, options.get('full_refresh', False),
+                                        run_metrics.source(endpoint_name), Deadline(RUN_DEADLINE_SECONDS),
+                                        create_snapshot_archive(SNAPSHOT_ARCHIVE_URI))
+    finally:
+        run_metrics.log()
+    return {
+        'result': {'status': 'unchanged', 'records': 0} if count is None else {'status': 'success', 'records': count},
+        'fetch_state': fetch_state.updates() if fetch_state else {},
+        'metrics': run_metrics.as_dict()['sources']
+    }
+
+
+def handle_task_push(body: dict) -> tuple:
+    """Run the fan-out task of a Pub/Sub push request body; answers (result entry, status) like the entry point."""
+    store = create_result_store(FANOUT_RESULTS_URI)
+    if store is None:
+        return {'status': 'failed', 'error': 'FANOUT_RESULTS_URI is not set'}, 500
+    record = run_task(store, read_push_task(body), process_endpoint_task)
+    return record['result'], 200
+
+
+def ingest_fanned_out(run_id: str, options: dict, fetch_state=None, deadline: Deadline = None) -> dict:
+    """
+    Coordinator mode: hand every endpoint to its own worker through
+    FANOUT_TOPIC and wait for their results (see fanout.py).
+
+    The workers' fetch state updates are applied to fetch_state, which the
+    caller saves as in an in-process run.
+
+    Returns:
+        Map of endpoint name to its result record, in API_ENDPOINTS order
+    """
+    queue = create_task_queue(FANOUT_TOPIC, handle_task_push, PROJECT_ID, MAX_WORKERS)
+    try:
+        records = fan_out(queue, create_result_store(FANOUT_RESULTS_URI), 'global-warming-api-ingest', run_id,
+                          list(API_ENDPOINTS), options, deadline, FANOUT_POLL_SECONDS)
+    finally:
+        queue.close()
+    if fetch_state:
+        for record in records.values():
+            fetch_state.apply(record.get('fetch_state'))
+    return records
+
+
+@functions_framework.http
+def ingest_global_warming_data(request):
+    """
+    HTTP Cloud Function to ingest Global Warming API data into BigQuery.
+
+    This function can be triggered by Cloud Scheduler or manual HTTP request.
+    Endpoints are fetched and loaded concurrently by up to MAX_WORKERS threads
+    sharing one BigQuery client and one pooled HTTP session; both are cached
+    at module level and reused by later invocations on a warm instance.
+    Endpoints still running after RUN_DEADLINE_SECONDS are reported as failed.
+
+    If FETCH_STATE_URI is set, endpoints whose content has not changed since
+    the last successful run are reported as 'unchanged' and not reloaded.
+    Pass ?force=true to ignore the stored fetch state, and ?full_refresh=true
+    to rewrite every table regardless of LOAD_MODE.
+
+    If SNAPSHOT_ARCHIVE_URI is set, every downloaded payload is kept as a
+    compressed, content-addressed snapshot that replay.py can reprocess.
+
+    With MAINTAIN_AGGREGATES (default) the annual means, 12-month rolling
+    means and year-over-year changes in the agg_gw_* tables are updated
+    after each load, recomputing only the windows around merged months.
+
+    If SERIES_CACHE_URL is set, the climate-series-api service is told which
+    tables took new rows, so it reloads their series (see series_cache.py).
+
+    Per-endpoint stage timings, volumes and BigQuery job statistics are
+    logged as structured entries; with INCLUDE_METRICS or ?metrics=true they
+    are also returned in a 'metrics' block.
+
+    If FANOUT_TOPIC is set, the function runs as a coordinator instead: each
+    endpoint is published as a task and processed by its own invocation of
+    this function, which receives it as a Pub/Sub push request (see
+    fanout.py). The report has the same shape plus the 'run_id'; pass
+    ?run_id=<id> to retry the endpoints of that run that did not finish, or
+    ?fanout=false to process every endpoint in this instance.
+    """
+    task_body = request.get_json(silent=True) if request is not None else None
+    if read_push_task(task_body) is not None:
+        return handle_task_push(task_body)
+
+    try:
+        logger.info(f"Starting Global Warming API ingestion - Project: {PROJECT_ID}, Dataset: {DATASET_ID}, "
+                    f"Workers: {MAX_WORKERS}, Load mode: {LOAD_MODE}")
+
+        # Reuse the instance-wide BigQuery client, created on first use
+        client = LazyBigQueryClient(PROJECT_ID)
+
+        force = request is not None and request.args.get('force', '').lower() == 'true'
+        fetch_state = None if force else create_fetch_state_store(FETCH_STATE_URI)
+        full_refresh = LOAD_MODE == 'full_refresh' or (
+            request is not None and request.args.get('full_refresh', '').lower() == 'true'
+        )
+        include_metrics = INCLUDE_METRICS or (
+            request is not None and request.args.get('metrics', '').lower() == 'true'
+        )
+        run_metrics = RunMetrics('global-warming-api-ingest')
+        deadline = Deadline(RUN_DEADLINE_SECONDS)
+        archive = create_snapshot_archive(SNAPSHOT_ARCHIVE_URI)
+
+        run_id, records = None, {}
+        if FANOUT_TOPIC and (request is None or request.args.get('fanout', '').lower() != 'false'):
+            run_id = (request.args.get('run_id') if request is not None else None) or new_run_id()
+            records = ingest_fanned_out(run_id, {'force': force, 'full_refresh': full_refresh}, fetch_state,
+                                        deadline)
+            results = {name: record['result'] for name, record in records.items()}
+        else:
+            results = ingest_endpoints(client, fetch_state, full_refresh, run_metrics, deadline, archive)
+        total_records = sum(result.get('records', 0) for result in results.values())
+
+        if fetch_state:
+            try:
+                fetch_state.save()
+            except Exception as e:
+                logger.warning(f"Failed to persist fetch state: {e}")
+
+        # Have the read cache reload the series of every table that took new rows
+        invalidate_series_cache(SERIES_CACHE_URL, [API_ENDPOINTS[name]['table'] for name, result in results.items()
+                                                   if result['status'] == 'success' and result.get('records')])
 
         # Determine overall status
-        success_count = sum(1 for r in results.values() if r['status'] == 'success')
+        success_count = sum(1 for r in results.values() if r['status'] in ('success', 'unchanged'))
         overall_status = 'completed' if success_count == len(API_ENDPOINTS) else 'partial_failure'
 
         response_data = {
@@ -240,6 +827,14 @@ def ingest_global_warming_data(request):
             'endpoints_succeeded': success_count,
             'details': results
         }
+        if run_id:
+            response_data['run_id'] = run_id
+
+        run_metrics.log()
+        if include_metrics:
+            response_data['metrics'] = run_metrics.as_dict()
+            for record in records.values():
+                response_data['metrics']['sources'].update(record.get('metrics', {}))
 
         logger.info(f"Ingestion complete: {success_count}/{len(API_ENDPOINTS)} endpoints succeeded, {total_records} total records")
 
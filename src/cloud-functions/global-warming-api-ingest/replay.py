@@ -0,0 +1,211 @@
+"""
+Replay archived Global Warming API snapshots into BigQuery.
+
+Backfill entry point for reprocessing after a transform fix or schema
+change without calling the API. The snapshots fetched in a date range (see
+snapshot_archive.py) are decompressed, decoded and run through
+transform_payload in parallel worker processes. The rows of each endpoint
+are combined with the newest snapshot winning per record_id, so records the
+API has since dropped are kept, and then bulk-loaded with one job per table:
+merged on record_id, or replacing the table with --truncate. The endpoint's
+summary tables are then recomputed in full.
+
+Usage (from the function directory, with the modules of src/shared on the path):
+    export PYTHONPATH=../../shared
+    python replay.py --archive gs://climate-snapshots-PROJECT-REGION/global-warming-api-ingest --since 2026-01-01
+    python replay.py --archive /tmp/snapshots --endpoint co2 --dry-run
+    python replay.py --archive /tmp/snapshots --dataset climate_backfill --truncate
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+from itertools import repeat
+
+import main
+from aggregates import MonthlySeries
+from metrics import RunMetrics, SourceMetrics
+from record_batch import RecordBatch
+from runtime import bigquery, get_bigquery_client
+from snapshot_archive import create_snapshot_archive
+
+logger = logging.getLogger(__name__)
+
+_archives = {}  # Per worker process: archive URI -> SnapshotArchive
+
+
+def parse_bound(value: str, end_of_day: bool = False) -> datetime:
+    """Parse an ISO date or datetime; a bare --until date covers the whole day."""
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        parsed = datetime.combine(parsed.date(), time.max)
+    return parsed
+
+
+def select_snapshots(archive, endpoints: list, since: datetime = None, until: datetime = None) -> list:
+    """Return the index entries of the given endpoints fetched in [since, until], oldest first."""
+    entries = [entry for endpoint in endpoints for entry in archive.entries(endpoint, since, until)]
+    return sorted(entries, key=lambda entry: entry['fetched_at'])
+
+
+def parse_snapshot(archive_uri: str, entry: dict) -> tuple:
+    """
+    Decompress, decode and transform one snapshot; runs in a worker process.
+
+    Returns:
+        Tuple of (entry, rows, metrics); rows is an empty RecordBatch if the payload
+        lacks the endpoint's data_key
+    """
+    archive = _archives.get(archive_uri)
+    if archive is None:
+        archive = _archives[archive_uri] = create_snapshot_archive(archive_uri)
+
+    endpoint_name = entry['source']
+    metrics = SourceMetrics(endpoint_name)
+    with metrics.stage('read'):
+        body = archive.read(entry)
+    with metrics.stage('parse'):
+        data = json.loads(body)
+    rows = main.transform_payload(endpoint_name, main.API_ENDPOINTS[endpoint_name], data, metrics)
+    return entry, rows if rows is not None else RecordBatch({}, 0), metrics
+
+
+def merge_source_metrics(metrics: SourceMetrics, snapshot_metrics: SourceMetrics):
+    """Add the timings and counters of one parsed snapshot to a source's metrics."""
+    for stage, seconds in snapshot_metrics.stages.items():
+        metrics.add_time(stage, seconds)
+    for name, value in snapshot_metrics.counters.items():
+        metrics.count(name, value)
+    for reason, value in snapshot_metrics.dropped.items():
+        metrics.drop(reason, value)
+    metrics.count('snapshots', 1)
+
+
+def combine_vintages(parsed: list) -> dict:
+    """
+    Group parsed rows by endpoint, newest snapshot winning per record_id.
+
+    Args:
+        parsed: (entry, rows, metrics) tuples, oldest snapshot first
+
+    Returns:
+        Map of endpoint name to its combined rows
+    """
+    endpoints = {}
+    for entry, rows, _ in parsed:
+        endpoints.setdefault(entry['source'], []).append(rows)
+    return {endpoint: RecordBatch.concat(batches).unique('record_id') for endpoint, batches in endpoints.items()}
+
+
+def load_table(client: bigquery.Client, endpoint_name: str, table_id: str, rows: RecordBatch, load_format: str,
+               truncate: bool, metrics: SourceMetrics):
+    """
+    Bulk-load the combined rows of one endpoint, merging on record_id or
+    replacing the table, then recompute every window of its summary series
+    in the summary tables of the same project and dataset.
+    """
+    if truncate:
+        main.replace_rows(client, table_id, rows, load_format, metrics)
+    else:
+        main.merge_rows(client, table_id, rows, load_format, metrics)
+    metrics.count('rows_loaded', len(rows))
+
+    config = main.API_ENDPOINTS[endpoint_name]
+    columns = main.summary_columns(endpoint_name, config)
+    if columns:
+        series = MonthlySeries()
+        series.add_batch(rows, columns)
+        main.update_summary_tables(client, endpoint_name, config, series, metrics=metrics,
+                                   dataset=table_id.rsplit('.', 1)[0])
+
+
+def replay(archive_uri: str, since: datetime = None, until: datetime = None, endpoints: list = None,
+           project: str = None, dataset: str = None, workers: int = None, truncate: bool = False,
+           dry_run: bool = False, run_metrics: RunMetrics = None) -> dict:
+    """
+    Re-transform and reload the archived snapshots fetched in [since, until].
+
+    Args:
+        archive_uri: Snapshot archive (gs://bucket/prefix or local directory)
+        since: Earliest fetch time to replay, None for the start of the archive
+        until: Latest fetch time to replay, None for now
+        endpoints: API_ENDPOINTS names to replay (defaults to all)
+        project: Target project (defaults to GCP_PROJECT)
+        dataset: Target dataset (defaults to DATASET_ID)
+        workers: Parser processes (defaults to the CPU count)
+        truncate: Replace tables instead of merging into them
+        dry_run: Parse only, load nothing
+        run_metrics: Receives read/parse/transform and load/merge timings per endpoint
+
+    Returns:
+        Map of endpoint name to its result entry
+    """
+    archive = create_snapshot_archive(archive_uri)
+    if archive is None:
+        raise ValueError("A snapshot archive URI is required")
+    endpoints = endpoints or list(main.API_ENDPOINTS)
+    run_metrics = run_metrics or RunMetrics('global-warming-api-replay')
+
+    entries = select_snapshots(archive, endpoints, since, until)
+    logger.info(f"Replaying {len(entries)} snapshots of {', '.join(endpoints)} from {archive_uri}")
+    if not entries:
+        return {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parsed = list(executor.map(parse_snapshot, repeat(archive_uri), entries))
+
+    for entry, _, snapshot_metrics in parsed:
+        merge_source_metrics(run_metrics.source(entry['source']), snapshot_metrics)
+
+    results = {}
+    client = None if dry_run else get_bigquery_client(project or main.PROJECT_ID)
+    for endpoint_name, rows in combine_vintages(parsed).items():
+        config = main.API_ENDPOINTS[endpoint_name]
+        snapshot_count = sum(1 for entry, _, _ in parsed if entry['source'] == endpoint_name)
+        results[endpoint_name] = {'status': 'parsed' if dry_run else 'success', 'records': len(rows),
+                                  'snapshots': snapshot_count}
+        if dry_run or not rows:
+            continue
+
+        table_id = f"{project or main.PROJECT_ID}.{dataset or main.DATASET_ID}.{config['table']}"
+        try:
+            load_table(client, endpoint_name, table_id, rows, config.get('load_format', 'json'), truncate,
+                       run_metrics.source(endpoint_name))
+            logger.info(f"Replayed {len(rows)} rows from {snapshot_count} snapshots into {table_id}")
+        except Exception as e:
+            logger.error(f"Failed to replay {endpoint_name} into {table_id}: {e}")
+            results[endpoint_name] = {'status': 'failed', 'error': str(e)}
+
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--archive', default=main.SNAPSHOT_ARCHIVE_URI, help='Snapshot archive URI or directory')
+    parser.add_argument('--since', help='Earliest fetch date or datetime (UTC)')
+    parser.add_argument('--until', help='Latest fetch date or datetime (UTC), inclusive')
+    parser.add_argument('--endpoint', action='append', choices=sorted(main.API_ENDPOINTS),
+                        help='Endpoint to replay (repeatable, defaults to all)')
+    parser.add_argument('--project', help='Target project (defaults to GCP_PROJECT)')
+    parser.add_argument('--dataset', help='Target dataset (defaults to DATASET_ID)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Parser processes')
+    parser.add_argument('--truncate', action='store_true', help='Replace tables instead of merging')
+    parser.add_argument('--dry-run', action='store_true', help='Parse the snapshots without loading')
+    args = parser.parse_args()
+
+    run_metrics = RunMetrics('global-warming-api-replay')
+    results = replay(args.archive, parse_bound(args.since), parse_bound(args.until, end_of_day=True),
+                     args.endpoint, args.project, args.dataset, args.workers, args.truncate, args.dry_run,
+                     run_metrics)
+    print(json.dumps({'details': results, 'metrics': run_metrics.as_dict()}, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main_cli()
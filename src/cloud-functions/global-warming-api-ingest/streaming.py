@@ -0,0 +1,200 @@
+"""
+Streaming helpers for large API payloads.
+
+- iter_json_array() decodes the elements of one top-level array in a JSON
+  object incrementally from text chunks, so the full payload is never held
+  in memory.
+- NdjsonUploadBuffer collects transformed rows as newline-delimited JSON,
+  optionally gzip-compressed, spooled to disk once it grows past a limit,
+  ready to hand to client.load_table_from_file().
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import tempfile
+
+_WHITESPACE = ' \t\r\n'
+_NUMBER_START = '-0123456789'
+_NUMBER_CHARS = '0123456789.eE+-'
+
+
+class MissingKeyError(KeyError):
+    """Raised when the requested top-level key is not in the JSON document."""
+
+
+class _JsonChunkReader:
+    """Cursor over a JSON document arriving as an iterable of text chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer, dropping consumed text. Returns False at EOF."""
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer = self._buffer[self._pos:] + chunk
+                self._pos = 0
+                return True
+        self._eof = True
+        return False
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in JSON stream, found '{found or 'EOF'}'")
+        self._pos += 1
+
+    def _at_buffer_end(self, pos: int) -> bool:
+        """Whether only number characters follow pos up to the end of the buffer."""
+        while pos < len(self._buffer) and self._buffer[pos] in _NUMBER_CHARS:
+            pos += 1
+        return pos == len(self._buffer)
+
+    def decode_value(self):
+        """Decode the next complete JSON value, reading more chunks as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number running to the end of the buffer ('12', or '6.' and '1e-' that
+            # decode as 6 and 1) may continue in the next chunk
+            if (not self._eof and self._buffer[self._pos] in _NUMBER_START
+                    and self._at_buffer_end(end) and self._fill()):
+                continue
+            self._pos = end
+            return value
+
+
+def iter_json_array(chunks, key: str):
+    """
+    Yield the elements of the array stored under a top-level key.
+
+    Args:
+        chunks: Iterable of text chunks forming one JSON object
+        key: Top-level key holding the array to stream
+
+    Other top-level values are decoded and discarded as they are passed.
+    Raises MissingKeyError if the key is not present.
+    """
+    reader = _JsonChunkReader(chunks)
+    reader.expect('{')
+
+    while reader.peek() != '}':
+        name = reader.decode_value()
+        reader.expect(':')
+
+        if name == key:
+            reader.expect('[')
+            while reader.peek() != ']':
+                yield reader.decode_value()
+                if reader.peek() == ',':
+                    reader.expect(',')
+            return
+
+        reader.decode_value()
+        if reader.peek() == ',':
+            reader.expect(',')
+
+    raise MissingKeyError(key)
+
+
+class NdjsonUploadBuffer:
+    """
+    Newline-delimited JSON rows for a BigQuery load job.
+
+    Rows are serialized in chunks of chunk_rows into a spooled temporary file
+    that stays in memory up to max_memory bytes. Tracks the row count, the
+    column names of the first row, the earliest measurement_date and the
+    position of the last row of each record_id.
+    """
+
+    def __init__(self, compress: bool = True, chunk_rows: int = 1000, max_memory: int = 8 * 1024 * 1024):
+        self.compress = compress
+        self.chunk_rows = chunk_rows
+        self.max_memory = max_memory
+        self.row_count = 0
+        self.columns = None
+        self.min_date = None
+        self._last = {}  # record_id -> position of its last row
+        self._pending = []
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self._stream = gzip.GzipFile(fileobj=self._file, mode='wb') if compress else self._file
+
+    def write(self, row: dict):
+        if self.columns is None:
+            self.columns = list(row.keys())
+        measurement_date = row.get('measurement_date')
+        if measurement_date and (self.min_date is None or measurement_date < self.min_date):
+            self.min_date = measurement_date
+        self._last[row.get('record_id')] = self.row_count
+
+        self._pending.append(json.dumps(row))
+        self.row_count += 1
+        if len(self._pending) >= self.chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._stream.write(('\n'.join(self._pending) + '\n').encode())
+            self._pending.clear()
+
+    def open(self):
+        """Finish writing and return the underlying file positioned at the start."""
+        self._flush()
+        if self.compress and not self._stream.closed:
+            self._stream.close()  # Writes the gzip trailer; leaves self._file open
+        self._file.seek(0)
+        return self._file
+
+    def iter_rows(self):
+        """Finish writing and decode the buffered rows again, e.g. for a streaming insert."""
+        file = self.open()
+        stream = gzip.GzipFile(fileobj=file, mode='rb') if self.compress else file
+        for line in stream:
+            yield json.loads(line)
+
+    def unique(self) -> NdjsonUploadBuffer:
+        """
+        Return a buffer with only the last row of each record_id, or this
+        buffer if no record_id repeats. The caller closes the new buffer.
+        """
+        if len(self._last) == self.row_count:
+            return self
+        keep = set(self._last.values())
+        unique = NdjsonUploadBuffer(self.compress, self.chunk_rows, self.max_memory)
+        for position, row in enumerate(self.iter_rows()):
+            if position in keep:
+                unique.write(row)
+        return unique
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self):
+        return self.row_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,131 @@
+"""
+Row-level change detection for GISTEMP loads.
+
+Keeps, per target table, a compact manifest of record_id -> value fingerprint
+for every row that has been loaded. Each freshly parsed batch is diffed
+against it so only new or revised rows are staged and merged, and
+ingestion_timestamp only moves when a value actually changes.
+
+Batches are diffed column by column (see record_batch.py); the changed
+rows come back as batches too.
+
+The manifest is one JSON document stored with the same backends as the
+fetch state (gs://bucket/object or a local path).
+"""
+
+import hashlib
+import logging
+
+from fetch_state import create_state_backend
+from record_batch import RecordBatch
+
+logger = logging.getLogger(__name__)
+
+# Columns that change on every run without the measurement changing
+VOLATILE_COLUMNS = ('ingestion_timestamp',)
+
+
+def row_fingerprint(row: dict) -> str:
+    """Return a short digest of a row's values, ignoring volatile columns."""
+    values = tuple((k, row[k]) for k in sorted(row) if k not in VOLATILE_COLUMNS)
+    return hashlib.blake2b(repr(values).encode(), digest_size=8).hexdigest()
+
+
+def batch_fingerprints(rows: RecordBatch) -> list:
+    """Return row_fingerprint() of every row of a batch, without building the rows."""
+    names = sorted(name for name in rows.column_names if name not in VOLATILE_COLUMNS)
+    blake2b = hashlib.blake2b
+    return [blake2b(repr(tuple(zip(names, values))).encode(), digest_size=8).hexdigest()
+            for values in zip(*(rows.column(name).values() for name in names))]
+
+
+class RowChanges:
+    """Result of diffing a batch of rows against the manifest."""
+
+    def __init__(self, inserted: RecordBatch, updated: RecordBatch, fingerprints: dict):
+        self.inserted = inserted
+        self.updated = updated
+        self.fingerprints = fingerprints
+
+    @property
+    def rows(self) -> RecordBatch:
+        return RecordBatch.concat([self.inserted, self.updated])
+
+    def __len__(self):
+        return len(self.inserted) + len(self.updated)
+
+
+class ChangeManifest:
+    """
+    Per-table record_id -> fingerprint manifest.
+
+    diff() does not modify the manifest; call commit() once the changed rows
+    have been loaded, and save() to persist all committed tables.
+
+    A manifest created with tables={} and complete=False stands in for one
+    that could not be read: every row is reported as updated rather than
+    inserted, since it may already be stored, so it is merged and never
+    streamed as new. Without a backend, save() does nothing.
+    """
+
+    def __init__(self, backend, tables: dict = None, complete: bool = True):
+        self.backend = backend
+        self.complete = complete
+        self._tables = backend.read() if tables is None else tables
+        self._committed = {}  # table -> fingerprints committed since the manifest was read
+        self._dirty = False
+
+    def diff(self, table: str, rows: RecordBatch) -> RowChanges:
+        known = self._tables.get(table, {})
+        inserted, updated, fingerprints = [], [], {}
+        record_ids = rows.column('record_id').values()
+        for position, (record_id, fingerprint) in enumerate(zip(record_ids, batch_fingerprints(rows))):
+            fingerprints[record_id] = fingerprint
+            previous = known.get(record_id)
+            if previous is None and self.complete:
+                inserted.append(position)
+            elif previous != fingerprint:
+                updated.append(position)
+        return RowChanges(rows.take(inserted), rows.take(updated), fingerprints)
+
+    def commit(self, table: str, changes: RowChanges):
+        if not changes.fingerprints:
+            return
+        self.apply({table: changes.fingerprints})
+
+    def updates(self) -> dict:
+        """Return the fingerprints committed since the manifest was read, by table."""
+        return {table: dict(fingerprints) for table, fingerprints in self._committed.items()}
+
+    def apply(self, updates: dict):
+        """Commit fingerprints by table, as returned by updates() of another manifest."""
+        for table, fingerprints in (updates or {}).items():
+            self._tables.setdefault(table, {}).update(fingerprints)
+            self._committed.setdefault(table, {}).update(fingerprints)
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty or self.backend is None:
+            return
+        self.backend.write(self._tables)
+        self._dirty = False
+
+
+def create_change_manifest(uri: str):
+    """
+    Create a ChangeManifest for a gs:// URI or local path.
+
+    Returns None when no URI is configured, which disables change detection.
+    A manifest that cannot be read (e.g. a GCS 403 or 5xx) is logged and
+    replaced by an empty, incomplete one, so every row is merged; the
+    manifest never blocks a run.
+    """
+    if not uri:
+        return None
+    backend = None
+    try:
+        backend = create_state_backend(uri)
+        return ChangeManifest(backend)
+    except Exception as e:
+        logger.warning(f"Failed to read change manifest from {uri}, merging every row: {e}")
+        return ChangeManifest(backend, tables={}, complete=False)
@@ -11,15 +11,32 @@ Data sources:
 - Zonal Annual: https://data.giss.nasa.gov/gistemp/tabledata_v4/ZonAnn.Ts+dSST.csv
 """
 
+from __future__ import annotations
+
 import functions_framework
-import requests
-from google.cloud import bigquery
-from datetime import datetime, date
+from array import array
+from datetime import date, datetime
+from functools import partial
+from itertools import repeat
 import hashlib
 import csv
-import io
 import logging
 import os
+import uuid
+
+from aggregates import MonthlySeries, month_index, summarize, write_summaries
+from change_manifest import RowChanges, create_change_manifest
+from fanout import create_result_store, create_task_queue, fan_out, new_run_id, read_push_task, run_task
+from fetch_state import content_digest, create_fetch_state_store
+from http_fetch import Fetcher
+from metrics import RunMetrics, SourceMetrics
+from parquet_load import load_rows_as_parquet
+from pipeline import Deadline, JobPipeline
+from record_batch import ArrayColumn, ConstantColumn, DateColumn, DictionaryColumn, ListColumn, RecordBatch
+from runtime import LazyBigQueryClient, bigquery, get_http_session, requests
+from series_cache import invalidate_series_cache
+from sinks import LoadJobSink, StreamingSink
+from snapshot_archive import create_snapshot_archive
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,28 +44,57 @@ logger = logging.getLogger(__name__)
 # Configuration from environment variables
 PROJECT_ID = os.environ.get('GCP_PROJECT', os.environ.get('GOOGLE_CLOUD_PROJECT'))
 DATASET_ID = os.environ.get('DATASET_ID', 'climate_data')
+FETCH_STATE_URI = os.environ.get('FETCH_STATE_URI')  # gs://bucket/object or local path; unset disables
+BATCH_MERGE = os.environ.get('BATCH_MERGE', 'true').lower() == 'true'  # One MERGE per target table
+CHANGE_MANIFEST_URI = os.environ.get('CHANGE_MANIFEST_URI')  # gs://bucket/object or local path; unset disables
+INCLUDE_METRICS = os.environ.get('INCLUDE_METRICS', 'false').lower() == 'true'  # Add 'metrics' to the response
+RUN_DEADLINE_SECONDS = float(os.environ.get('RUN_DEADLINE_SECONDS', '500'))  # Whole-run budget, under the 540s timeout
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', '3'))  # Retries of transient download failures
+FETCH_HEDGE_PERCENTILE = float(os.environ.get('FETCH_HEDGE_PERCENTILE', '0'))  # Hedge slow downloads; 0 disables
+SNAPSHOT_ARCHIVE_URI = os.environ.get('SNAPSHOT_ARCHIVE_URI')  # gs://bucket/prefix or local dir; unset disables
+WRITE_SINK = os.environ.get('WRITE_SINK', 'load_job')  # 'load_job' or 'streaming'; a source's 'sink' overrides
+MAINTAIN_AGGREGATES = os.environ.get('MAINTAIN_AGGREGATES', 'true').lower() == 'true'  # Update the agg_* tables
+SERIES_CACHE_URL = os.environ.get('SERIES_CACHE_URL')  # climate-series-api URL to invalidate after loads; unset disables
+FANOUT_TOPIC = os.environ.get('FANOUT_TOPIC')  # Pub/Sub topic of per-source tasks, or 'local'; unset disables fan-out
+FANOUT_RESULTS_URI = os.environ.get('FANOUT_RESULTS_URI')  # gs://bucket/prefix or local dir of worker results
+FANOUT_POLL_SECONDS = float(os.environ.get('FANOUT_POLL_SECONDS', '2'))  # Interval of the coordinator's result checks
+FANOUT_WORKERS = 4  # Threads delivering tasks with FANOUT_TOPIC=local
+
+# Summary tables kept next to the raw tables, by summary kind (see aggregates.py)
+SUMMARY_TABLES = {
+    'annual': 'agg_gistemp_annual',
+    'rolling_12m': 'agg_gistemp_rolling_12m'
+}
 
 # NASA GISTEMP data URLs
 DATA_SOURCES = {
     'global': {
         'url': 'https://data.giss.nasa.gov/gistemp/tabledata_v4/GLB.Ts+dSST.csv',
         'table': 'raw_gistemp_global',
-        'hemisphere': 'Global'
+        'hemisphere': 'Global',
+        'load_format': 'parquet',  # 'parquet' or 'json'
+        'aggregates': ('annual', 'rolling_12m'),  # Summary kinds kept for the hemisphere
+        # 'sink': 'streaming'  # Overrides WRITE_SINK for this source
     },
     'northern': {
         'url': 'https://data.giss.nasa.gov/gistemp/tabledata_v4/NH.Ts+dSST.csv',
         'table': 'raw_gistemp_global',
-        'hemisphere': 'Northern'
+        'hemisphere': 'Northern',
+        'load_format': 'parquet',
+        'aggregates': ('annual', 'rolling_12m')
     },
     'southern': {
         'url': 'https://data.giss.nasa.gov/gistemp/tabledata_v4/SH.Ts+dSST.csv',
         'table': 'raw_gistemp_global',
-        'hemisphere': 'Southern'
+        'hemisphere': 'Southern',
+        'load_format': 'parquet',
+        'aggregates': ('annual', 'rolling_12m')
     },
     'zonal': {
         'url': 'https://data.giss.nasa.gov/gistemp/tabledata_v4/ZonAnn.Ts+dSST.csv',
         'table': 'raw_gistemp_zonal',
-        'type': 'zonal'
+        'type': 'zonal',
+        'load_format': 'parquet'
     }
 }
 
@@ -65,160 +111,526 @@ def generate_record_id(hemisphere: str, year: int, month: int = None) -> str:
     return hashlib.md5(composite.encode()).hexdigest()
 
 
-def parse_gistemp_csv(csv_content: str, source_type: str, hemisphere: str = None) -> list:
+def generate_record_ids(names, years: list, months: list = None) -> list:
+    """
+    Generate record IDs for a whole batch at once.
+
+    Same IDs as generate_record_id; names is either one hemisphere for the whole
+    batch or a per-row list (e.g. zones).
+    """
+    if isinstance(names, str):
+        names = repeat(names)
+    if months is None:
+        keys = (f"gistemp_{name}_{year}" for name, year in zip(names, years))
+    else:
+        keys = (f"gistemp_{name}_{year}_{month:02d}" for name, year, month in zip(names, years, months))
+    md5 = hashlib.md5
+    return [md5(key.encode()).hexdigest() for key in keys]
+
+
+def read_gistemp_columns(csv_content: str) -> tuple:
+    """
+    Read a GISTEMP CSV table into column lists.
+
+    Title lines above the 'Year' header (present in the monthly files) are
+    skipped, blank lines are ignored and short rows are padded with ''.
+
+    Returns:
+        Tuple of (header, columns) where columns[i] holds every value of header[i]
+    """
+    lines = csv_content.splitlines()
+    start = next((i for i, line in enumerate(lines) if line.startswith('Year')), None)
+    if start is None:
+        return [], []
+
+    reader = csv.reader(lines[start:])
+    header = next(reader)
+    width = len(header)
+    records = [r if len(r) == width else (r + [''] * width)[:width] for r in reader if r]
+    columns = [list(col) for col in zip(*records)] if records else [[] for _ in header]
+    return header, columns
+
+
+def to_year_column(values: list) -> list:
+    """Convert a column to int years, masking unparseable values as None."""
+    years = []
+    for value in values:
+        try:
+            years.append(int(value))
+        except ValueError:
+            years.append(None)
+    return years
+
+
+def to_anomaly_column(values: list, metrics: SourceMetrics = None) -> list:
+    """
+    Convert a column to float anomalies, masking '***', blanks and the
+    999.9 missing-data indicator as None.
+
+    Masked cells are counted in metrics as 'missing_value' or 'missing_sentinel'.
+    """
+    anomalies = []
+    for value in values:
+        try:
+            anomaly = float(value)
+        except ValueError:
+            anomalies.append(None)
+            if metrics:
+                metrics.drop('missing_value')
+            continue
+        # NASA uses 999.9 as missing data indicator
+        if anomaly > 900:
+            anomalies.append(None)
+            if metrics:
+                metrics.drop('missing_sentinel')
+            continue
+        anomalies.append(anomaly)
+    return anomalies
+
+
+def default_source_file(source_type: str, hemisphere: str = None) -> str:
+    """Return the DATA_SOURCES URL for the zonal file or a monthly hemisphere."""
+    if source_type == 'zonal':
+        return DATA_SOURCES['zonal']['url']
+    return next(c['url'] for c in DATA_SOURCES.values() if c.get('hemisphere') == hemisphere)
+
+
+def parse_gistemp_csv(csv_content: str, source_type: str, hemisphere: str = None,
+                      source_file: str = None, metrics: SourceMetrics = None) -> RecordBatch:
     """
     Parse NASA GISTEMP CSV format.
 
+    The table is read column-wise: years and anomalies are converted one column
+    at a time with missing values masked, the wide month (or zone) columns are
+    melted into long form, and record IDs are generated once per batch.
+
+    The rows are returned as a RecordBatch (see record_batch.py): years,
+    months and anomalies in typed arrays, dates as day ordinals, zones
+    dictionary-encoded, and the ingestion timestamp, source file and
+    hemisphere stored once.
+
     Args:
         csv_content: Raw CSV content as string
         source_type: Type of source ('monthly' or 'zonal')
         hemisphere: Hemisphere identifier for monthly data
+        source_file: Source URL recorded on each row (defaults to DATA_SOURCES)
+        metrics: Receives 'parse' and 'transform' timings, rows_parsed and
+            dropped rows and cells by reason
 
     Returns:
-        List of dictionaries ready for BigQuery insertion
+        RecordBatch of the rows for BigQuery insertion
     """
-    rows = []
-    reader = csv.DictReader(io.StringIO(csv_content))
+    metrics = metrics or SourceMetrics(source_type)
+    with metrics.stage('parse'):
+        header, columns = read_gistemp_columns(csv_content)
+    if 'Year' not in header:
+        logger.warning("No 'Year' header found in CSV")
+        return RecordBatch({}, 0)
+
+    with metrics.stage('transform'):
+        dropped_before = sum(metrics.dropped.values())
+        rows = _melt_gistemp_columns(header, columns, source_type, hemisphere, source_file, metrics)
+        metrics.count('rows_parsed', len(rows) + sum(metrics.dropped.values()) - dropped_before)
+    return rows
 
-    for row in reader:
-        try:
-            year = int(row['Year'])
-
-            if source_type == 'zonal':
-                # Zonal annual data - one row per zone per year
-                for zone_name, value in row.items():
-                    if zone_name == 'Year':
-                        continue
-
-                    try:
-                        temp_anomaly = float(value)
-                        # NASA uses 999.9 as missing data indicator
-                        if temp_anomaly == 999.9 or temp_anomaly > 900:
-                            continue
-
-                        rows.append({
-                            'year': year,
-                            'zone': zone_name,
-                            'temperature_anomaly': temp_anomaly,
-                            'record_id': generate_record_id(zone_name, year),
-                            'ingestion_timestamp': datetime.utcnow().isoformat(),
-                            'source_file': DATA_SOURCES['zonal']['url']
-                        })
-                    except (ValueError, TypeError):
-                        continue
-
-            else:
-                # Monthly data - one row per month per year
-                for month_idx, month_name in enumerate(MONTH_NAMES, 1):
-                    if month_name not in row:
-                        continue
-
-                    try:
-                        temp_anomaly = float(row[month_name])
-                        # NASA uses 999.9 as missing data indicator
-                        if temp_anomaly == 999.9 or temp_anomaly > 900:
-                            continue
-
-                        measurement_date = date(year, month_idx, 1)
-
-                        rows.append({
-                            'year': year,
-                            'month': month_idx,
-                            'temperature_anomaly': temp_anomaly,
-                            'measurement_date': measurement_date.isoformat(),
-                            'record_id': generate_record_id(hemisphere, year, month_idx),
-                            'ingestion_timestamp': datetime.utcnow().isoformat(),
-                            'source_file': DATA_SOURCES[source_type]['url'],
-                            'hemisphere': hemisphere
-                        })
-                    except (ValueError, TypeError):
-                        continue
-
-        except (ValueError, KeyError) as e:
-            logger.warning(f"Failed to parse row: {e}")
+
+def _melt_gistemp_columns(header: list, columns: list, source_type: str, hemisphere: str,
+                          source_file: str, metrics: SourceMetrics) -> RecordBatch:
+    """Convert the wide GISTEMP columns into a long-form batch (see parse_gistemp_csv)."""
+    years = to_year_column(columns[header.index('Year')])
+    skipped_years = sum(1 for year in years if year is None)
+    if skipped_years:
+        logger.warning(f"Failed to parse {skipped_years} rows with invalid 'Year' values")
+        metrics.drop('invalid_year', skipped_years)
+
+    source_file = source_file or default_source_file(source_type, hemisphere)
+    ingestion_time = datetime.utcnow().isoformat()
+    row_years, anomalies = array('q'), array('d')
+
+    if source_type == 'zonal':
+        # Zonal annual data - one row per zone per year
+        zones = [name for name in header if name != 'Year']
+        value_columns = [to_anomaly_column(col, metrics) for name, col in zip(header, columns) if name != 'Year']
+        codes = array('H')
+        for i, year in enumerate(years):
+            if year is None:
+                continue
+            for code, values in enumerate(value_columns):
+                if values[i] is not None:
+                    row_years.append(year)
+                    codes.append(code)
+                    anomalies.append(values[i])
+
+        length = len(row_years)
+        return RecordBatch({
+            'year': ArrayColumn(row_years),
+            'zone': DictionaryColumn(zones, codes),
+            'temperature_anomaly': ArrayColumn(anomalies),
+            'record_id': ListColumn(generate_record_ids([zones[code] for code in codes], row_years)),
+            'ingestion_timestamp': ConstantColumn(ingestion_time, length),
+            'source_file': ConstantColumn(source_file, length)
+        }, length)
+
+    # Monthly data - one row per month per year; measurement_date needs a year in 1-9999
+    value_columns = [(month_idx, to_anomaly_column(columns[header.index(month_name)], metrics))
+                     for month_idx, month_name in enumerate(MONTH_NAMES, 1) if month_name in header]
+    metrics.drop('invalid_year', sum(1 for year in years if year is not None and not 1 <= year <= 9999))
+    months, days = array('q'), array('i')
+    for i, year in enumerate(years):
+        if year is None or not 1 <= year <= 9999:
             continue
+        for month, values in value_columns:
+            if values[i] is not None:
+                row_years.append(year)
+                months.append(month)
+                anomalies.append(values[i])
+                days.append(date(year, month, 1).toordinal())
+
+    length = len(row_years)
+    return RecordBatch({
+        'year': ArrayColumn(row_years),
+        'month': ArrayColumn(months),
+        'temperature_anomaly': ArrayColumn(anomalies),
+        'measurement_date': DateColumn(days),
+        'record_id': ListColumn(generate_record_ids(hemisphere, row_years, months)),
+        'ingestion_timestamp': ConstantColumn(ingestion_time, length),
+        'source_file': ConstantColumn(source_file, length),
+        'hemisphere': ConstantColumn(hemisphere, length)
+    }, length)
+
+
+def load_rows(client: bigquery.Client, rows: RecordBatch, table_id: str, job_config: bigquery.LoadJobConfig,
+              load_format: str = 'json', schema_table_id: str = None):
+    """
+    Submit a load job for a batch as JSON or Parquet.
+
+    Parquet columns are typed from the schema of schema_table_id (defaults to
+    table_id), so staging tables can borrow the schema of their target. JSON
+    loads serialize the batch row by row.
+    """
+    if load_format == 'parquet':
+        schema = client.get_table(schema_table_id or table_id).schema
+        return load_rows_as_parquet(client, rows, table_id, job_config, schema)
+    return client.load_table_from_json(rows.iter_rows(), table_id, job_config=job_config)
 
-    return rows
 
+def create_fetcher() -> Fetcher:
+    """Return a Fetcher over the instance-wide HTTP session, configured from the environment."""
+    return Fetcher(get_http_session(), retries=FETCH_RETRIES, hedge_percentile=FETCH_HEDGE_PERCENTILE or None)
 
-def fetch_and_load_gistemp(client: bigquery.Client, source_name: str, config: dict):
+
+def fetch_gistemp(source_name: str, config: dict, fetch_state=None, metrics: SourceMetrics = None,
+                  deadline: Deadline = None, archive=None):
     """
-    Fetch GISTEMP data from NASA servers and load to BigQuery.
+    Download and parse one GISTEMP source.
 
-    Uses MERGE strategy for monthly data to handle updates, and TRUNCATE for zonal data.
+    When a fetch state store is given, the download is conditional and the source
+    is skipped if NASA returns 304 or a byte-identical file. Fetch and parse
+    timings and volumes are recorded in metrics when given.
+
+    The download is retried on transient failures, optionally hedged and cut
+    short by the circuit breaker while NASA is down (see http_fetch), and
+    never runs past the deadline.
+
+    With a snapshot archive every downloaded body is archived before parsing,
+    so it can be replayed later (see replay.py); archive failures are logged
+    and do not fail the source.
+
+    Returns:
+        Tuple of (rows, response, digest), or None if the source is unchanged
     """
     logger.info(f"Fetching data from {source_name}: {config['url']}")
+    metrics = metrics or SourceMetrics(source_name)
 
-    try:
-        # Download CSV from NASA
-        response = requests.get(config['url'], timeout=60)
+    # Download CSV from NASA
+    headers = fetch_state.conditional_headers(config['url']) if fetch_state else {}
+    with metrics.stage('fetch'):
+        response = create_fetcher().get(config['url'], timeout=60, headers=headers, deadline=deadline)
         response.raise_for_status()
+    metrics.count('bytes_downloaded', len(response.content))
 
-        # Parse CSV
-        source_type = source_name if source_name == 'zonal' else 'monthly'
-        hemisphere = config.get('hemisphere')
-        rows = parse_gistemp_csv(response.text, source_type, hemisphere)
+    digest = content_digest(response.content) if response.status_code != 304 else None
+    if archive and response.status_code != 304:
+        archive_response(archive, source_name, config['url'], response, metrics)
+    if fetch_state and fetch_state.is_unchanged(config['url'], response, digest):
+        fetch_state.update(config['url'], response, digest)
+        logger.info(f"No upstream changes for {source_name}, skipping load")
+        return None
 
-        logger.info(f"Parsed {len(rows)} records from {source_name}")
+    # Parse CSV
+    source_type = source_name if source_name == 'zonal' else 'monthly'
+    hemisphere = config.get('hemisphere')
+    rows = parse_gistemp_csv(response.text, source_type, hemisphere, config['url'], metrics)
 
-        if not rows:
-            logger.warning(f"No valid records for {source_name}")
-            return 0
-
-        # Load to BigQuery
-        table_id = f"{PROJECT_ID}.{DATASET_ID}.{config['table']}"
-
-        if source_type == 'monthly':
-            # For monthly data, use MERGE to handle updates
-            # Create temporary table for staging
-            temp_table_id = f"{table_id}_temp_{int(datetime.utcnow().timestamp())}"
-
-            job_config = bigquery.LoadJobConfig(
-                write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-            )
-
-            job = client.load_table_from_json(rows, temp_table_id, job_config=job_config)
-            job.result()
-
-            logger.info(f"Loaded {len(rows)} rows to temp table {temp_table_id}")
-
-            # Merge into main table
-            merge_query = f"""
-            MERGE `{table_id}` AS target
-            USING `{temp_table_id}` AS source
-            ON target.record_id = source.record_id
-            WHEN MATCHED THEN
-              UPDATE SET
-                temperature_anomaly = source.temperature_anomaly,
-                ingestion_timestamp = source.ingestion_timestamp
-            WHEN NOT MATCHED THEN
-              INSERT (year, month, temperature_anomaly, measurement_date, record_id,
-                      ingestion_timestamp, source_file, hemisphere)
-              VALUES (source.year, source.month, source.temperature_anomaly,
-                      source.measurement_date, source.record_id,
-                      source.ingestion_timestamp, source.source_file, source.hemisphere)
-            """
-
-            merge_job = client.query(merge_query)
-            merge_job.result()
-
-            logger.info(f"Merged data into {table_id}")
-
-            # Delete temp table
-            client.delete_table(temp_table_id, not_found_ok=True)
+    logger.info(f"Parsed {len(rows)} records from {source_name}")
+    return rows, response, digest
 
-        else:
-            # For zonal data, truncate and reload (annual summary data)
-            job_config = bigquery.LoadJobConfig(
-                write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-            )
 
-            job = client.load_table_from_json(rows, table_id, job_config=job_config)
-            job.result()
+def archive_response(archive, source_name: str, url: str, response, metrics: SourceMetrics):
+    """Archive a downloaded body, logging instead of raising on failure."""
+    try:
+        with metrics.stage('archive'):
+            entry = archive.save(source_name, url, response.content, response)
+        metrics.count('bytes_archived', entry['compressed_bytes'])
+    except Exception as e:
+        logger.warning(f"Failed to archive {source_name} snapshot: {e}")
+
+
+def merge_key_range(rows: RecordBatch) -> dict:
+    """Return the hemispheres and year/date bounds covered by a batch of monthly rows."""
+    years, dates = rows.column('year'), rows.column('measurement_date')
+    return {
+        'hemispheres': sorted(rows.column('hemisphere').distinct()),
+        'min_year': years.min(),
+        'max_year': years.max(),
+        'min_date': dates.min(),
+        'max_date': dates.max()
+    }
+
+
+def merge_job_stats(job) -> dict:
+    """Extract the cost statistics of a finished query job."""
+    return {
+        'job_id': job.job_id,
+        'bytes_processed': job.total_bytes_processed,
+        'slot_millis': job.slot_millis,
+        'rows_affected': getattr(job, 'num_dml_affected_rows', None)
+    }
+
+
+def merge_monthly_rows(client: bigquery.Client, table_id: str, rows: RecordBatch, load_format: str = 'json',
+                       metrics: SourceMetrics = None, deadline: Deadline = None) -> dict:
+    """
+    Stage monthly rows in a uniquely named temp table and MERGE them into table_id.
+
+    Rows may come from several hemisphere sources; record_id keeps them distinct.
+    The MERGE condition is restricted to the hemispheres, years and measurement
+    dates present in the batch, so the target scan is pruned by partition
+    (measurement_date) and clustering (hemisphere, year).
+
+    The staging load and the MERGE are timed as the 'load' and 'merge' stages
+    of metrics when given, and neither job is waited on past the deadline.
+
+    Returns:
+        Statistics of the MERGE query job
+    """
+    metrics = metrics or SourceMetrics(table_id)
+    deadline = deadline or Deadline()
+    temp_table_id = f"{table_id}_temp_{uuid.uuid4().hex}"
+    key_range = merge_key_range(rows)
+
+    job_config = bigquery.LoadJobConfig(
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+    )
+
+    try:
+        with metrics.stage('load'):
+            job = load_rows(client, rows, temp_table_id, job_config, load_format, schema_table_id=table_id)
+            job.result(timeout=deadline.remaining())
+        metrics.add_job(job)
+
+        logger.info(f"Loaded {len(rows)} rows to temp table {temp_table_id}")
+
+        # Merge into main table, touching only the key range being staged
+        merge_query = f"""
+        MERGE `{table_id}` AS target
+        USING `{temp_table_id}` AS source
+        ON target.record_id = source.record_id
+          AND target.hemisphere IN UNNEST(@hemispheres)
+          AND target.year BETWEEN @min_year AND @max_year
+          AND target.measurement_date BETWEEN @min_date AND @max_date
+        WHEN MATCHED THEN
+          UPDATE SET
+            temperature_anomaly = source.temperature_anomaly,
+            ingestion_timestamp = source.ingestion_timestamp
+        WHEN NOT MATCHED THEN
+          INSERT (year, month, temperature_anomaly, measurement_date, record_id,
+                  ingestion_timestamp, source_file, hemisphere)
+          VALUES (source.year, source.month, source.temperature_anomaly,
+                  source.measurement_date, source.record_id,
+                  source.ingestion_timestamp, source.source_file, source.hemisphere)
+        """
+
+        query_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter('hemispheres', 'STRING', key_range['hemispheres']),
+            bigquery.ScalarQueryParameter('min_year', 'INT64', key_range['min_year']),
+            bigquery.ScalarQueryParameter('max_year', 'INT64', key_range['max_year']),
+            bigquery.ScalarQueryParameter('min_date', 'DATE', key_range['min_date']),
+            bigquery.ScalarQueryParameter('max_date', 'DATE', key_range['max_date']),
+        ])
+
+        with metrics.stage('merge'):
+            merge_job = client.query(merge_query, job_config=query_config)
+            merge_job.result(timeout=deadline.remaining())
+        metrics.add_job(merge_job)
+
+        stats = merge_job_stats(merge_job)
+        logger.info(f"Merged data into {table_id}")
+        logger.info(f"MERGE scanned {stats['bytes_processed']} bytes using {stats['slot_millis']} slot ms "
+                    f"for {key_range['hemispheres']} {key_range['min_year']}-{key_range['max_year']}")
+        return stats
+    finally:
+        # Delete temp table
+        client.delete_table(temp_table_id, not_found_ok=True)
+
+
+def load_zonal_rows(client: bigquery.Client, table_id: str, rows: RecordBatch, load_format: str = 'json',
+                    metrics: SourceMetrics = None, deadline: Deadline = None):
+    """Replace the zonal table with WRITE_TRUNCATE (annual summary data)."""
+    metrics = metrics or SourceMetrics(table_id)
+    deadline = deadline or Deadline()
+    job_config = bigquery.LoadJobConfig(
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+    )
+
+    with metrics.stage('load'):
+        job = load_rows(client, rows, table_id, job_config, load_format)
+        job.result(timeout=deadline.remaining())
+    metrics.add_job(job)
+
+    logger.info(f"Loaded {len(rows)} rows to {table_id}")
+
+
+def create_sink(config: dict):
+    """
+    Return the sink a source is written with: its 'sink' setting, else WRITE_SINK.
+
+    The load-job sink merges monthly rows (merge_monthly_rows) and replaces
+    the zonal table (load_zonal_rows); the streaming sink falls back to it
+    for revised rows and replacements.
+    """
+    load_format = config.get('load_format', 'json')
+    sink = LoadJobSink(merge=partial(merge_monthly_rows, load_format=load_format),
+                       replace=partial(load_zonal_rows, load_format=load_format))
+    if config.get('sink', WRITE_SINK) == 'streaming':
+        return StreamingSink(sink)
+    return sink
+
+
+def source_result(rows: RecordBatch, changes=None) -> dict:
+    """Build the result entry of a successfully loaded source."""
+    result = {'status': 'success', 'records': len(rows)}
+    if changes is not None:
+        result['inserted'] = len(changes.inserted)
+        result['updated'] = len(changes.updated)
+    return result
+
+
+def load_source_rows(client: bigquery.Client, table: str, source_type: str, rows: RecordBatch, changes=None,
+                     load_format: str = 'json', sources: list = None, merge_jobs: list = None,
+                     metrics: SourceMetrics = None, deadline: Deadline = None, sink=None):
+    """
+    Load parsed rows into their target table through a sink (see sinks.py).
+
+    Monthly rows are merged; with change detection (changes is not None) only
+    inserted and updated rows are staged, and the streaming sink takes the
+    inserted ones as known to be new. Zonal rows replace the table, which
+    is skipped when change detection finds nothing new. The sink defaults to
+    create_sink() for load_format.
+    """
+    table_id = f"{PROJECT_ID}.{DATASET_ID}.{table}"
+    sources = sources or []
+    metrics = metrics or SourceMetrics(table)
+    sink = sink or create_sink({'load_format': load_format})
+
+    if source_type == 'zonal':
+        if changes is not None and not changes:
+            logger.info(f"No row changes for {table_id}, skipping load")
+            return
+        sink.replace(client, table_id, rows, metrics, deadline)
+        metrics.count('rows_loaded', len(rows))
+        return
+
+    staged_rows = changes.rows if changes is not None else rows
+    if not staged_rows:
+        logger.info(f"No row changes for {table_id}, skipping MERGE")
+        return
+
+    new_ids = set(changes.inserted.column('record_id').values()) if changes is not None else None
+    stats = sink.merge(client, table_id, staged_rows, metrics, deadline, new_ids)
+    metrics.count('rows_loaded', len(staged_rows) - stats.get('skipped', 0))
+    if merge_jobs is not None and 'job_id' in stats:
+        merge_jobs.append({'table': table, 'sources': sources, 'rows': len(staged_rows), **stats})
+    logger.info(f"Merged {len(staged_rows)} of {len(rows)} rows from {', '.join(sources)} into {table_id}")
+
+
+def update_summary_tables(client: bigquery.Client, entries: list, change_detection: bool = False,
+                          metrics: SourceMetrics = None, deadline: Deadline = None, dataset: str = None) -> dict:
+    """
+    Recompute and merge the summary rows affected by a load of monthly sources.
 
-            logger.info(f"Loaded {len(rows)} rows to {table_id}")
+    Entries are (source_name, config, rows, changes, ...) tuples of sources
+    that were just loaded; each source's rows are its whole parsed series.
+    With change detection only the windows around inserted and updated
+    months are recomputed, otherwise every window of the loaded hemispheres.
+    The summary tables are written to dataset ('project.dataset', defaults
+    to GCP_PROJECT.DATASET_ID), next to the raw tables that were loaded.
+
+    Returns:
+        Map of summary kind to the rows merged
+    """
+    series = MonthlySeries()
+    kinds = {}
+    changed = {} if change_detection else None
+    for source_name, config, rows, changes, *_ in entries:
+        if not config.get('aggregates'):
+            continue
+        hemisphere = config['hemisphere']
+        kinds[hemisphere] = config['aggregates']
+        series.add_batch(rows, {hemisphere: 'temperature_anomaly'})
+        if change_detection:
+            changed[hemisphere] = {month_index(day) for day in changes.rows.column('measurement_date').values()}
 
-        return len(rows)
+    summaries = summarize(series, kinds, changed, metrics)
+    write_summaries(client, dataset or f"{PROJECT_ID}.{DATASET_ID}", SUMMARY_TABLES, summaries, metrics, deadline)
+    return summaries
+
+
+def fetch_and_load_gistemp(client: bigquery.Client, source_name: str, config: dict, fetch_state=None,
+                           merge_jobs: list = None, manifest=None, metrics: SourceMetrics = None,
+                           archive=None) -> dict:
+    """
+    Fetch GISTEMP data from NASA servers and load to BigQuery.
+
+    Uses MERGE strategy for monthly data to handle updates, and TRUNCATE for zonal data.
+    Rows are submitted as JSON or Parquet according to the source's load_format.
+    With a change manifest only new or revised rows are loaded.
+    Monthly sources then update the summary tables with MAINTAIN_AGGREGATES.
+    MERGE job statistics are appended to merge_jobs when given, and stage
+    timings and volumes are recorded in metrics. The downloaded body is
+    archived when a snapshot archive is given.
+
+    Returns:
+        Result entry for the source ('success' or 'unchanged')
+    """
+    metrics = metrics or SourceMetrics(source_name)
+    try:
+        fetched = fetch_gistemp(source_name, config, fetch_state, metrics, archive=archive)
+        if fetched is None:
+            return {'status': 'unchanged', 'records': 0}
+        rows, response, digest = fetched
+
+        if not rows:
+            logger.warning(f"No valid records for {source_name}")
+            return source_result(rows)
+
+        source_type = 'zonal' if source_name == 'zonal' else 'monthly'
+        changes = None
+        if manifest:
+            with metrics.stage('diff'):
+                changes = manifest.diff(config['table'], rows)
+        load_source_rows(client, config['table'], source_type, rows, changes,
+                         config.get('load_format', 'json'), [source_name], merge_jobs, metrics,
+                         sink=create_sink(config))
+        if MAINTAIN_AGGREGATES and source_type == 'monthly':
+            update_summary_tables(client, [(source_name, config, rows, changes)], manifest is not None, metrics)
+
+        if manifest:
+            manifest.commit(config['table'], changes)
+        if fetch_state:
+            fetch_state.update(config['url'], response, digest)
+
+        return source_result(rows, changes)
 
     except requests.exceptions.RequestException as e:
         logger.error(f"HTTP request failed for {source_name}: {e}")
@@ -228,41 +640,290 @@ def fetch_and_load_gistemp(client: bigquery.Client, source_name: str, config: di
         raise
 
 
+def load_staged_group(client: bigquery.Client, table: str, source_type: str, entries: list,
+                      change_detection: bool = False, merge_jobs: list = None,
+                      metrics: SourceMetrics = None, deadline: Deadline = None):
+    """
+    Load the staged entries of one or more sources that share a target table
+    with one staging load and MERGE (or one zonal load).
+
+    Entries are (source_name, config, rows, changes, response, digest) tuples;
+    the first entry's config chooses the load format and sink. Monthly loads
+    then update the summary tables (see update_summary_tables()), so a failed
+    summary update fails the group and is retried with it by the next run.
+    """
+    names = [entry[0] for entry in entries]
+    rows = RecordBatch.concat(entry[2] for entry in entries)
+    changes = None
+    if change_detection:
+        changes = RowChanges(RecordBatch.concat(entry[3].inserted for entry in entries),
+                             RecordBatch.concat(entry[3].updated for entry in entries), {})
+
+    config = entries[0][1]
+    load_source_rows(client, table, source_type, rows, changes, config.get('load_format', 'json'),
+                     names, merge_jobs, metrics, deadline, create_sink(config))
+    if MAINTAIN_AGGREGATES and source_type == 'monthly':
+        update_summary_tables(client, entries, change_detection, metrics, deadline)
+
+
+def ingest_pipelined(client: bigquery.Client, sources: dict, fetch_state=None, merge_jobs: list = None,
+                     manifest=None, run_metrics: RunMetrics = None, batch_merge: bool = True,
+                     deadline: Deadline = None, archive=None) -> dict:
+    """
+    Fetch sources in order while earlier sources load in the background.
+
+    Sources are grouped by target table (batch_merge) or kept on their own.
+    As soon as the last source of a group has been fetched and parsed, the
+    group's staging load and MERGE are submitted to a JobPipeline and the next
+    source is downloaded while the jobs run. Jobs writing the same table run
+    one after another; different tables load concurrently. Everything is
+    awaited at the end, at most until the deadline.
+
+    A fetch or parse failure only fails its own source; a failed staging load
+    or MERGE fails every source that was staged in it, and work still running
+    at the deadline fails its sources with DeadlineExceeded. The fetch state
+    and change manifest are only updated, on this thread, for sources whose
+    load succeeded. MERGE job statistics are appended to merge_jobs when
+    given. Fetch and parse metrics are recorded per source in run_metrics,
+    load and MERGE metrics per target table (per source without batch_merge).
+    Downloaded bodies are written to the snapshot archive when given.
+
+    Returns:
+        Map of source name to its result entry
+    """
+    run_metrics = run_metrics or RunMetrics('nasa-gistemp-ingest')
+    deadline = deadline or Deadline()
+
+    def group_key(source_name: str, config: dict) -> tuple:
+        source_type = 'zonal' if source_name == 'zonal' else 'monthly'
+        return (config['table'], source_type) if batch_merge else (config['table'], source_type, source_name)
+
+    pending = {}  # group key -> number of sources not yet fetched
+    for source_name, config in sources.items():
+        key = group_key(source_name, config)
+        pending[key] = pending.get(key, 0) + 1
+
+    results = {}
+    staged = {}  # group key -> list of (source_name, config, rows, changes, response, digest)
+
+    with JobPipeline(deadline) as pipeline:
+        for position, (source_name, config) in enumerate(sources.items()):
+            key = group_key(source_name, config)
+            table, source_type = key[0], key[1]
+            metrics = run_metrics.source(source_name)
+            pending[key] -= 1
+
+            try:
+                deadline.check(f"fetching {source_name}")
+                # Each download gets an equal share of what is left of the budget
+                fetch_deadline = deadline.split(len(sources) - position)
+                fetched = fetch_gistemp(source_name, config, fetch_state, metrics, fetch_deadline, archive)
+            except Exception as e:
+                results[source_name] = {'status': 'failed', 'error': str(e)}
+                logger.error(f"Failed to fetch {source_name}: {e}")
+                fetched = False
+
+            if fetched is None:
+                results[source_name] = {'status': 'unchanged', 'records': 0}
+            elif fetched:
+                rows, response, digest = fetched
+                if not rows:
+                    logger.warning(f"No valid records for {source_name}")
+                    results[source_name] = source_result(rows)
+                else:
+                    changes = None
+                    if manifest:
+                        with metrics.stage('diff'):
+                            changes = manifest.diff(table, rows)
+                    staged.setdefault(key, []).append((source_name, config, rows, changes, response, digest))
+
+            if pending[key] == 0 and staged.get(key):
+                load_metrics = run_metrics.source(table if batch_merge else source_name)
+                pipeline.submit(key, table, load_staged_group, client, table, source_type, staged[key],
+                                manifest is not None, merge_jobs, load_metrics, deadline)
+
+        outcomes = pipeline.wait()
+
+    for key, entries in staged.items():
+        _, error = outcomes[key]
+        names = [entry[0] for entry in entries]
+        if error is not None:
+            logger.error(f"Failed to load {', '.join(names)} into {key[0]}: {error}")
+            for source_name in names:
+                results[source_name] = {'status': 'failed', 'error': str(error) or type(error).__name__}
+            continue
+
+        for source_name, config, source_rows, source_changes, response, digest in entries:
+            if manifest:
+                manifest.commit(key[0], source_changes)
+            if fetch_state:
+                fetch_state.update(config['url'], response, digest)
+            results[source_name] = source_result(source_rows, source_changes)
+
+    # Report in DATA_SOURCES order
+    return {name: results[name] for name in sources}
+
+
+def process_source_task(task: dict) -> dict:
+    """
+    Worker mode: fetch and load the one source of a fan-out task.
+
+    The source is loaded on its own (see fetch_and_load_gistemp()), so the
+    monthly sources of a run MERGE into raw_gistemp_global separately.
+
+    Returns:
+        Result record for the coordinator: the source's result entry, its
+        fetch state and change manifest updates, MERGE job statistics and
+        metrics
+    """
+    source_name, options = task['source'], task['options']
+    config = DATA_SOURCES[source_name]
+    fetch_state = None if options.get('force') else create_fetch_state_store(FETCH_STATE_URI)
+    manifest = None if options.get('force') else create_change_manifest(CHANGE_MANIFEST_URI)
+    run_metrics = RunMetrics('nasa-gistemp-ingest')
+    merge_jobs = []
+    try:
+        result = fetch_and_load_gistemp(LazyBigQueryClient(PROJECT_ID), source_name, config, fetch_state,
+                                        merge_jobs, manifest, run_metrics.source(source_name),
+                                        create_snapshot_archive(SNAPSHOT_ARCHIVE_URI))
+    finally:
+        run_metrics.log()
+    return {
+        'result': result,
+        'fetch_state': fetch_state.updates() if fetch_state else {},
+        'manifest': manifest.updates() if manifest else {},
+        'merge_jobs': merge_jobs,
+        'metrics': run_metrics.as_dict()['sources']
+    }
+
+
+def handle_task_push(body: dict) -> tuple:
+    """Run the fan-out task of a Pub/Sub push request body; answers (result entry, status) like the entry point."""
+    store = create_result_store(FANOUT_RESULTS_URI)
+    if store is None:
+        return {'status': 'failed', 'error': 'FANOUT_RESULTS_URI is not set'}, 500
+    record = run_task(store, read_push_task(body), process_source_task)
+    return record['result'], 200
+
+
+def ingest_fanned_out(run_id: str, options: dict, fetch_state=None, manifest=None,
+                      deadline: Deadline = None) -> dict:
+    """
+    Coordinator mode: hand every source to its own worker through
+    FANOUT_TOPIC and wait for their results (see fanout.py).
+
+    The workers' fetch state and change manifest updates are applied to
+    fetch_state and manifest, which the caller saves as in an in-process run.
+
+    Returns:
+        Map of source name to its result record, in DATA_SOURCES order
+    """
+    queue = create_task_queue(FANOUT_TOPIC, handle_task_push, PROJECT_ID, FANOUT_WORKERS)
+    try:
+        records = fan_out(queue, create_result_store(FANOUT_RESULTS_URI), 'nasa-gistemp-ingest', run_id,
+                          list(DATA_SOURCES), options, deadline, FANOUT_POLL_SECONDS)
+    finally:
+        queue.close()
+    for record in records.values():
+        if fetch_state:
+            fetch_state.apply(record.get('fetch_state'))
+        if manifest:
+            manifest.apply(record.get('manifest'))
+    return records
+
+
 @functions_framework.http
 def ingest_gistemp_data(request):
     """
     HTTP Cloud Function to ingest NASA GISTEMP data into BigQuery.
 
     This function can be triggered by Cloud Scheduler or manual HTTP request.
+
+    With BATCH_MERGE enabled (default) the Global, Northern and Southern
+    sources are merged into raw_gistemp_global with a single staging load
+    and MERGE; otherwise each source is loaded and merged on its own.
+    BigQuery jobs run in the background while later sources are fetched,
+    and the run gives up on unfinished work after RUN_DEADLINE_SECONDS.
+
+    If FETCH_STATE_URI is set, sources whose CSV has not changed since the last
+    successful run are reported as 'unchanged' and not reloaded. If
+    CHANGE_MANIFEST_URI is set, only rows that are new or whose values changed
+    are loaded, and each source reports 'inserted' and 'updated' counts.
+    Pass ?force=true to ignore both the fetch state and the change manifest.
+
+    If SNAPSHOT_ARCHIVE_URI is set, every downloaded CSV is kept as a
+    compressed, content-addressed snapshot that replay.py can reprocess.
+
+    With MAINTAIN_AGGREGATES (default) the annual and 12-month rolling means
+    in the agg_gistemp_* tables are updated after each monthly load; with a
+    change manifest only the windows around new or revised months.
+
+    If SERIES_CACHE_URL is set, the climate-series-api service is told which
+    tables took new rows, so it reloads their series (see series_cache.py).
+
+    Per-source stage timings, volumes and BigQuery job statistics are logged
+    as structured entries; with INCLUDE_METRICS or ?metrics=true they are also
+    returned in a 'metrics' block.
+
+    If FANOUT_TOPIC is set, the function runs as a coordinator instead: each
+    source is published as a task and processed by its own invocation of this
+    function, which receives it as a Pub/Sub push request (see fanout.py).
+    The report has the same shape plus the 'run_id'; pass ?run_id=<id> to
+    retry the sources of that run that did not finish, or ?fanout=false to
+    process every source in this instance.
     """
+    task_body = request.get_json(silent=True) if request is not None else None
+    if read_push_task(task_body) is not None:
+        return handle_task_push(task_body)
 
     try:
         logger.info(f"Starting NASA GISTEMP ingestion - Project: {PROJECT_ID}, Dataset: {DATASET_ID}")
 
-        # Initialize BigQuery client
-        client = bigquery.Client(project=PROJECT_ID)
+        # Reuse the instance-wide BigQuery client, created on first use
+        client = LazyBigQueryClient(PROJECT_ID)
+
+        force = request is not None and request.args.get('force', '').lower() == 'true'
+        fetch_state = None if force else create_fetch_state_store(FETCH_STATE_URI)
+        manifest = None if force else create_change_manifest(CHANGE_MANIFEST_URI)
+        archive = create_snapshot_archive(SNAPSHOT_ARCHIVE_URI)
+        include_metrics = INCLUDE_METRICS or (
+            request is not None and request.args.get('metrics', '').lower() == 'true'
+        )
+        run_metrics = RunMetrics('nasa-gistemp-ingest')
+        deadline = Deadline(RUN_DEADLINE_SECONDS)
+
+        merge_jobs = []
+        run_id, records = None, {}
+        if FANOUT_TOPIC and (request is None or request.args.get('fanout', '').lower() != 'false'):
+            run_id = (request.args.get('run_id') if request is not None else None) or new_run_id()
+            records = ingest_fanned_out(run_id, {'force': force}, fetch_state, manifest, deadline)
+            results = {name: record['result'] for name, record in records.items()}
+            for record in records.values():
+                merge_jobs.extend(record.get('merge_jobs', []))
+        else:
+            # Overlap downloads with the BigQuery jobs of earlier sources
+            results = ingest_pipelined(client, DATA_SOURCES, fetch_state, merge_jobs, manifest, run_metrics,
+                                       batch_merge=BATCH_MERGE, deadline=deadline, archive=archive)
 
-        results = {}
-        total_records = 0
+        total_records = sum(r.get('records', 0) for r in results.values())
 
-        # Process each data source
-        for source_name, config in DATA_SOURCES.items():
+        if fetch_state:
+            try:
+                fetch_state.save()
+            except Exception as e:
+                logger.warning(f"Failed to persist fetch state: {e}")
+        if manifest:
             try:
-                count = fetch_and_load_gistemp(client, source_name, config)
-                results[source_name] = {
-                    'status': 'success',
-                    'records': count
-                }
-                total_records += count
+                manifest.save()
             except Exception as e:
-                results[source_name] = {
-                    'status': 'failed',
-                    'error': str(e)
-                }
-                logger.error(f"Failed to process {source_name}: {e}")
+                logger.warning(f"Failed to persist change manifest: {e}")
+
+        # Have the read cache reload the series of every table that took new rows
+        invalidate_series_cache(SERIES_CACHE_URL, [DATA_SOURCES[name]['table'] for name, result in results.items()
+                                                   if result['status'] == 'success' and result.get('records')])
 
         # Determine overall status
-        success_count = sum(1 for r in results.values() if r['status'] == 'success')
+        success_count = sum(1 for r in results.values() if r['status'] in ('success', 'unchanged'))
         overall_status = 'completed' if success_count == len(DATA_SOURCES) else 'partial_failure'
 
         response_data = {
@@ -271,8 +932,17 @@ def ingest_gistemp_data(request):
             'total_records': total_records,
             'sources_processed': len(DATA_SOURCES),
             'sources_succeeded': success_count,
-            'details': results
+            'details': results,
+            'merge_jobs': merge_jobs
         }
+        if run_id:
+            response_data['run_id'] = run_id
+
+        run_metrics.log()
+        if include_metrics:
+            response_data['metrics'] = run_metrics.as_dict()
+            for record in records.values():
+                response_data['metrics']['sources'].update(record.get('metrics', {}))
 
         logger.info(f"Ingestion complete: {success_count}/{len(DATA_SOURCES)} sources succeeded, {total_records} total records")
 
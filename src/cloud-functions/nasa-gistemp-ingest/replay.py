@@ -0,0 +1,237 @@
+"""
+Replay archived GISTEMP snapshots into BigQuery.
+
+Backfill entry point for reprocessing after a parser fix or schema change,
+or for rebuilding an older vintage, without downloading anything from NASA.
+The snapshots fetched in a date range (see snapshot_archive.py) are
+decompressed and parsed with parse_gistemp_csv in parallel worker processes.
+The rows of each target table are combined with the newest snapshot winning
+per record_id, and then bulk-loaded with one job per table: monthly tables
+are merged (or replaced with --truncate) and the zonal table is replaced.
+The summary tables of replayed hemispheres are recomputed in full.
+--truncate is refused unless every source of a replaced table (global,
+northern and southern for raw_gistemp_global) has a snapshot in the range.
+
+Usage (from the function directory, with the modules of src/shared on the path):
+    export PYTHONPATH=../../shared
+    python replay.py --archive gs://climate-snapshots-PROJECT-REGION/nasa-gistemp-ingest --since 2026-01-01 --until 2026-06-30
+    python replay.py --archive /tmp/snapshots --source global --source zonal --dry-run
+    python replay.py --archive /tmp/snapshots --until 2025-12-31 --dataset climate_backfill --truncate
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+from itertools import repeat
+
+import main
+from metrics import RunMetrics, SourceMetrics
+from record_batch import RecordBatch
+from runtime import bigquery, get_bigquery_client
+from snapshot_archive import create_snapshot_archive
+
+logger = logging.getLogger(__name__)
+
+_archives = {}  # Per worker process: archive URI -> SnapshotArchive
+
+
+def parse_bound(value: str, end_of_day: bool = False) -> datetime:
+    """Parse an ISO date or datetime; a bare --until date covers the whole day."""
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        parsed = datetime.combine(parsed.date(), time.max)
+    return parsed
+
+
+def select_snapshots(archive, sources: list, since: datetime = None, until: datetime = None) -> list:
+    """Return the index entries of the given sources fetched in [since, until], oldest first."""
+    entries = [entry for source in sources for entry in archive.entries(source, since, until)]
+    return sorted(entries, key=lambda entry: entry['fetched_at'])
+
+
+def sources_not_replayed(entries: list) -> dict:
+    """
+    Return table -> the sources writing to it that have no snapshot among
+    entries, for every table the entries replay into.
+
+    global, northern and southern share raw_gistemp_global, so replacing it
+    from a subset of them would delete the other hemispheres' rows.
+    """
+    replayed = {entry['source'] for entry in entries}
+    tables = {main.DATA_SOURCES[source]['table'] for source in replayed}
+    missing = {}
+    for name, config in main.DATA_SOURCES.items():
+        if config['table'] in tables and name not in replayed:
+            missing.setdefault(config['table'], []).append(name)
+    return missing
+
+
+def parse_snapshot(archive_uri: str, entry: dict) -> tuple:
+    """
+    Decompress and parse one snapshot; runs in a worker process.
+
+    Returns:
+        Tuple of (entry, rows, metrics)
+    """
+    archive = _archives.get(archive_uri)
+    if archive is None:
+        archive = _archives[archive_uri] = create_snapshot_archive(archive_uri)
+
+    source_name = entry['source']
+    config = main.DATA_SOURCES[source_name]
+    metrics = SourceMetrics(source_name)
+    with metrics.stage('read'):
+        body = archive.read(entry)
+    source_type = 'zonal' if source_name == 'zonal' else 'monthly'
+    rows = main.parse_gistemp_csv(body.decode('utf-8'), source_type, config.get('hemisphere'),
+                                  entry['url'], metrics)
+    return entry, rows, metrics
+
+
+def merge_source_metrics(metrics: SourceMetrics, snapshot_metrics: SourceMetrics):
+    """Add the timings and counters of one parsed snapshot to a source's metrics."""
+    for stage, seconds in snapshot_metrics.stages.items():
+        metrics.add_time(stage, seconds)
+    for name, value in snapshot_metrics.counters.items():
+        metrics.count(name, value)
+    for reason, value in snapshot_metrics.dropped.items():
+        metrics.drop(reason, value)
+    metrics.count('snapshots', 1)
+
+
+def combine_vintages(parsed: list) -> dict:
+    """
+    Group parsed rows by target table, newest snapshot winning per record_id.
+
+    Args:
+        parsed: (entry, rows, metrics) tuples, oldest snapshot first
+
+    Returns:
+        Map of table to its combined rows
+    """
+    tables = {}
+    for entry, rows, _ in parsed:
+        tables.setdefault(main.DATA_SOURCES[entry['source']]['table'], []).append(rows)
+    return {table: RecordBatch.concat(batches).unique('record_id') for table, batches in tables.items()}
+
+
+def load_table(client: bigquery.Client, table_id: str, source_type: str, rows: RecordBatch, load_format: str,
+               truncate: bool, metrics: SourceMetrics):
+    """
+    Bulk-load the combined rows of one table: replace zonal (or --truncate)
+    tables, merge the rest. Every summary window of the replayed monthly
+    hemispheres is then recomputed from the combined rows, in the summary
+    tables of the same project and dataset.
+    """
+    if source_type == 'monthly' and not truncate:
+        main.merge_monthly_rows(client, table_id, rows, load_format, metrics)
+    else:
+        main.load_zonal_rows(client, table_id, rows, load_format, metrics)
+    metrics.count('rows_loaded', len(rows))
+
+    if source_type == 'monthly' and main.MAINTAIN_AGGREGATES:
+        table = table_id.split('.')[-1]
+        hemispheres = rows.column('hemisphere').values()
+        entries = [(name, config, rows.filter(h == config['hemisphere'] for h in hemispheres), None)
+                   for name, config in main.DATA_SOURCES.items() if config['table'] == table]
+        main.update_summary_tables(client, entries, metrics=metrics, dataset=table_id.rsplit('.', 1)[0])
+
+
+def replay(archive_uri: str, since: datetime = None, until: datetime = None, sources: list = None,
+           project: str = None, dataset: str = None, workers: int = None, truncate: bool = False,
+           dry_run: bool = False, run_metrics: RunMetrics = None) -> dict:
+    """
+    Reparse and reload the archived snapshots fetched in [since, until].
+
+    Args:
+        archive_uri: Snapshot archive (gs://bucket/prefix or local directory)
+        since: Earliest fetch time to replay, None for the start of the archive
+        until: Latest fetch time to replay, None for now
+        sources: DATA_SOURCES names to replay (defaults to all)
+        project: Target project (defaults to GCP_PROJECT)
+        dataset: Target dataset (defaults to DATASET_ID)
+        workers: Parser processes (defaults to the CPU count)
+        truncate: Replace monthly tables instead of merging into them; every
+            source of a replaced table needs a snapshot in the range
+        dry_run: Parse only, load nothing
+        run_metrics: Receives read/parse/transform timings per snapshot source
+            and load/merge timings per table
+
+    Returns:
+        Map of table to its result entry
+    """
+    archive = create_snapshot_archive(archive_uri)
+    if archive is None:
+        raise ValueError("A snapshot archive URI is required")
+    sources = sources or list(main.DATA_SOURCES)
+    run_metrics = run_metrics or RunMetrics('nasa-gistemp-replay')
+
+    entries = select_snapshots(archive, sources, since, until)
+    logger.info(f"Replaying {len(entries)} snapshots of {', '.join(sources)} from {archive_uri}")
+    if not entries:
+        return {}
+    if truncate and not dry_run:
+        missing = sources_not_replayed(entries)
+        if missing:
+            raise ValueError("--truncate replaces whole tables, but these sources of them have no snapshot to "
+                             "replay: " + '; '.join(f"{table}: {', '.join(names)}" for table, names in missing.items()))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parsed = list(executor.map(parse_snapshot, repeat(archive_uri), entries))
+
+    for entry, _, snapshot_metrics in parsed:
+        merge_source_metrics(run_metrics.source(entry['source']), snapshot_metrics)
+
+    results = {}
+    client = None if dry_run else get_bigquery_client(project or main.PROJECT_ID)
+    for table, rows in combine_vintages(parsed).items():
+        snapshot_count = sum(1 for entry, _, _ in parsed if main.DATA_SOURCES[entry['source']]['table'] == table)
+        config = next(c for c in main.DATA_SOURCES.values() if c['table'] == table)
+        source_type = config.get('type', 'monthly')
+        results[table] = {'status': 'parsed' if dry_run else 'success', 'records': len(rows),
+                          'snapshots': snapshot_count}
+        if dry_run or not rows:
+            continue
+
+        table_id = f"{project or main.PROJECT_ID}.{dataset or main.DATASET_ID}.{table}"
+        try:
+            load_table(client, table_id, source_type, rows, config.get('load_format', 'json'), truncate,
+                       run_metrics.source(table))
+            logger.info(f"Replayed {len(rows)} rows from {snapshot_count} snapshots into {table_id}")
+        except Exception as e:
+            logger.error(f"Failed to replay into {table_id}: {e}")
+            results[table] = {'status': 'failed', 'error': str(e)}
+
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--archive', default=main.SNAPSHOT_ARCHIVE_URI, help='Snapshot archive URI or directory')
+    parser.add_argument('--since', help='Earliest fetch date or datetime (UTC)')
+    parser.add_argument('--until', help='Latest fetch date or datetime (UTC), inclusive')
+    parser.add_argument('--source', action='append', choices=sorted(main.DATA_SOURCES),
+                        help='Source to replay (repeatable, defaults to all)')
+    parser.add_argument('--project', help='Target project (defaults to GCP_PROJECT)')
+    parser.add_argument('--dataset', help='Target dataset (defaults to DATASET_ID)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Parser processes')
+    parser.add_argument('--truncate', action='store_true', help='Replace monthly tables instead of merging (needs every source of a table)')
+    parser.add_argument('--dry-run', action='store_true', help='Parse the snapshots without loading')
+    args = parser.parse_args()
+
+    run_metrics = RunMetrics('nasa-gistemp-replay')
+    results = replay(args.archive, parse_bound(args.since), parse_bound(args.until, end_of_day=True),
+                     args.source, args.project, args.dataset, args.workers, args.truncate, args.dry_run,
+                     run_metrics)
+    print(json.dumps({'details': results, 'metrics': run_metrics.as_dict()}, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main_cli()
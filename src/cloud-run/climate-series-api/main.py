@@ -0,0 +1,205 @@
+"""
+Climate Series API (Cloud Run)
+
+Read-serving cache in front of the climate tables loaded by the ingest
+Cloud Functions. Charts read a few thousand points per series; instead of a
+BigQuery query per chart load, this service keeps each series in memory as
+compact arrays (see series_store.py) and answers range and downsampled
+queries from there.
+
+Routes:
+- GET  /series                 Series names and, for loaded ones, size, date span and version
+- GET  /series/<name>          Points of a series; ?start=YYYY-MM-DD&end=YYYY-MM-DD limit the
+                               range (inclusive), ?max_points=N averages it down to N buckets
+- POST /invalidate             {"tables": [...]} drops the series read from those tables
+                               ({} drops all); called by the ingest functions after a load
+
+Series responses carry an ETag built from the series version and the query;
+a request with a matching If-None-Match gets 304 without a body. Series are
+reloaded on the next read after an invalidation or once SERIES_TTL_SECONDS
+have passed.
+"""
+
+from __future__ import annotations
+
+import functions_framework
+import hashlib
+import json
+import logging
+import math
+import os
+from datetime import date
+
+from runtime import bigquery, get_bigquery_client
+from series_store import ResponseCache, SeriesStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+PROJECT_ID = os.environ.get('GCP_PROJECT', os.environ.get('GOOGLE_CLOUD_PROJECT'))
+DATASET_ID = os.environ.get('DATASET_ID', 'climate_data')
+SERIES_TTL_SECONDS = float(os.environ.get('SERIES_TTL_SECONDS', '3600'))  # Reload age; invalidation usually comes first
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '512'))  # Encoded responses kept; 0 disables
+QUERY_TIMEOUT_SECONDS = 60  # Wait for a series query at most this long
+
+# Series served, by name: the table and column they are read from and an optional (column, value) filter
+SERIES = {
+    'gistemp_global': {
+        'table': 'raw_gistemp_global',
+        'column': 'temperature_anomaly',
+        'filter': ('hemisphere', 'Global')
+    },
+    'gistemp_northern': {
+        'table': 'raw_gistemp_global',
+        'column': 'temperature_anomaly',
+        'filter': ('hemisphere', 'Northern')
+    },
+    'gistemp_southern': {
+        'table': 'raw_gistemp_global',
+        'column': 'temperature_anomaly',
+        'filter': ('hemisphere', 'Southern')
+    },
+    'gw_temperature_station': {'table': 'raw_gw_temperature', 'column': 'station'},
+    'gw_temperature_land': {'table': 'raw_gw_temperature', 'column': 'land'},
+    'gw_co2_trend': {'table': 'raw_gw_co2', 'column': 'trend'},
+    'gw_co2_cycle': {'table': 'raw_gw_co2', 'column': 'cycle'},
+    'gw_methane_average': {'table': 'raw_gw_methane', 'column': 'average'},
+    'gw_nitrous_oxide_average': {'table': 'raw_gw_nitrous_oxide', 'column': 'average'}
+}
+
+
+def load_series_rows(name: str) -> list:
+    """Query the (measurement_date, value) pairs of a series from BigQuery, in date order."""
+    config = SERIES[name]
+    query = (f"SELECT measurement_date, {config['column']} AS value "
+             f"FROM `{PROJECT_ID}.{DATASET_ID}.{config['table']}`")
+    parameters = []
+    if config.get('filter'):
+        column, value = config['filter']
+        query += f" WHERE {column} = @filter_value"
+        parameters.append(bigquery.ScalarQueryParameter('filter_value', 'STRING', value))
+    query += " ORDER BY measurement_date"
+
+    job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+    job = get_bigquery_client(PROJECT_ID).query(query, job_config=job_config)
+    return [(row['measurement_date'], row['value']) for row in job.result(timeout=QUERY_TIMEOUT_SECONDS)]
+
+
+STORE = SeriesStore(load_series_rows, SERIES_TTL_SECONDS)
+RESPONSES = ResponseCache(RESPONSE_CACHE_SIZE)
+
+
+def parse_query(args) -> tuple:
+    """
+    Return (start, end, max_points) from request arguments.
+
+    Raises:
+        ValueError: For malformed dates or a max_points below 1
+    """
+    start = date.fromisoformat(args['start']) if args.get('start') else None
+    end = date.fromisoformat(args['end']) if args.get('end') else None
+    max_points = int(args['max_points']) if args.get('max_points') else None
+    if max_points is not None and max_points < 1:
+        raise ValueError("max_points must be at least 1")
+    return start, end, max_points
+
+
+def encode_points(name: str, version: str, query: tuple, days: list, values: list, downsampled: bool) -> bytes:
+    """Encode points as columnar JSON, NaN (NULL) values as null."""
+    start, end, max_points = query
+    return json.dumps({
+        'series': name,
+        'version': version,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'max_points': max_points,
+        'downsampled': downsampled,
+        'points': len(days),
+        'dates': [date.fromordinal(day).isoformat() for day in days],
+        'values': [None if math.isnan(value) else value for value in values]
+    }, separators=(',', ':')).encode()
+
+
+def series_response(request, name: str):
+    """Serve the points of one series, or 304 if the client's ETag is current."""
+    try:
+        query = parse_query(request.args)
+    except ValueError as e:
+        return {'error': f"Invalid query: {e}"}, 400
+
+    series = STORE.get(name)
+    query_digest = hashlib.md5(repr(query).encode()).hexdigest()[:8]
+    etag = f"{series.version}-{query_digest}"
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains_weak(etag):
+        return '', 304, headers
+
+    body = RESPONSES.get((name, etag))
+    if body is None:
+        days, values, downsampled = series.points(*query)
+        body = encode_points(name, series.version, query, days, values, downsampled)
+        RESPONSES.put((name, etag), body)
+    headers['Content-Type'] = 'application/json'
+    return body, 200, headers
+
+
+def list_series() -> dict:
+    """Describe every series; only loaded ones report their size, span and version."""
+    described = []
+    for name, config in SERIES.items():
+        entry = {'name': name, 'table': config['table'], 'column': config['column'], 'loaded': False}
+        series = STORE.cached(name)
+        if series is not None:
+            entry.update({
+                'loaded': True,
+                'points': len(series),
+                'first_date': series.first_date().isoformat() if len(series) else None,
+                'last_date': series.last_date().isoformat() if len(series) else None,
+                'version': series.version
+            })
+        described.append(entry)
+    return {'series': described}
+
+
+def invalidate(request) -> dict:
+    """Drop the series read from the tables in the request body ({} drops all)."""
+    body = request.get_json(silent=True) or {}
+    tables = body.get('tables')
+    names = None if tables is None else [name for name, config in SERIES.items() if config['table'] in tables]
+    dropped = STORE.invalidate(names)
+    logger.info(f"Invalidated series for tables {tables if tables is not None else 'all'}: {dropped}")
+    return {'status': 'invalidated', 'tables': tables, 'series': dropped}
+
+
+@functions_framework.http
+def serve_climate_series(request):
+    """
+    HTTP entry point of the service (see the module docstring for routes).
+
+    Series are loaded on first read and on the next read after an
+    invalidation or SERIES_TTL_SECONDS; concurrent readers share one load,
+    and a failed reload keeps serving the previous copy. Encoded responses
+    are cached by ETag in an LRU of RESPONSE_CACHE_SIZE entries.
+    """
+    path = request.path.rstrip('/')
+    try:
+        if path == '/invalidate':
+            if request.method != 'POST':
+                return {'error': 'Use POST'}, 405
+            return invalidate(request), 200
+
+        if request.method != 'GET':
+            return {'error': 'Use GET'}, 405
+        if path in ('', '/series'):
+            return list_series(), 200
+        if path.startswith('/series/'):
+            name = path[len('/series/'):]
+            if name not in SERIES:
+                return {'error': f"Unknown series: {name}"}, 404
+            return series_response(request, name)
+        return {'error': f"Not found: {request.path}"}, 404
+
+    except Exception as e:
+        logger.error(f"Request {request.method} {request.path} failed: {e}")
+        return {'error': str(e)}, 503
@@ -0,0 +1,202 @@
+"""
+Compact in-memory store of the climate time series.
+
+Each series is held as two parallel arrays, day ordinals (int32) and values
+(float64, NaN for NULL), about 12 bytes per point against several hundred
+for a row dict. Series are loaded on first read through a loader callable
+(a BigQuery query when deployed) and kept until their TTL expires or they
+are invalidated, which the ingest functions do after every run that loaded
+rows into their table.
+
+Concurrent reads of a series that is missing or expired wait for a single
+load instead of each querying BigQuery. If reloading an expired series
+fails, the stale copy keeps being served until a load succeeds.
+
+Range queries are two binary searches over the day ordinals; downsampled
+queries average equal-count buckets of the range. Every loaded series gets
+a version (a digest of its arrays) that the service builds ETags from, so
+an invalidation that reloads identical data leaves the ETags unchanged.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+
+class Series:
+    """
+    One time series as parallel arrays, sorted by date.
+
+    Args:
+        name: Series name
+        rows: (measurement_date, value) pairs in date order; value may be None
+        loaded_at: Clock reading at load time, for the TTL
+    """
+
+    __slots__ = ('name', 'days', 'values', 'loaded_at', 'version')
+
+    def __init__(self, name: str, rows, loaded_at: float):
+        self.name = name
+        self.days = array('i')
+        self.values = array('d')
+        for measurement_date, value in rows:
+            self.days.append(measurement_date.toordinal())
+            self.values.append(math.nan if value is None else float(value))
+        self.loaded_at = loaded_at
+        self.version = hashlib.md5(self.days.tobytes() + self.values.tobytes()).hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def nbytes(self) -> int:
+        """Bytes held by the arrays."""
+        return len(self.days) * self.days.itemsize + len(self.values) * self.values.itemsize
+
+    def first_date(self) -> date:
+        return date.fromordinal(self.days[0]) if self.days else None
+
+    def last_date(self) -> date:
+        return date.fromordinal(self.days[-1]) if self.days else None
+
+    def points(self, start: date = None, end: date = None, max_points: int = None) -> tuple:
+        """
+        Return (day ordinals, values, downsampled) for the points between start
+        and end, inclusive.
+
+        With max_points, a longer range is split into max_points buckets of
+        (nearly) equal point counts, each reported at its first date with the
+        mean of its non-NULL values (NaN if it has none), and downsampled is
+        True.
+        """
+        lo = bisect_left(self.days, start.toordinal()) if start else 0
+        hi = bisect_right(self.days, end.toordinal()) if end else len(self.days)
+        count = max(0, hi - lo)
+        if not max_points or count <= max_points:
+            return self.days[lo:hi].tolist(), self.values[lo:hi].tolist(), False
+
+        days, values = [], []
+        for bucket in range(max_points):
+            first = lo + bucket * count // max_points
+            last = lo + (bucket + 1) * count // max_points
+            present = [v for v in self.values[first:last] if v == v]
+            days.append(self.days[first])
+            values.append(math.fsum(present) / len(present) if present else math.nan)
+        return days, values, True
+
+
+class SeriesStore:
+    """
+    Series loaded on demand and cached with a TTL.
+
+    Args:
+        loader: fn(name) -> (measurement_date, value) pairs in date order
+        ttl_seconds: Age after which a series is reloaded on its next read;
+            0 reloads on every read
+        clock: Monotonic clock, replaceable in tests
+    """
+
+    def __init__(self, loader, ttl_seconds: float = 3600, clock=time.monotonic):
+        self._loader = loader
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._series = {}
+        self._generations = {}  # Bumped by invalidate(), so loads started before it are not kept
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _expired(self, series: Series) -> bool:
+        return self._clock() - series.loaded_at >= self.ttl_seconds
+
+    def _load_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Series:
+        """Return a series, loading it if it is missing or expired."""
+        series = self._series.get(name)
+        if series is not None and not self._expired(series):
+            return series
+
+        with self._load_lock(name):
+            # Another reader may have loaded it while this one waited
+            series = self._series.get(name)
+            if series is not None and not self._expired(series):
+                return series
+            generation = self._generations.get(name, 0)
+            started = time.perf_counter()
+            try:
+                loaded = Series(name, self._loader(name), self._clock())
+            except Exception as e:
+                if series is None:
+                    raise
+                logger.warning(f"Failed to reload {name}, serving the copy loaded "
+                               f"{self._clock() - series.loaded_at:.0f}s ago: {e}")
+                return series
+            self.loads += 1
+            with self._lock:
+                if self._generations.get(name, 0) == generation:
+                    self._series[name] = loaded
+            logger.info(f"Loaded {name}: {len(loaded)} points in {time.perf_counter() - started:.3f}s, "
+                        f"version {loaded.version}")
+            return loaded
+
+    def cached(self, name: str) -> Series:
+        """Return a series if it is loaded, without loading it."""
+        return self._series.get(name)
+
+    def invalidate(self, names=None) -> list:
+        """
+        Drop the given series (all loaded ones if names is None) so their next
+        read reloads them; a load already running is served but not kept.
+
+        Returns:
+            Names of the loaded series that were dropped
+        """
+        with self._lock:
+            names = list(set(self._series) | set(self._locks)) if names is None else list(names)
+            for name in names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            return sorted(name for name in names if self._series.pop(name, None) is not None)
+
+    def nbytes(self) -> int:
+        """Bytes held by the arrays of every loaded series."""
+        return sum(series.nbytes() for series in list(self._series.values()))
+
+
+class ResponseCache:
+    """
+    LRU of encoded responses by key; keys include the series version, so a
+    reloaded series with new data never hits an old entry.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,313 @@
+"""
+Summary tables derived from the raw monthly and daily series.
+
+Dashboards read annual means, 12-month rolling means and year-over-year
+changes from small summary tables instead of scanning the raw tables. The
+functions maintain them in-process: every raw value of a source passes
+through a MonthlySeries, and after the raw load only the summary rows whose
+window contains a new or revised month are recomputed and merged:
+
+- annual:      one row per series and year; a changed month affects its year
+- rolling_12m: one row per series and month, the mean of the trailing 12
+               months; a changed month affects itself and the 11 months after
+- yoy:         one row per series and month, the change against the same
+               month a year earlier; a changed month affects itself and the
+               month a year later
+
+Recomputing a key reads every month of its window from the series, never
+from the previous summary row, so an incremental update writes exactly the
+rows a full recompute would produce for those keys. Monthly values are the
+mean of all values of the month (daily series are averaged first); means are
+taken with math.fsum so they do not depend on the order values arrived in.
+
+Summary rows are built column by column as a RecordBatch and merged through
+a Parquet staging load (see parquet_load.py), like the raw monthly rows.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import uuid
+from array import array
+from datetime import date, datetime
+
+from metrics import SourceMetrics
+from parquet_load import load_rows_as_parquet
+from pipeline import Deadline
+from record_batch import ArrayColumn, ConstantColumn, DateColumn, ListColumn, RecordBatch
+from runtime import bigquery
+
+logger = logging.getLogger(__name__)
+
+ROLLING_MONTHS = 12
+
+
+def month_index(measurement_date: str) -> int:
+    """Return a running month number (year * 12 + month - 1) for an ISO date."""
+    return int(measurement_date[:4]) * 12 + int(measurement_date[5:7]) - 1
+
+
+def month_date(index: int) -> str:
+    """Return the ISO date of the first day of a running month number."""
+    return f"{index // 12:04d}-{index % 12 + 1:02d}-01"
+
+
+class MonthlySeries:
+    """
+    Values of one or more named series, grouped by month.
+
+    Memory grows with the number of values kept per month (one for monthly
+    series, up to 31 for daily ones), not with the size of the payload.
+    Monthly means are computed once per series and kept until a value is added.
+    """
+
+    def __init__(self):
+        self._values = {}  # series -> month index -> list of values
+        self._means = {}  # series -> month index -> mean of its values
+
+    def add(self, series: str, measurement_date: str, value):
+        """Add one value; None (a missing measurement) is ignored."""
+        if value is None:
+            return
+        months = self._values.setdefault(series, {})
+        months.setdefault(month_index(measurement_date), []).append(value)
+        self._means.pop(series, None)
+
+    def add_row(self, row: dict, columns: dict):
+        """Add a row's values; columns maps series name to the row column it is read from."""
+        for series, column in columns.items():
+            self.add(series, row['measurement_date'], row.get(column))
+
+    def add_batch(self, rows: RecordBatch, columns: dict):
+        """Add the values of a RecordBatch; columns maps series name to the column it is read from."""
+        indexes = [month_index(day) for day in rows.column('measurement_date').values()]
+        for series, column in columns.items():
+            months = self._values.setdefault(series, {})
+            for index, value in zip(indexes, rows.column(column).values()):
+                if value is not None:
+                    months.setdefault(index, []).append(value)
+            self._means.pop(series, None)
+
+    def names(self) -> list:
+        return sorted(self._values)
+
+    def months(self, series: str) -> list:
+        """Return the month indexes with at least one value, in order."""
+        return sorted(self._values.get(series, {}))
+
+    def means(self, series: str) -> dict:
+        """Return the mean value of every month with values, by month index."""
+        means = self._means.get(series)
+        if means is None:
+            means = self._means[series] = {index: math.fsum(values) / len(values)
+                                           for index, values in self._values.get(series, {}).items()}
+        return means
+
+    def value(self, series: str, index: int):
+        """Return the mean value of a month, or None if it has no values."""
+        return self.means(series).get(index)
+
+
+def affected_keys(kind: str, months) -> set:
+    """
+    Return the summary keys whose window contains any of the given months.
+
+    Keys are years for 'annual' and month indexes otherwise.
+    """
+    if kind == 'annual':
+        return {index // 12 for index in months}
+    if kind == 'rolling_12m':
+        return {index + offset for index in months for offset in range(ROLLING_MONTHS)}
+    if kind == 'yoy':
+        return {index + offset for index in months for offset in (0, 12)}
+    raise ValueError(f"Unknown summary kind: {kind}")
+
+
+def summary_record_id(kind: str, series: str, measurement_date: str) -> str:
+    """Generate the record ID of a summary row."""
+    return hashlib.md5(f"{kind}_{series}_{measurement_date}".encode()).hexdigest()
+
+
+def _mean(values: list):
+    return math.fsum(values) / len(values) if values else None
+
+
+def _summary_batch(kind: str, name: str, months: list, columns: dict, updated_at: str) -> RecordBatch:
+    """
+    Build the summary rows of one series, keyed by the first month of each row.
+
+    columns holds the kind's own columns (after series and measurement_date);
+    record_id and updated_at are added last, as in the summary tables.
+    """
+    days = [date(index // 12, index % 12 + 1, 1) for index in months]
+    batch = {
+        'series': ConstantColumn(name, len(months)),
+        'measurement_date': DateColumn(array('i', [day.toordinal() for day in days])),
+    }
+    batch.update(columns)
+    batch['record_id'] = ListColumn([summary_record_id(kind, name, day.isoformat()) for day in days])
+    batch['updated_at'] = ConstantColumn(updated_at, len(months))
+    return RecordBatch(batch, len(months))
+
+
+def annual_rows(series: MonthlySeries, name: str, years, updated_at: str) -> RecordBatch:
+    """Annual means of the monthly values of the given years (years without data are skipped)."""
+    means = series.means(name)
+    kept, windows = [], []
+    for year in sorted(years):
+        values = [means[index] for index in range(year * 12, year * 12 + 12) if index in means]
+        if values:
+            kept.append(year)
+            windows.append(values)
+    return _summary_batch('annual', name, [year * 12 for year in kept], {
+        'year': ArrayColumn(array('q', kept)),
+        'mean_value': ArrayColumn(array('d', [_mean(values) for values in windows])),
+        'months': ArrayColumn(array('q', [len(values) for values in windows])),
+    }, updated_at)
+
+
+def rolling_rows(series: MonthlySeries, name: str, months, updated_at: str) -> RecordBatch:
+    """
+    Trailing 12-month means ending at each of the given months.
+
+    Months without a value of their own are skipped; rolling_mean is None
+    until all 12 months of the window have values.
+    """
+    means = series.means(name)
+    kept = [index for index in sorted(months) if index in means]
+    # Monthly means from the first window's start to the last month, None where a month has no value;
+    # the window ending at month i is dense[i - kept[0]:i - kept[0] + ROLLING_MONTHS]
+    start = kept[0] if kept else 0
+    dense = [means.get(index) for index in range(start - ROLLING_MONTHS + 1, kept[-1] + 1)] if kept else []
+    if None in dense:
+        windows = [[v for v in dense[i - start:i - start + ROLLING_MONTHS] if v is not None] for i in kept]
+    else:
+        windows = [dense[i - start:i - start + ROLLING_MONTHS] for i in kept]
+    return _summary_batch('rolling_12m', name, kept, {
+        'monthly_value': ArrayColumn(array('d', [means[index] for index in kept])),
+        'rolling_mean': ArrayColumn.from_values(
+            [_mean(window) if len(window) == ROLLING_MONTHS else None for window in windows], 'd'),
+        'window_months': ArrayColumn(array('q', [len(window) for window in windows])),
+    }, updated_at)
+
+
+def yoy_rows(series: MonthlySeries, name: str, months, updated_at: str) -> RecordBatch:
+    """Change of each given month against the same month a year earlier (None without one)."""
+    means = series.means(name)
+    kept = [index for index in sorted(months) if index in means]
+    monthly = [means[index] for index in kept]
+    previous = [means.get(index - 12) for index in kept]
+    changes = [value - before if before is not None else None for value, before in zip(monthly, previous)]
+    return _summary_batch('yoy', name, kept, {
+        'monthly_value': ArrayColumn(array('d', monthly)),
+        'previous_year_value': ArrayColumn.from_values(previous, 'd'),
+        'yoy_change': ArrayColumn.from_values(changes, 'd'),
+        'yoy_change_pct': ArrayColumn.from_values(
+            [change / before * 100 if change is not None and before else None
+             for change, before in zip(changes, previous)], 'd'),
+    }, updated_at)
+
+
+SUMMARY_BUILDERS = {
+    'annual': annual_rows,
+    'rolling_12m': rolling_rows,
+    'yoy': yoy_rows,
+}
+
+
+def summarize(series: MonthlySeries, kinds: dict, changed: dict = None, metrics: SourceMetrics = None) -> dict:
+    """
+    Compute the summary rows affected by changed months.
+
+    Args:
+        series: Every value of the summarized series
+        kinds: Map of series name to the summary kinds kept for it
+        changed: Map of series name to the month indexes that are new or
+            revised; None recomputes every key of every series
+        metrics: Receives the 'aggregate' timing and 'summary_rows'
+
+    Returns:
+        Map of summary kind to a RecordBatch of its rows
+    """
+    metrics = metrics or SourceMetrics('aggregates')
+    updated_at = datetime.utcnow().isoformat()
+    batches = {}
+    with metrics.stage('aggregate'):
+        for name, name_kinds in kinds.items():
+            months = series.months(name) if changed is None else changed.get(name, ())
+            if not months:
+                continue
+            for kind in name_kinds:
+                if changed is None:
+                    # Every key with a row of its own: the years with data, or the months with a value
+                    keys = affected_keys(kind, months) if kind == 'annual' else months
+                else:
+                    keys = affected_keys(kind, months)
+                batches.setdefault(kind, []).append(SUMMARY_BUILDERS[kind](series, name, keys, updated_at))
+    summaries = {kind: RecordBatch.concat(kind_batches) for kind, kind_batches in batches.items()}
+    metrics.count('summary_rows', sum(len(rows) for rows in summaries.values()))
+    return summaries
+
+
+def merge_summary_rows(client: bigquery.Client, table_id: str, rows: RecordBatch, metrics: SourceMetrics = None,
+                       deadline: Deadline = None):
+    """
+    Upsert summary rows on record_id through a staging table.
+
+    The rows are staged as Parquet typed by the target's schema; the MERGE
+    only touches rows at or after the earliest measurement_date being merged.
+    """
+    metrics = metrics or SourceMetrics(table_id)
+    deadline = deadline or Deadline()
+    temp_table_id = f"{table_id}_temp_{uuid.uuid4().hex}"
+    columns = rows.column_names
+    min_date = rows.column('measurement_date').min()
+    job_config = bigquery.LoadJobConfig(
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+    )
+
+    try:
+        job = load_rows_as_parquet(client, rows, temp_table_id, job_config, client.get_table(table_id).schema)
+        job.result(timeout=deadline.remaining())
+        metrics.add_job(job)
+
+        update_columns = [c for c in columns if c not in ('record_id', 'series', 'measurement_date')]
+        merge_query = f"""
+        MERGE `{table_id}` AS target
+        USING `{temp_table_id}` AS source
+        ON target.record_id = source.record_id
+          AND target.measurement_date >= DATE '{min_date}'
+        WHEN MATCHED THEN
+          UPDATE SET {', '.join(f'{c} = source.{c}' for c in update_columns)}
+        WHEN NOT MATCHED THEN
+          INSERT ({', '.join(columns)})
+          VALUES ({', '.join(f'source.{c}' for c in columns)})
+        """
+        merge_job = client.query(merge_query)
+        merge_job.result(timeout=deadline.remaining())
+        metrics.add_job(merge_job)
+    finally:
+        client.delete_table(temp_table_id, not_found_ok=True)
+
+
+def write_summaries(client: bigquery.Client, dataset: str, tables: dict, summaries: dict,
+                    metrics: SourceMetrics = None, deadline: Deadline = None):
+    """
+    Merge computed summary rows into their tables.
+
+    Args:
+        dataset: 'project.dataset' of the summary tables
+        tables: Map of summary kind to table name
+        summaries: Map of summary kind to its RecordBatch, as returned by summarize()
+    """
+    metrics = metrics or SourceMetrics('aggregates')
+    for kind, rows in summaries.items():
+        if not rows:
+            continue
+        table_id = f"{dataset}.{tables[kind]}"
+        with metrics.stage('aggregate_merge'):
+            merge_summary_rows(client, table_id, rows, metrics, deadline)
+        logger.info(f"Merged {len(rows)} {kind} summary rows into {table_id}")
+
@@ -0,0 +1,256 @@
+"""
+Fan-out of a run's sources to one worker invocation each.
+
+In coordinator mode an ingest function does not fetch and load its sources
+itself. It publishes one task per source to a Pub/Sub topic, and a push
+subscription delivers each task back to the same function as an HTTP
+request. That request runs as a worker for its one source, so a slow source
+no longer holds up the others and sources scale out across instances.
+Workers write their result entry to a result store. The coordinator polls
+the store until every source has reported or the run deadline passes, then
+builds the usual status report from the entries.
+
+Tasks and results are keyed by a run ID, which makes retries idempotent:
+
+- a redelivered task whose source already finished ('success' or
+  'unchanged') in the run is acknowledged without doing the work again
+- a coordinator re-invoked with the run_id of an earlier run only publishes
+  the sources that did not finish, and reports the others from their
+  stored results
+
+Workers do not save the shared fetch state or change manifest documents,
+which would race between them. They return their updates with their result,
+and the coordinator applies them and saves each document once.
+
+Results are stored as <run_id>/<source>.json under a GCS prefix
+(gs://bucket/prefix) or a local directory (any other path). A topic of
+'local' replaces Pub/Sub with LocalTaskQueue, which delivers tasks to the
+function's own push handler on worker threads, so the whole flow runs in
+one process.
+"""
+
+import base64
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pipeline import Deadline
+from snapshot_archive import GCSArchiveBackend, LocalArchiveBackend
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('success', 'unchanged')
+LOCAL_TOPIC = 'local'
+
+
+def new_run_id() -> str:
+    """Return a run ID that sorts by start time."""
+    return f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def push_envelope(task: dict, message_id: str) -> dict:
+    """Wrap a task the way a Pub/Sub push subscription delivers it."""
+    return {
+        'message': {
+            'data': base64.b64encode(json.dumps(task).encode()).decode(),
+            'attributes': {'function': task['function'], 'run_id': task['run_id'], 'source': task['source']},
+            'messageId': message_id
+        },
+        'subscription': LOCAL_TOPIC
+    }
+
+
+def read_push_task(body) -> dict:
+    """Return the task carried by a Pub/Sub push request body, or None if the body is not one."""
+    if not isinstance(body, dict) or not isinstance(body.get('message'), dict) or 'data' not in body['message']:
+        return None
+    return json.loads(base64.b64decode(body['message']['data']))
+
+
+class ResultStore:
+    """Worker result records by run and source."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def put(self, run_id: str, source: str, record: dict):
+        self.backend.put(f"{run_id}/{source}.json", json.dumps(record, default=str).encode(), 'application/json')
+
+    def results(self, run_id: str, sources=None) -> dict:
+        """Return the records of a run by source, only of the given sources if any."""
+        prefix = f"{run_id}/"
+        records = {}
+        for key in self.backend.list(prefix):
+            source = key[len(prefix):-len('.json')]
+            if key.endswith('.json') and (sources is None or source in sources):
+                records[source] = json.loads(self.backend.get(key))
+        return records
+
+
+def create_result_store(uri: str):
+    """
+    Create a ResultStore for a gs:// URI or local directory.
+
+    Returns None when no URI is configured.
+    """
+    if not uri:
+        return None
+    if uri.startswith('gs://'):
+        return ResultStore(GCSArchiveBackend(uri))
+    return ResultStore(LocalArchiveBackend(uri))
+
+
+class PubSubTaskQueue:
+    """Publishes tasks to a Pub/Sub topic, with the function, run and source as attributes."""
+
+    def __init__(self, topic: str, project: str = None):
+        from google.cloud import pubsub_v1
+
+        self.publisher = pubsub_v1.PublisherClient()
+        self.topic = topic if topic.startswith('projects/') else self.publisher.topic_path(project, topic)
+
+    def publish(self, task: dict) -> str:
+        future = self.publisher.publish(self.topic, json.dumps(task).encode(), function=task['function'],
+                                        run_id=task['run_id'], source=task['source'])
+        return future.result(timeout=30)
+
+    def close(self):
+        pass
+
+
+class LocalTaskQueue:
+    """
+    In-process stand-in for the task topic and its push subscription.
+
+    Tasks are delivered as push envelopes to handler(envelope), which answers
+    (body, status) like the function's HTTP entry point, on up to `workers`
+    threads. A delivery that raises or answers with a non-2xx status is
+    redelivered, up to max_deliveries times, as the subscription's retry
+    policy would.
+    """
+
+    def __init__(self, handler, workers: int = 4, max_deliveries: int = 5):
+        self.handler = handler
+        self.max_deliveries = max_deliveries
+        self.deliveries = []  # (source, status) of every delivery
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='local-task')
+
+    def publish(self, task: dict) -> str:
+        message_id = uuid.uuid4().hex
+        self._executor.submit(self._deliver, push_envelope(task, message_id), task['source'])
+        return message_id
+
+    def _deliver(self, envelope: dict, source: str):
+        for _ in range(self.max_deliveries):
+            try:
+                _, status = self.handler(envelope)
+            except Exception as e:
+                logger.warning(f"Delivery of the task for {source} failed: {e}")
+                status = 500
+            self.deliveries.append((source, status))
+            if 200 <= status < 300:
+                return
+        logger.error(f"Gave up on the task for {source} after {self.max_deliveries} deliveries")
+
+    def close(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
+
+
+def create_task_queue(topic: str, handler, project: str = None, workers: int = 4):
+    """
+    Create the task queue for a topic: LocalTaskQueue delivering to handler
+    for 'local', PubSubTaskQueue otherwise (a topic name or full path).
+    """
+    if topic == LOCAL_TOPIC:
+        return LocalTaskQueue(handler, workers)
+    return PubSubTaskQueue(topic, project)
+
+
+def fan_out(queue, store: ResultStore, function: str, run_id: str, sources, options: dict = None,
+            deadline: Deadline = None, poll_seconds: float = 2.0) -> dict:
+    """
+    Publish a task for every source that has not finished in the run and
+    wait for the workers' results.
+
+    Args:
+        queue: PubSubTaskQueue or LocalTaskQueue
+        store: Where workers record their results
+        function: Name of the function, routed on by the push subscriptions
+        run_id: Run the tasks belong to; reusing an earlier run's ID retries it
+        sources: Names of the sources, in report order
+        options: Passed to every worker with its task (e.g. force, full_refresh)
+        deadline: How long to wait for results
+        poll_seconds: Interval between reads of the result store
+
+    Returns:
+        Map of source name to its result record, in sources order. Records
+        hold the worker's result entry under 'result'; sources without a
+        result by the deadline get a 'failed' entry.
+    """
+    deadline = deadline or Deadline()
+    records = {}
+    waiting = {}  # source -> task_id of the task published for it
+    previous = store.results(run_id, set(sources))
+    for source in sources:
+        record = previous.get(source)
+        if record and record['result']['status'] in FINISHED_STATUSES:
+            logger.info(f"Reusing the result of {source} from run {run_id}")
+            records[source] = record
+            continue
+        task = {'function': function, 'run_id': run_id, 'task_id': uuid.uuid4().hex, 'source': source,
+                'options': options or {}}
+        try:
+            queue.publish(task)
+            waiting[source] = task['task_id']
+        except Exception as e:
+            logger.error(f"Failed to publish the task for {source}: {e}")
+            records[source] = {'result': {'status': 'failed', 'error': f"Failed to publish task: {e}"}}
+    logger.info(f"Published {len(waiting)} tasks for run {run_id}, reused {len(records)} results")
+
+    while waiting:
+        for source, record in store.results(run_id, set(waiting)).items():
+            # An earlier failure of the source stays in the store until this run's worker replaces it
+            if record['result']['status'] in FINISHED_STATUSES or record.get('task_id') == waiting[source]:
+                records[source] = record
+                del waiting[source]
+        remaining = deadline.remaining()
+        if not waiting or remaining == 0:
+            break
+        time.sleep(poll_seconds if remaining is None else min(poll_seconds, remaining))
+
+    for source in waiting:
+        logger.error(f"No result from the worker for {source} in run {run_id}")
+        records[source] = {'result': {'status': 'failed',
+                                      'error': f"No result from the worker before the deadline (run {run_id})"}}
+    return {source: records[source] for source in sources}
+
+
+def run_task(store: ResultStore, task: dict, process) -> dict:
+    """
+    Worker side of fan_out(): process a task's source and record the result.
+
+    process(task) returns the result record ({'result': ..., plus anything
+    the coordinator needs}); an exception is recorded as a 'failed' result.
+    A source that already finished in the run is not processed again.
+    Errors writing the record are raised, so the delivery is retried.
+
+    Returns:
+        The recorded result record
+    """
+    run_id, source = task['run_id'], task['source']
+    previous = store.results(run_id, {source}).get(source)
+    if previous and previous['result']['status'] in FINISHED_STATUSES:
+        logger.info(f"{source} already finished in run {run_id}, acknowledging the redelivered task")
+        return previous
+
+    try:
+        record = process(task)
+    except Exception as e:
+        logger.error(f"Task for {source} in run {run_id} failed: {e}")
+        record = {'result': {'status': 'failed', 'error': str(e)}}
+    record.update(task_id=task['task_id'], finished_at=datetime.utcnow().isoformat())
+    store.put(run_id, source, record)
+    return record
@@ -0,0 +1,164 @@
+"""
+Conditional fetch state for upstream data sources.
+
+Keeps the ETag, Last-Modified and a SHA-256 content digest of the last
+successfully loaded response for every source URL, so a run can send
+conditional requests and skip parsing and loading when upstream data has
+not changed.
+
+State is a single JSON document stored either in GCS (gs://bucket/object)
+or on local disk (any other path, used for tests and local runs).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def content_digest(body: bytes) -> str:
+    """Return the SHA-256 hex digest of a response body."""
+    return hashlib.sha256(body).hexdigest()
+
+
+class LocalStateBackend:
+    """Stores fetch state as a JSON file on local disk."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def write(self, state: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class GCSStateBackend:
+    """Stores fetch state as a JSON object in a GCS bucket."""
+
+    def __init__(self, uri: str):
+        from google.cloud import storage
+
+        bucket_name, _, blob_name = uri[len('gs://'):].partition('/')
+        self.blob = storage.Client().bucket(bucket_name).blob(blob_name)
+
+    def read(self) -> dict:
+        if not self.blob.exists():
+            return {}
+        return json.loads(self.blob.download_as_text())
+
+    def write(self, state: dict):
+        self.blob.upload_from_string(json.dumps(state, sort_keys=True), content_type='application/json')
+
+
+def create_state_backend(uri: str):
+    """Return the backend of a state document: GCSStateBackend for gs:// URIs, LocalStateBackend otherwise."""
+    if uri.startswith('gs://'):
+        return GCSStateBackend(uri)
+    return LocalStateBackend(uri)
+
+
+class FetchStateStore:
+    """
+    Per-URL fetch validators shared by all sources of one function run.
+
+    Updates are buffered in memory and persisted once by save(), so a source
+    is only marked as fetched after it has been loaded successfully. Pass
+    state to start from it instead of reading the backend; without a
+    backend, save() does nothing.
+    """
+
+    def __init__(self, backend, state: dict = None):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._updated = set()
+        self._state = backend.read() if state is None else state
+
+    def get(self, url: str) -> dict:
+        with self._lock:
+            return dict(self._state.get(url, {}))
+
+    def conditional_headers(self, url: str) -> dict:
+        """Build If-None-Match / If-Modified-Since headers for a source URL."""
+        entry = self.get(url)
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def is_unchanged(self, url: str, response, digest: str) -> bool:
+        """Return True if the response is a 304 or matches the stored digest."""
+        if response.status_code == 304:
+            return True
+        return self.get(url).get('digest') == digest
+
+    def update(self, url: str, response, digest: str):
+        """Record the validators of a successfully processed response."""
+        with self._lock:
+            previous = self._state.get(url, {})
+            self._state[url] = {
+                'etag': response.headers.get('ETag') or previous.get('etag'),
+                'last_modified': response.headers.get('Last-Modified') or previous.get('last_modified'),
+                'digest': digest or previous.get('digest'),
+                'checked_at': datetime.utcnow().isoformat()
+            }
+            self._updated.add(url)
+            self._dirty = True
+
+    def updates(self) -> dict:
+        """Return the entries updated since the state was read, by URL."""
+        with self._lock:
+            return {url: dict(self._state[url]) for url in self._updated}
+
+    def apply(self, updates: dict):
+        """Take over entries updated elsewhere (see updates())."""
+        if not updates:
+            return
+        with self._lock:
+            self._state.update(updates)
+            self._updated.update(updates)
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or self.backend is None:
+                return
+            self.backend.write(self._state)
+            self._dirty = False
+
+
+def create_fetch_state_store(uri: str):
+    """
+    Create a FetchStateStore for a gs:// URI or local path.
+
+    Returns None when no URI is configured, which disables conditional fetching.
+    A state that cannot be read (e.g. a GCS 403 or 5xx) is logged and
+    replaced by an empty one, so every source is fetched unconditionally;
+    the state never blocks a run.
+    """
+    if not uri:
+        return None
+    backend = None
+    try:
+        backend = create_state_backend(uri)
+        return FetchStateStore(backend)
+    except Exception as e:
+        logger.warning(f"Failed to read fetch state from {uri}, fetching every source: {e}")
+        return FetchStateStore(backend, state={})
@@ -0,0 +1,261 @@
+"""
+Upstream fetch layer with tail-latency controls.
+
+Fetcher.get() wraps the shared HTTP session with:
+- a deadline: every attempt's timeout is capped by the caller's remaining
+  budget, and no retry starts once it is spent;
+- bounded retries of connection errors, timeouts, 429 and 5xx responses,
+  with full-jitter exponential backoff (honouring Retry-After when it fits);
+- optional hedging: if an attempt is still outstanding after the host's
+  recent latency percentile, a duplicate request is sent and the first
+  response wins;
+- a per-host circuit breaker that fails fast while upstream is down.
+
+Breakers and latency history are kept per host at module level, so they
+carry over between invocations on a warm instance.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from urllib.parse import urlsplit
+
+from pipeline import Deadline, DeadlineExceeded
+from runtime import requests
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without contacting the host while its circuit breaker is open."""
+
+
+class RetryableStatus(RuntimeError):
+    """Internal: a response whose status code is worth retrying."""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code} from {response.url}")
+        self.response = response
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one host.
+
+    After `threshold` consecutive failures the circuit opens for `cooldown`
+    seconds; then one trial request is let through (half-open), and its
+    outcome closes or re-opens the circuit. A trial that ends in an error
+    saying nothing about the host (e.g. an invalid URL or too many
+    redirects) is ended with end_trial(), letting the next request try.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def end_trial(self):
+        """Forget an outstanding half-open trial without recording its outcome, so the next request may try."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of recent request latencies for one host."""
+
+    def __init__(self, window: int = 100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 10) -> float | None:
+        """Return the pct-th percentile, or None with fewer than min_samples samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+_breakers = {}
+_latencies = {}
+_registry_lock = threading.Lock()
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hedge')
+
+
+def _host_state(host: str, breaker_threshold: int, breaker_cooldown: float) -> tuple:
+    with _registry_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(breaker_threshold, breaker_cooldown)
+            _latencies[host] = LatencyTracker()
+        return _breakers[host], _latencies[host]
+
+
+def reset_host_state():
+    """Forget every host's breaker and latency history."""
+    with _registry_lock:
+        _breakers.clear()
+        _latencies.clear()
+
+
+class Fetcher:
+    """
+    GET with deadline, retries, hedging and a per-host circuit breaker.
+
+    Args:
+        session: requests.Session used for every attempt
+        retries: Retries after the first attempt
+        backoff_base: First backoff ceiling in seconds, doubled per retry
+        backoff_max: Largest backoff ceiling in seconds
+        hedge_percentile: Send a duplicate request once an attempt has been
+            outstanding for this percentile of the host's recent latencies;
+            None disables hedging
+        hedge_min_delay: Never hedge earlier than this many seconds
+        breaker_threshold: Consecutive failures that open a host's circuit
+        breaker_cooldown: Seconds an open circuit fails fast before a trial
+    """
+
+    def __init__(self, session, retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 hedge_percentile: float = None, hedge_min_delay: float = 0.5,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 60.0, rng: random.Random = None):
+        self.session = session
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.rng = rng or random.Random()
+
+    def backoff(self, attempt: int, response=None) -> float:
+        """Full-jitter backoff before retry number attempt (0-based), or the server's Retry-After."""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return self.rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url: str, timeout: float = 30, headers: dict = None, stream: bool = False,
+            deadline: Deadline = None):
+        """
+        GET url, retrying transient failures until the deadline.
+
+        Non-retryable responses (2xx, 3xx, most 4xx) are returned as-is for the
+        caller's raise_for_status(). Raises CircuitOpenError while the host's
+        circuit is open, DeadlineExceeded once the budget is spent, or the last
+        transient error when retries run out.
+        """
+        deadline = deadline or Deadline()
+        host = urlsplit(url).netloc
+        breaker, latencies = _host_state(host, self.breaker_threshold, self.breaker_cooldown)
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {host} after {breaker.failures} consecutive failures")
+            remaining = deadline.remaining()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"Deadline exceeded fetching {url}") from last_error
+            attempt_timeout = timeout if remaining is None else min(timeout, remaining)
+
+            try:
+                response = self._attempt(url, attempt_timeout, headers, stream, latencies)
+                if response.status_code in RETRY_STATUSES:
+                    raise RetryableStatus(response)
+                breaker.record_success()
+                return response
+            except (RetryableStatus, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                breaker.record_failure()
+                last_error = e
+                failed_response = e.response if isinstance(e, RetryableStatus) else None
+                if attempt == self.retries:
+                    break
+                delay = self.backoff(attempt, failed_response)
+                remaining = deadline.remaining()
+                if remaining is not None and delay >= remaining:
+                    break
+                logger.warning(f"Attempt {attempt + 1} for {url} failed ({e}), retrying in {delay:.2f}s")
+                if failed_response is not None:
+                    failed_response.close()
+                time.sleep(delay)
+            except Exception:
+                # Not a sign of the host's health, but it must not leave a half-open trial outstanding
+                breaker.end_trial()
+                raise
+
+        if isinstance(last_error, RetryableStatus):
+            return last_error.response  # Let the caller's raise_for_status() report it
+        raise last_error
+
+    def _attempt(self, url: str, timeout: float, headers: dict, stream: bool, latencies: LatencyTracker):
+        """One logical attempt, hedged with a duplicate request if it runs long."""
+        def request():
+            start = time.monotonic()
+            response = self.session.get(url, timeout=timeout, headers=headers, stream=stream)
+            latencies.record(time.monotonic() - start)
+            return response
+
+        hedge_after = None
+        if self.hedge_percentile:
+            hedge_after = latencies.percentile(self.hedge_percentile)
+        if hedge_after is None or hedge_after >= timeout:
+            return request()
+
+        primary = _hedge_pool.submit(request)
+        done, _ = wait_futures([primary], timeout=max(hedge_after, self.hedge_min_delay))
+        if done:
+            return primary.result()
+
+        logger.info(f"Hedging request to {url} after {hedge_after:.2f}s")
+        hedge = _hedge_pool.submit(request)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.add_done_callback(_close_response)
+                    return future.result()
+        return primary.result()  # Both failed: raise the primary's error
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
@@ -0,0 +1,130 @@
+"""
+Per-source stage timings and volume counters.
+
+Each source gets a SourceMetrics holding seconds per stage (fetch, parse,
+transform, load, merge, ...), volume counters (bytes_downloaded,
+rows_parsed, rows_loaded, ...), dropped rows by reason and the statistics of
+the BigQuery jobs it ran. RunMetrics groups them for one invocation and
+writes one structured log line per source; Cloud Logging parses JSON lines
+on stdout into jsonPayload fields, which the log-based metrics in
+modules/monitoring extract.
+"""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_EVENT = 'ingest_source_metrics'
+
+
+def job_stats(job) -> dict:
+    """
+    Extract the statistics of a finished BigQuery job.
+
+    Only attributes the job type reports are included; queued_ms and run_ms
+    are derived from the job's created/started/ended times.
+    """
+    stats = {'job_id': job.job_id, 'job_type': getattr(job, 'job_type', None)}
+    for attr in ('total_bytes_processed', 'total_bytes_billed', 'slot_millis', 'num_dml_affected_rows',
+                 'input_file_bytes', 'output_rows'):
+        value = getattr(job, attr, None)
+        if value is not None:
+            stats[attr] = value
+
+    created, started, ended = (getattr(job, attr, None) for attr in ('created', 'started', 'ended'))
+    if created and started:
+        stats['queued_ms'] = round((started - created).total_seconds() * 1000)
+    if started and ended:
+        stats['run_ms'] = round((ended - started).total_seconds() * 1000)
+    return stats
+
+
+class SourceMetrics:
+    """
+    Timings, counters and job statistics of one source.
+
+    Not thread-safe: each source is processed by a single thread.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.stages = {}
+        self.counters = {}
+        self.dropped = {}
+        self.jobs = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """Add the time spent in the with-block to a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def drop(self, reason: str, value: int = 1):
+        """Count rows dropped before loading, by reason."""
+        if value:
+            self.dropped[reason] = self.dropped.get(reason, 0) + value
+
+    def add_job(self, job) -> dict:
+        """Record a finished BigQuery job; uploaded bytes are taken from load jobs."""
+        stats = job_stats(job)
+        self.jobs.append(stats)
+        if stats.get('input_file_bytes'):
+            self.count('bytes_uploaded', stats['input_file_bytes'])
+        return stats
+
+    def as_dict(self) -> dict:
+        return {
+            'stage_seconds': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            **self.counters,
+            'rows_dropped': sum(self.dropped.values()),
+            'dropped_by_reason': dict(self.dropped),
+            'jobs': self.jobs
+        }
+
+
+class RunMetrics:
+    """Metrics of every source processed by one invocation."""
+
+    def __init__(self, function: str):
+        self.function = function
+        self.started = time.perf_counter()
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def source(self, name: str) -> SourceMetrics:
+        """Return the metrics of a source, creating them on first use."""
+        with self._lock:
+            if name not in self._sources:
+                self._sources[name] = SourceMetrics(name)
+            return self._sources[name]
+
+    def as_dict(self) -> dict:
+        return {
+            'total_seconds': round(time.perf_counter() - self.started, 4),
+            'sources': {name: metrics.as_dict() for name, metrics in self._sources.items()}
+        }
+
+    def log(self):
+        """Write one structured log line per source to stdout."""
+        for name, metrics in self._sources.items():
+            entry = {
+                'severity': 'INFO',
+                'message': f"Ingestion metrics for {name}",
+                'event': LOG_EVENT,
+                'function': self.function,
+                'source': name,
+                **metrics.as_dict()
+            }
+            sys.stdout.write(json.dumps(entry, default=str) + '\n')
+        sys.stdout.flush()
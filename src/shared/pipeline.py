@@ -0,0 +1,111 @@
+"""
+Deadline-bounded background execution of BigQuery job chains.
+
+JobPipeline runs submitted work on one worker thread per lane: work in the
+same lane (e.g. jobs writing the same table) runs in submission order,
+different lanes run concurrently, and the caller is free to download and
+parse the next source meanwhile. wait() collects every outcome and gives up
+on whatever is still running when the invocation deadline passes.
+"""
+
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work does not finish before the invocation deadline."""
+
+
+class Deadline:
+    """Point in time by which the whole invocation must be done; None or 0 seconds means no limit."""
+
+    def __init__(self, seconds: float = None):
+        self.expires = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> float | None:
+        """Seconds left, or None without a limit. Suitable as a timeout= argument."""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def split(self, parts: int) -> Deadline:
+        """Return a deadline for one of `parts` equal shares of the remaining time."""
+        share = Deadline()
+        remaining = self.remaining()
+        if remaining is not None:
+            share.expires = time.monotonic() + remaining / max(1, parts)
+        return share
+
+    def check(self, what: str):
+        """Raise DeadlineExceeded if the deadline has passed."""
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {what}")
+
+
+class JobPipeline:
+    """
+    Run work in the background, serialized per lane, until a deadline.
+
+    Usage:
+        with JobPipeline(deadline) as pipeline:
+            pipeline.submit('global', 'raw_gistemp_global', load_fn, rows)
+            outcomes = pipeline.wait()
+    """
+
+    def __init__(self, deadline: Deadline = None):
+        self.deadline = deadline or Deadline()
+        self._lanes = {}
+        self._futures = {}
+
+    def submit(self, key, lane: str, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) in a lane; its outcome is reported under key."""
+        executor = self._lanes.get(lane)
+        if executor is None:
+            executor = self._lanes[lane] = ThreadPoolExecutor(max_workers=1,
+                                                              thread_name_prefix=f"pipeline-{lane}")
+
+        def run():
+            self.deadline.check(str(key))
+            return fn(*args, **kwargs)
+
+        self._futures[key] = executor.submit(run)
+        return self._futures[key]
+
+    def wait(self) -> dict:
+        """
+        Wait for all submitted work, at most until the deadline.
+
+        Returns:
+            Map of key to (result, error); unfinished work is reported with a
+            DeadlineExceeded error and its queued successors are cancelled
+        """
+        _, not_done = wait_futures(self._futures.values(), timeout=self.deadline.remaining())
+        outcomes = {}
+        for key, future in self._futures.items():
+            if future in not_done:
+                future.cancel()
+                outcomes[key] = (None, DeadlineExceeded(f"Deadline exceeded waiting for {key}"))
+            elif future.exception() is not None:
+                outcomes[key] = (None, future.exception())
+            else:
+                outcomes[key] = (future.result(), None)
+        self.shutdown()
+        return outcomes
+
+    def shutdown(self):
+        """Stop the lanes without waiting; work already running cannot be interrupted."""
+        for executor in self._lanes.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,406 @@
+"""
+Columnar record batches.
+
+Parsed and transformed records travel through the function as a
+RecordBatch: one typed column per field instead of one dict per row, so
+field names, the run's ingestion timestamp and source URL, and repeated
+labels are not stored again for every row.
+
+Column kinds:
+
+- ConstantColumn:   one value shared by every row (ingestion_timestamp,
+                    source_file, the hemisphere of a monthly source)
+- DictionaryColumn: a few distinct strings stored once, with an integer
+                    code per row (zone, the hemisphere of a merged batch)
+- ArrayColumn:      ints or floats in a typed array, with a null mask only
+                    when some values are None
+- DateColumn:       ISO dates held as day ordinals
+- ListColumn:       anything else (record_id), as a plain list
+
+Columns return values as rows always carried them (ISO strings for dates),
+so a row materialized from a batch is the dict the functions used to build.
+Rows are only materialized where a consumer needs dicts: JSON load jobs,
+streaming inserts and the NDJSON upload buffer, through iter_rows().
+Parquet loads build their Arrow arrays from the columns (see
+parquet_load.py).
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from array import array
+from datetime import date
+from itertools import chain, compress
+
+NONE_TYPE = type(None)
+
+
+class Column(ABC):
+    """
+    Base of the column kinds: each implements values() and take(), and
+    overrides what else it can answer without a row scan.
+    """
+
+    __slots__ = ()
+
+    @abstractmethod
+    def values(self) -> list:
+        """Every value, in row order."""
+
+    @abstractmethod
+    def take(self, positions: list) -> Column:
+        """A column of the same kind holding the values at positions."""
+
+    def __getitem__(self, position: int):
+        return self.values()[position]
+
+    def types(self) -> set:
+        """Python types of the values, None included as NoneType."""
+        return set(map(type, self.values()))
+
+    def longest(self) -> int:
+        """Length of the longest string value (0 if there are none)."""
+        return max((len(v) for v in self.values() if isinstance(v, str)), default=0)
+
+    def distinct(self) -> set:
+        return set(self.values())
+
+    def min(self):
+        return min((v for v in self.values() if v is not None), default=None)
+
+    def max(self):
+        return max((v for v in self.values() if v is not None), default=None)
+
+
+class ConstantColumn(Column):
+    """One value for every row."""
+
+    __slots__ = ('value', 'length')
+
+    def __init__(self, value, length: int):
+        self.value = value
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, position: int):
+        return self.value
+
+    def values(self) -> list:
+        return [self.value] * self.length
+
+    def take(self, positions: list) -> Column:
+        return ConstantColumn(self.value, len(positions))
+
+    def types(self) -> set:
+        return {type(self.value)} if self.length else set()
+
+    def longest(self) -> int:
+        return len(self.value) if self.length and isinstance(self.value, str) else 0
+
+    def distinct(self) -> set:
+        return {self.value} if self.length else set()
+
+    def min(self):
+        return self.value if self.length else None
+
+    max = min
+
+
+class DictionaryColumn(Column):
+    """
+    Repeated values stored once, with a code per row.
+
+    Args:
+        dictionary: The distinct values
+        codes: Index into dictionary of each row's value
+    """
+
+    __slots__ = ('dictionary', 'codes')
+
+    def __init__(self, dictionary: list, codes: array):
+        self.dictionary = dictionary
+        self.codes = codes
+
+    @classmethod
+    def encode(cls, values) -> DictionaryColumn:
+        index = {}
+        codes = [index.setdefault(value, len(index)) for value in values]
+        return cls(list(index), array('H' if len(index) <= 0xFFFF else 'I', codes))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, position: int):
+        return self.dictionary[self.codes[position]]
+
+    def values(self) -> list:
+        dictionary = self.dictionary
+        return [dictionary[code] for code in self.codes]
+
+    def take(self, positions: list) -> Column:
+        codes = self.codes
+        return DictionaryColumn(self.dictionary, array(codes.typecode, [codes[i] for i in positions]))
+
+    def _present(self) -> list:
+        """Dictionary values that at least one row uses."""
+        if len(self.dictionary) == 1:
+            return self.dictionary if self.codes else []
+        return [self.dictionary[code] for code in set(self.codes)]
+
+    def types(self) -> set:
+        return set(map(type, self._present()))
+
+    def longest(self) -> int:
+        return max((len(v) for v in self._present() if isinstance(v, str)), default=0)
+
+    def distinct(self) -> set:
+        return set(self._present())
+
+
+class ArrayColumn(Column):
+    """
+    Ints ('q') or floats ('d') in a typed array.
+
+    Args:
+        data: The values; None values hold 0 and are marked in nulls
+        nulls: One byte per row, 1 where the value is None; None if no value is
+    """
+
+    __slots__ = ('data', 'nulls')
+
+    def __init__(self, data: array, nulls: bytearray = None):
+        self.data = data
+        self.nulls = nulls
+
+    @classmethod
+    def from_values(cls, values: list, typecode: str) -> ArrayColumn:
+        try:
+            return cls(array(typecode, values))
+        except TypeError:  # Some values are None
+            zero = 0.0 if typecode == 'd' else 0
+            return cls(array(typecode, [zero if v is None else v for v in values]),
+                       bytearray(v is None for v in values))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, position: int):
+        if self.nulls is not None and self.nulls[position]:
+            return None
+        return self.data[position]
+
+    def values(self) -> list:
+        if self.nulls is None:
+            return self.data.tolist()
+        return [None if null else value for value, null in zip(self.data, self.nulls)]
+
+    def take(self, positions: list) -> Column:
+        data = self.data
+        taken = array(data.typecode, [data[i] for i in positions])
+        if self.nulls is None:
+            return ArrayColumn(taken)
+        nulls = bytearray(self.nulls[i] for i in positions)
+        return ArrayColumn(taken, nulls if any(nulls) else None)
+
+    def types(self) -> set:
+        types = {float if self.data.typecode == 'd' else int} if len(self.data) else set()
+        if self.nulls is not None and any(self.nulls):
+            types.add(NONE_TYPE)
+            if all(self.nulls):
+                types.discard(float if self.data.typecode == 'd' else int)
+        return types
+
+    def longest(self) -> int:
+        return 0
+
+    def min(self):
+        if self.nulls is None:
+            return min(self.data, default=None)
+        return super().min()
+
+    def max(self):
+        if self.nulls is None:
+            return max(self.data, default=None)
+        return super().max()
+
+
+class DateColumn(Column):
+    """ISO dates held as day ordinals ('i'); values are ISO strings, as in rows."""
+
+    __slots__ = ('ordinals',)
+
+    def __init__(self, ordinals: array):
+        self.ordinals = ordinals
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def __getitem__(self, position: int):
+        return date.fromordinal(self.ordinals[position]).isoformat()
+
+    def values(self) -> list:
+        fromordinal = date.fromordinal
+        return [fromordinal(day).isoformat() for day in self.ordinals]
+
+    def take(self, positions: list) -> Column:
+        ordinals = self.ordinals
+        return DateColumn(array('i', [ordinals[i] for i in positions]))
+
+    def types(self) -> set:
+        return {str} if self.ordinals else set()
+
+    def longest(self) -> int:
+        return 10 if self.ordinals else 0
+
+    def min(self):
+        return date.fromordinal(min(self.ordinals)).isoformat() if self.ordinals else None
+
+    def max(self):
+        return date.fromordinal(max(self.ordinals)).isoformat() if self.ordinals else None
+
+
+class ListColumn(Column):
+    """Values in a plain list."""
+
+    __slots__ = ('items',)
+
+    def __init__(self, items: list):
+        self.items = items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, position: int):
+        return self.items[position]
+
+    def values(self) -> list:
+        return self.items
+
+    def take(self, positions: list) -> Column:
+        items = self.items
+        return ListColumn([items[i] for i in positions])
+
+
+def encode_column(values: list, date_column: bool = False) -> Column:
+    """
+    Pick the most compact column kind for a list of values.
+
+    date_column marks ISO date strings to hold as day ordinals.
+    """
+    all_types = set(map(type, values))
+    if len(all_types) == 1 and values.count(values[0]) == len(values):
+        return ConstantColumn(values[0], len(values))
+    types = all_types - {NONE_TYPE}
+    if date_column and types == {str} and None not in values:
+        return DateColumn(array('i', [date.fromisoformat(v).toordinal() for v in values]))
+    if types == {int}:
+        return ArrayColumn.from_values(values, 'q')
+    if types == {float}:
+        return ArrayColumn.from_values(values, 'd')
+    if types == {str} and len(set(values)) <= len(values) // 2:
+        return DictionaryColumn.encode(values)
+    return ListColumn(list(values))
+
+
+def concat_columns(columns: list) -> Column:
+    """Concatenate columns of one field, keeping their kind where they share it."""
+    length = sum(len(column) for column in columns)
+    kinds = {type(column) for column in columns}
+    if kinds == {ConstantColumn} and len({column.value for column in columns}) == 1:
+        return ConstantColumn(columns[0].value, length)
+    if kinds <= {ConstantColumn, DictionaryColumn}:
+        return DictionaryColumn.encode(chain.from_iterable(column.values() for column in columns))
+    if kinds == {DateColumn}:
+        return DateColumn(array('i', chain.from_iterable(column.ordinals for column in columns)))
+    if kinds == {ArrayColumn} and len({column.data.typecode for column in columns}) == 1:
+        data = array(columns[0].data.typecode, chain.from_iterable(column.data for column in columns))
+        if all(column.nulls is None for column in columns):
+            return ArrayColumn(data)
+        return ArrayColumn(data, bytearray(chain.from_iterable(
+            column.nulls if column.nulls is not None else bytes(len(column)) for column in columns)))
+    return ListColumn(list(chain.from_iterable(column.values() for column in columns)))
+
+
+class RecordBatch:
+    """
+    Rows of one table as named columns of equal length, in row key order.
+
+    Args:
+        columns: Map of field name to Column
+        length: Number of rows (needed when there are no columns)
+    """
+
+    __slots__ = ('columns', 'length')
+
+    def __init__(self, columns: dict, length: int = None):
+        self.columns = columns
+        self.length = length if length is not None else len(next(iter(columns.values()), ()))
+
+    @classmethod
+    def from_rows(cls, rows: list, date_columns=('measurement_date',)) -> RecordBatch:
+        """Encode row dicts (with the same keys) column by column; date_columns hold ISO dates."""
+        if not rows:
+            return cls({}, 0)
+        return cls({name: encode_column([row.get(name) for row in rows], name in date_columns)
+                    for name in rows[0]}, len(rows))
+
+    @classmethod
+    def concat(cls, batches) -> RecordBatch:
+        """
+        Concatenate batches with the same columns; batches without rows are
+        skipped, but keep their columns if no batch has rows.
+        """
+        batches = list(batches)
+        if not any(len(batch) for batch in batches):
+            return next((batch for batch in batches if batch.columns), cls({}, 0))
+        batches = [batch for batch in batches if len(batch)]
+        if len(batches) == 1:
+            return batches[0]
+        return cls({name: concat_columns([batch.columns[name] for batch in batches])
+                    for name in batches[0].columns}, sum(len(batch) for batch in batches))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        return self.iter_rows()
+
+    @property
+    def column_names(self) -> list:
+        return list(self.columns)
+
+    def column(self, name: str) -> Column:
+        return self.columns[name]
+
+    def iter_rows(self):
+        """Yield each row as a dict; this is where a batch is serialized."""
+        names = list(self.columns)
+        for values in zip(*(column.values() for column in self.columns.values())):
+            yield dict(zip(names, values))
+
+    def to_rows(self) -> list:
+        return list(self.iter_rows())
+
+    def take(self, positions: list) -> RecordBatch:
+        """Return the rows at positions, in that order."""
+        return RecordBatch({name: column.take(positions) for name, column in self.columns.items()},
+                           len(positions))
+
+    def filter(self, mask) -> RecordBatch:
+        """Return the rows whose mask entry is true."""
+        positions = list(compress(range(self.length), mask))
+        return self if len(positions) == self.length else self.take(positions)
+
+    def unique(self, name: str) -> RecordBatch:
+        """
+        Keep one row per value of a column: the last one, at the position of
+        the first (as building a dict keyed on the column would).
+        """
+        last = {}
+        for position, key in enumerate(self.columns[name].values()):
+            last[key] = position
+        if len(last) == self.length:
+            return self
+        return self.take(list(last.values()))
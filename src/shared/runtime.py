@@ -0,0 +1,87 @@
+"""
+Warm-instance runtime helpers.
+
+Heavy dependencies (google.cloud.bigquery, requests) are imported on first
+use instead of at module import, and the BigQuery client and HTTP session are
+created once per instance and reused by every later invocation, so warm
+requests skip credential discovery, client construction and TLS handshakes.
+"""
+
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    Module placeholder that imports the real module on first attribute access.
+
+    Resolution goes through importlib.import_module, which holds the import
+    lock, so first use from several threads at once is safe.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+
+bigquery = LazyModule('google.cloud.bigquery')
+requests = LazyModule('requests')
+
+_instances = {}
+_lock = threading.Lock()
+
+
+def _cached(key, factory):
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = _instances[key] = factory()
+    return instance
+
+
+def get_bigquery_client(project: str):
+    """Return the instance-wide BigQuery client for a project, creating it on first use."""
+    return _cached(('bigquery', project), lambda: bigquery.Client(project=project))
+
+
+def get_http_session(pool_size: int = 10):
+    """Return the instance-wide HTTP session with a keep-alive pool of pool_size connections."""
+    def create():
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    return _cached(('http', pool_size), create)
+
+
+def reset_instances():
+    """Drop cached clients and sessions, as on a fresh (cold) instance."""
+    with _lock:
+        for instance in _instances.values():
+            close = getattr(instance, 'close', None)
+            if close:
+                close()
+        _instances.clear()
+
+
+class LazyBigQueryClient:
+    """
+    Stand-in for bigquery.Client that creates the cached client on first use.
+
+    Invocations that never reach BigQuery (e.g. every source unchanged) do not
+    import the library or build a client.
+    """
+
+    def __init__(self, project: str):
+        self._project = project
+
+    def __getattr__(self, attr):
+        return getattr(get_bigquery_client(self._project), attr)
@@ -0,0 +1,57 @@
+"""
+Invalidation of the climate series read cache.
+
+The climate-series-api service (src/cloud-run/climate-series-api) keeps the
+series read from the raw tables in memory. After a run that loaded rows, the
+ingest functions post the tables they changed to its /invalidate route, so
+the affected series are reloaded on their next read instead of when their
+TTL expires.
+
+The service is private: requests to an https URL carry an ID token for it,
+minted from the function's service account. Failures are logged and never
+fail the run; the service's TTL bounds how stale it can get.
+"""
+
+import logging
+
+from runtime import get_http_session
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_id_token(audience: str) -> str:
+    """Return an ID token for audience from the runtime's credentials."""
+    import google.auth.transport.requests
+    import google.oauth2.id_token
+
+    return google.oauth2.id_token.fetch_id_token(google.auth.transport.requests.Request(), audience)
+
+
+def invalidate_series_cache(url: str, tables, session=None, timeout: float = 10) -> bool:
+    """
+    Ask the series cache at url to drop the series read from tables.
+
+    Args:
+        url: Base URL of the service; empty or None disables the call
+        tables: Names of the tables that were loaded
+        session: HTTP session (defaults to the instance-wide one)
+
+    Returns:
+        True if the service acknowledged the invalidation
+    """
+    tables = sorted(set(tables))
+    if not url or not tables:
+        return False
+
+    try:
+        headers = {}
+        if url.startswith('https://'):
+            headers['Authorization'] = f"Bearer {fetch_id_token(url)}"
+        response = (session or get_http_session()).post(f"{url.rstrip('/')}/invalidate", json={'tables': tables},
+                                                        headers=headers, timeout=timeout)
+        response.raise_for_status()
+        logger.info(f"Invalidated series cache for {tables}: {response.json().get('series')}")
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to invalidate series cache for {tables}: {e}")
+        return False
@@ -0,0 +1,232 @@
+"""
+Write paths from transformed rows into BigQuery tables.
+
+A sink upserts rows into a table on record_id (merge) or replaces the
+table's contents (replace):
+
+- LoadJobSink: load jobs, as the functions have always written. Upserts go
+  through a staging load and a MERGE, replacements through a WRITE_TRUNCATE
+  load. The function supplies both operations, since its MERGE is
+  table-specific.
+- StreamingSink: appends new rows with the streaming insert API in bounded
+  micro-batches. There is no load-job queueing and no daily per-table load
+  job quota, so small frequent runs stay cheap. Rows whose record_id is
+  already in the table are compared with the stored values: unchanged rows
+  are skipped and revised rows go to the fallback LoadJobSink's MERGE, as
+  does every replace.
+
+Exactly-once per record_id: a row is only streamed if its record_id is not
+in the table yet, and every streamed row carries its record_id as insertId,
+so a micro-batch retried after a lost response is de-duplicated by
+BigQuery. Two runs streaming into the same table at the same time can still
+race; runs of one function are serialized by its schedule.
+
+Legacy streaming rows spend a while in the streaming buffer, where DML
+cannot update them. A revision of a row streamed minutes earlier therefore
+fails its MERGE until the buffer has been flushed, and is retried by the
+next run.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from datetime import date, datetime
+
+from metrics import SourceMetrics
+from pipeline import Deadline
+from runtime import bigquery
+
+logger = logging.getLogger(__name__)
+
+# Columns that change on every run without the measurement changing
+VOLATILE_COLUMNS = ('ingestion_timestamp',)
+
+
+def iter_rows(rows):
+    """Iterate row dicts from a list, a RecordBatch or a buffer that can replay its rows."""
+    return rows.iter_rows() if hasattr(rows, 'iter_rows') else iter(rows)
+
+
+def take_rows(source, rows: list, positions: list):
+    """Return the rows at positions: from source if it is a RecordBatch, else from the row dicts."""
+    return source.take(positions) if hasattr(source, 'take') else [rows[i] for i in positions]
+
+
+class LoadJobSink:
+    """
+    Write rows with load jobs.
+
+    Args:
+        merge: fn(client, table_id, rows, metrics=, deadline=) that upserts
+            rows on record_id and returns its MERGE job statistics (or None)
+        replace: fn(client, table_id, rows, metrics=, deadline=) that
+            replaces the table's contents with rows
+    """
+
+    def __init__(self, merge, replace):
+        self._merge = merge
+        self._replace = replace
+
+    def merge(self, client: bigquery.Client, table_id: str, rows, metrics: SourceMetrics = None,
+              deadline: Deadline = None, new_ids: set = None) -> dict:
+        """Upsert rows on record_id; new_ids is accepted for interface parity and ignored."""
+        return self._merge(client, table_id, rows, metrics=metrics, deadline=deadline) or {}
+
+    def replace(self, client: bigquery.Client, table_id: str, rows, metrics: SourceMetrics = None,
+                deadline: Deadline = None):
+        self._replace(client, table_id, rows, metrics=metrics, deadline=deadline)
+
+
+class StreamingSink:
+    """
+    Append new rows with streaming inserts, falling back to load jobs.
+
+    Args:
+        fallback: LoadJobSink for revised rows and replacements
+        max_rows: Rows per insert request
+        max_bytes: Serialized bytes per insert request (the API limit is 10 MB)
+        retries: Retries of a failed insert request, with the same insertIds
+        retry_delay: Seconds before the first retry, doubled per retry
+    """
+
+    def __init__(self, fallback: LoadJobSink, max_rows: int = 500, max_bytes: int = 5 * 1024 * 1024,
+                 retries: int = 3, retry_delay: float = 0.5):
+        self.fallback = fallback
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def merge(self, client: bigquery.Client, table_id: str, rows, metrics: SourceMetrics = None,
+              deadline: Deadline = None, new_ids: set = None) -> dict:
+        """
+        Stream rows whose record_id is new and MERGE those whose values changed.
+
+        Args:
+            new_ids: record_ids known not to be in the table (e.g. from a change
+                manifest); every other row is then treated as revised. Without
+                it, the stored values of the batch's record_ids are looked up.
+
+        Returns:
+            Counts of 'streamed', 'revised' and 'unchanged' rows, and of rows
+            not written at all ('skipped': unchanged rows and repeated
+            record_ids, which keep their last row), plus the fallback MERGE's
+            job statistics when one ran
+        """
+        metrics = metrics or SourceMetrics(table_id)
+        deadline = deadline or Deadline()
+        source = rows
+        rows = list(iter_rows(source))  # Streamed as JSON, so serialized here
+        last = {}  # One insertId per request: record_id -> position of its last row
+        for position, row in enumerate(rows):
+            last[row['record_id']] = position
+        duplicates = len(rows) - len(last)
+        metrics.drop('duplicate_record_id', duplicates)
+        if not last:
+            return {'streamed': 0, 'revised': 0, 'unchanged': 0, 'skipped': 0}
+
+        if new_ids is not None:
+            new_rows = [rows[i] for record_id, i in last.items() if record_id in new_ids]
+            revised = [i for record_id, i in last.items() if record_id not in new_ids]
+            unchanged = 0
+        else:
+            unique = [rows[i] for i in last.values()]
+            with metrics.stage('diff'):
+                stored = self.stored_values(client, table_id, unique, metrics, deadline)
+            new_rows, revised, unchanged = [], [], 0
+            for i in last.values():
+                previous = stored.get(rows[i]['record_id'])
+                if previous is None:
+                    new_rows.append(rows[i])
+                elif previous != row_values(rows[i]):
+                    revised.append(i)
+                else:
+                    unchanged += 1
+        metrics.count('rows_unchanged', unchanged)
+
+        stats = {}
+        if revised:
+            logger.info(f"Merging {len(revised)} revised rows into {table_id} with a load job")
+            stats = self.fallback.merge(client, table_id, take_rows(source, rows, revised), metrics, deadline)
+        if new_rows:
+            with metrics.stage('load'):
+                self.insert(client, table_id, new_rows, metrics, deadline)
+        logger.info(f"Streamed {len(new_rows)} new rows into {table_id}, {len(revised)} revised, "
+                    f"{unchanged} unchanged")
+        return {'streamed': len(new_rows), 'revised': len(revised), 'unchanged': unchanged,
+                'skipped': unchanged + duplicates, **stats}
+
+    def replace(self, client: bigquery.Client, table_id: str, rows, metrics: SourceMetrics = None,
+                deadline: Deadline = None):
+        """Streaming inserts cannot truncate a table, so replacements use the fallback."""
+        self.fallback.replace(client, table_id, rows, metrics, deadline)
+
+    def stored_values(self, client: bigquery.Client, table_id: str, rows: list, metrics: SourceMetrics,
+                      deadline: Deadline, chunk_size: int = 10000) -> dict:
+        """Return record_id -> comparable values of the rows already stored under the batch's record_ids."""
+        columns = [c for c in rows[0] if c not in VOLATILE_COLUMNS]
+        min_date = min(row['measurement_date'] for row in rows) if 'measurement_date' in columns else None
+        stored = {}
+        for start in range(0, len(rows), chunk_size):
+            ids = [row['record_id'] for row in rows[start:start + chunk_size]]
+            parameters = [bigquery.ArrayQueryParameter('record_ids', 'STRING', ids)]
+            query = f"SELECT {', '.join(columns)} FROM `{table_id}` WHERE record_id IN UNNEST(@record_ids)"
+            if min_date:
+                # Prunes partitions; no row of the batch is older
+                query += " AND measurement_date >= @min_date"
+                parameters.append(bigquery.ScalarQueryParameter('min_date', 'DATE', min_date))
+            job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=parameters))
+            for row in job.result(timeout=deadline.remaining()):
+                stored[row['record_id']] = tuple((c, _comparable(row[c])) for c in columns)
+            metrics.add_job(job)
+        return stored
+
+    def insert(self, client: bigquery.Client, table_id: str, rows: list, metrics: SourceMetrics,
+               deadline: Deadline):
+        """Send rows in micro-batches of at most max_rows rows and max_bytes bytes."""
+        batch, batch_bytes = [], 0
+        for row in rows:
+            size = len(json.dumps(row)) + 1
+            if batch and (len(batch) >= self.max_rows or batch_bytes + size > self.max_bytes):
+                self._insert_batch(client, table_id, batch, batch_bytes, metrics, deadline)
+                batch, batch_bytes = [], 0
+            batch.append(row)
+            batch_bytes += size
+        if batch:
+            self._insert_batch(client, table_id, batch, batch_bytes, metrics, deadline)
+
+    def _insert_batch(self, client: bigquery.Client, table_id: str, batch: list, batch_bytes: int,
+                      metrics: SourceMetrics, deadline: Deadline):
+        row_ids = [row['record_id'] for row in batch]
+        for attempt in range(self.retries + 1):
+            deadline.check(f"streaming into {table_id}")
+            try:
+                errors = client.insert_rows_json(table_id, batch, row_ids=row_ids, timeout=deadline.remaining())
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning(f"Streaming insert into {table_id} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        if errors:
+            raise RuntimeError(f"Streaming insert into {table_id} rejected {len(errors)} rows: {errors[:3]}")
+        metrics.count('stream_requests')
+        metrics.count('rows_streamed', len(batch))
+        metrics.count('bytes_uploaded', batch_bytes)
+
+
+def _comparable(value):
+    """Normalize a stored value to the form rows carry (ISO strings for dates)."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def row_values(row: dict) -> tuple:
+    """Return a row's values as compared with stored_values(), ignoring volatile columns."""
+    return tuple((c, _comparable(v)) for c, v in row.items() if c not in VOLATILE_COLUMNS)
+
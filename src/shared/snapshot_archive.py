@@ -0,0 +1,197 @@
+"""
+Content-addressed archive of raw upstream responses.
+
+Every downloaded body is stored once, gzip-compressed, under its SHA-256
+digest, and every fetch adds a small index entry pointing at it:
+
+    objects/<digest[:2]>/<digest>.gz
+    index/<source>/<fetched_at>_<digest[:12]>.json
+
+Identical bodies share one object, so an unchanged upstream file costs only
+an index entry per run. The index keys sort by fetch time, which lets
+replay.py select the snapshots of a date range from a listing without
+reading them.
+
+The archive lives either in GCS (gs://bucket/prefix) or in a local directory
+(any other path, used for tests and local backfills).
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import zlib
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S%fZ'
+
+
+class LocalArchiveBackend:
+    """Stores archive objects as files under a local directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, data: bytes, content_type: str, overwrite: bool = True) -> bool:
+        """Write an object; returns False if it exists and overwrite is False."""
+        path = os.path.join(self.root, key)
+        if not overwrite and os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+
+    def get(self, key: str) -> bytes:
+        with open(os.path.join(self.root, key), 'rb') as f:
+            return f.read()
+
+    def list(self, prefix: str) -> list:
+        directory = os.path.join(self.root, prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f"{prefix}{name}" for name in os.listdir(directory) if not name.endswith('.tmp'))
+
+
+class GCSArchiveBackend:
+    """Stores archive objects in a GCS bucket under an optional prefix."""
+
+    def __init__(self, uri: str):
+        from google.cloud import storage
+
+        bucket_name, _, prefix = uri[len('gs://'):].partition('/')
+        self.bucket = storage.Client().bucket(bucket_name)
+        self.prefix = f"{prefix.rstrip('/')}/" if prefix else ''
+
+    def put(self, key: str, data: bytes, content_type: str, overwrite: bool = True) -> bool:
+        """Write an object; returns False if it exists and overwrite is False."""
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self.bucket.blob(self.prefix + key)
+        try:
+            # Generation 0 only matches a missing object, so concurrent writers upload at most once
+            blob.upload_from_string(data, content_type=content_type,
+                                    if_generation_match=None if overwrite else 0)
+        except PreconditionFailed:
+            return False
+        return True
+
+    def get(self, key: str) -> bytes:
+        return self.bucket.blob(self.prefix + key).download_as_bytes()
+
+    def list(self, prefix: str) -> list:
+        blobs = self.bucket.client.list_blobs(self.bucket, prefix=self.prefix + prefix)
+        return sorted(blob.name[len(self.prefix):] for blob in blobs)
+
+
+class SnapshotWriter:
+    """
+    Compresses and hashes a body as it is written, for streamed responses.
+
+    Call commit() once the whole body has been written.
+    """
+
+    def __init__(self, archive, source: str, url: str, response=None):
+        self.archive = archive
+        self.source = source
+        self.url = url
+        self.response = response
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._compressor = zlib.compressobj(9, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        self._hasher.update(chunk)
+        self._buffer.write(self._compressor.compress(chunk))
+
+    def commit(self) -> dict:
+        """Store the body (unless already archived) and its index entry; returns the entry."""
+        self._buffer.write(self._compressor.flush())
+        return self.archive.add(self.source, self.url, self._hasher.hexdigest(), self._buffer.getvalue(),
+                                self.size, self.response)
+
+
+class SnapshotArchive:
+    """Raw upstream bodies, deduplicated by content, indexed per source by fetch time."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def object_key(digest: str) -> str:
+        return f"objects/{digest[:2]}/{digest}.gz"
+
+    def writer(self, source: str, url: str, response=None) -> SnapshotWriter:
+        return SnapshotWriter(self, source, url, response)
+
+    def save(self, source: str, url: str, body: bytes, response=None) -> dict:
+        """Archive a complete response body; returns its index entry."""
+        writer = self.writer(source, url, response)
+        writer.write(body)
+        return writer.commit()
+
+    def add(self, source: str, url: str, digest: str, compressed: bytes, size: int, response=None) -> dict:
+        """Store an already compressed body under its digest and index it; returns the entry."""
+        fetched_at = datetime.now(timezone.utc)
+        headers = response.headers if response is not None else {}
+        stored = self.backend.put(self.object_key(digest), compressed, 'application/gzip', overwrite=False)
+        entry = {
+            'source': source,
+            'url': url,
+            'digest': digest,
+            'fetched_at': fetched_at.isoformat(),
+            'bytes': size,
+            'compressed_bytes': len(compressed),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+        }
+        index_key = f"index/{source}/{fetched_at.strftime(TIMESTAMP_FORMAT)}_{digest[:12]}.json"
+        self.backend.put(index_key, json.dumps(entry, sort_keys=True).encode(), 'application/json')
+        logger.info(f"Archived {source} snapshot {digest[:12]} ({size} bytes, "
+                    f"{len(compressed)} compressed{', new content' if stored else ''})")
+        return entry
+
+    def entries(self, source: str, since: datetime = None, until: datetime = None) -> list:
+        """
+        Return the index entries of a source fetched in [since, until], oldest first.
+
+        Bounds are compared in UTC; naive datetimes are taken as UTC.
+        """
+        since, until = (_as_utc(bound) for bound in (since, until))
+        entries = []
+        for key in self.backend.list(f"index/{source}/"):
+            fetched_at = datetime.strptime(key.rsplit('/', 1)[1].split('_')[0], TIMESTAMP_FORMAT)
+            fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+            if (since is None or fetched_at >= since) and (until is None or fetched_at <= until):
+                entries.append(json.loads(self.backend.get(key)))
+        return entries
+
+    def read(self, entry: dict) -> bytes:
+        """Return the decompressed body of an index entry."""
+        return zlib.decompress(self.backend.get(self.object_key(entry['digest'])), 31)
+
+
+def _as_utc(value: datetime):
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def create_snapshot_archive(uri: str):
+    """
+    Create a SnapshotArchive for a gs:// URI or local directory.
+
+    Returns None when no URI is configured, which disables archiving.
+    """
+    if not uri:
+        return None
+    if uri.startswith('gs://'):
+        return SnapshotArchive(GCSArchiveBackend(uri))
+    return SnapshotArchive(LocalArchiveBackend(uri))
@@ -0,0 +1,73 @@
+"""
+Shared fixtures for the tests of the ingest functions and shared modules.
+
+The functions are not packages: main.py imports its sibling modules and the
+modules of src/shared as top-level modules, as in the deployed zip. The
+gistemp and global_warming fixtures import a function's main.py as 'main'
+with its directory first on sys.path, so replay.py's 'import main' resolves
+to it, and drop the function's own modules again afterwards. BigQuery is
+the benchmarks' StubBigQueryClient.
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FUNCTIONS_DIR = os.path.join(ROOT, 'src', 'cloud-functions')
+sys.path[:0] = [os.path.join(ROOT, 'src', 'shared'), os.path.join(ROOT, 'benchmarks')]
+
+import runtime  # noqa: E402
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient  # noqa: E402
+
+# Modules that exist once per function and would otherwise shadow each other
+FUNCTION_MODULES = ('main', 'replay', 'connectors', 'streaming', 'change_manifest')
+
+
+def _import_function(name: str):
+    saved_path = list(sys.path)
+    saved_modules = {module: sys.modules.pop(module) for module in FUNCTION_MODULES if module in sys.modules}
+    sys.path.insert(0, os.path.join(FUNCTIONS_DIR, name))
+    try:
+        yield importlib.import_module('main')
+    finally:
+        for module in FUNCTION_MODULES:
+            sys.modules.pop(module, None)
+        sys.modules.update(saved_modules)
+        sys.path[:] = saved_path
+
+
+@pytest.fixture
+def gistemp():
+    """The nasa-gistemp-ingest main module."""
+    yield from _import_function('nasa-gistemp-ingest')
+
+
+@pytest.fixture
+def global_warming():
+    """The global-warming-api-ingest main module."""
+    yield from _import_function('global-warming-api-ingest')
+
+
+@pytest.fixture
+def bigquery_clients(monkeypatch):
+    """Stub clients handed out by runtime.get_bigquery_client, in creation order."""
+    clients = []
+    real_bigquery = runtime.bigquery
+
+    class StubBigQuery:
+        """google.cloud.bigquery, except that Client is the stub."""
+
+        def Client(self, project=None):
+            clients.append(StubBigQueryClient(TABLE_SCHEMAS, project=project or 'test'))
+            return clients[-1]
+
+        def __getattr__(self, name):
+            return getattr(real_bigquery, name)
+
+    runtime.reset_instances()
+    monkeypatch.setattr(runtime, 'bigquery', StubBigQuery())
+    yield clients
+    runtime.reset_instances()
@@ -0,0 +1,60 @@
+"""Incremental summary updates produce the rows of a full recompute."""
+
+from aggregates import MonthlySeries, month_date, month_index, summarize
+
+KINDS = {'land': ['annual', 'rolling_12m', 'yoy'], 'station': ['annual', 'rolling_12m', 'yoy']}
+FIRST_MONTH = month_index('2018-01-01')
+LATE_MONTH = month_index('2020-05-01')  # Missing from the first payload
+REVISED_MONTH = month_index('2021-02-01')
+
+
+def fixture_values(late: bool, revised: bool) -> dict:
+    """Month index -> (land, station) for 2018-01 .. 2022-06."""
+    values = {}
+    for index in range(FIRST_MONTH, month_index('2022-06-01') + 1):
+        if index == LATE_MONTH and not late:
+            continue
+        offset = index - FIRST_MONTH
+        values[index] = (round(0.8 + 0.01 * offset, 2), round(0.5 + (offset % 7) * 0.03, 2))
+    if revised:
+        land, station = values[REVISED_MONTH]
+        values[REVISED_MONTH] = (land + 0.25, station)
+    return values
+
+
+def build_series(values: dict) -> MonthlySeries:
+    series = MonthlySeries()
+    for index, (land, station) in values.items():
+        series.add('land', month_date(index), land)
+        series.add('station', month_date(index), station)
+    return series
+
+
+def upsert(tables: dict, summaries: dict):
+    """Apply summary rows the way the MERGE on record_id does."""
+    for kind, rows in summaries.items():
+        table = tables.setdefault(kind, {})
+        for row in rows.iter_rows():
+            row = dict(row)
+            del row['updated_at']
+            table[row['record_id']] = row
+
+
+def test_incremental_update_matches_full_recompute():
+    first, second = fixture_values(late=False, revised=False), fixture_values(late=True, revised=True)
+    changed_months = {index for index, value in second.items() if first.get(index) != value}
+    assert changed_months == {LATE_MONTH, REVISED_MONTH}
+
+    tables = {}
+    upsert(tables, summarize(build_series(first), KINDS))
+    stale = {kind: dict(rows) for kind, rows in tables.items()}
+    series = build_series(second)
+    incremental = summarize(series, KINDS, dict.fromkeys(KINDS, changed_months))
+    upsert(tables, incremental)
+
+    expected = {}
+    upsert(expected, summarize(series, KINDS))
+    assert stale != expected
+    assert tables == expected
+    # Only the windows around the two months were recomputed
+    assert sum(len(rows) for rows in incremental.values()) < sum(len(rows) for rows in expected.values()) / 4
@@ -0,0 +1,122 @@
+"""nasa-gistemp-ingest change manifest: only new or revised rows are staged."""
+
+import json
+import os
+
+import pytest
+
+from local_server import LocalUpstream, point_sources_at
+from record_batch import RecordBatch
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+TABLE = 'raw_gistemp_global'
+
+
+def gistemp_rows(anomalies: dict, ingestion_time: str = '2024-01-01T00:00:00') -> RecordBatch:
+    return RecordBatch.from_rows([{
+        'year': year, 'month': 1, 'temperature_anomaly': anomaly, 'measurement_date': f"{year}-01-01",
+        'record_id': f"global-{year}-01", 'ingestion_timestamp': ingestion_time,
+        'source_file': 'test', 'hemisphere': 'Global',
+    } for year, anomaly in anomalies.items()])
+
+
+def record_ids(rows: RecordBatch) -> list:
+    return rows.column('record_id').values()
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    return str(tmp_path / 'change-manifest.json')
+
+
+def test_first_diff_reports_every_row_as_inserted(gistemp, manifest_path):
+    manifest = gistemp.create_change_manifest(manifest_path)
+
+    changes = manifest.diff(TABLE, gistemp_rows({2000: 0.4, 2001: 0.5}))
+
+    assert record_ids(changes.inserted) == ['global-2000-01', 'global-2001-01']
+    assert len(changes.updated) == 0
+
+
+def test_diff_of_unchanged_changed_new_and_deleted_rows(gistemp, manifest_path):
+    manifest = gistemp.create_change_manifest(manifest_path)
+    manifest.commit(TABLE, manifest.diff(TABLE, gistemp_rows({2000: 0.4, 2001: 0.5, 2002: 0.6})))
+    manifest.save()
+
+    manifest = gistemp.create_change_manifest(manifest_path)
+    # 2000 unchanged (only the ingestion time moved), 2001 revised, 2002 gone upstream, 2003 new
+    rows = gistemp_rows({2000: 0.4, 2001: 0.55, 2003: 0.7}, ingestion_time='2024-02-01T00:00:00')
+    changes = manifest.diff(TABLE, rows)
+
+    assert record_ids(changes.inserted) == ['global-2003-01']
+    assert record_ids(changes.updated) == ['global-2001-01']
+    assert record_ids(changes.rows) == ['global-2003-01', 'global-2001-01']
+    assert len(changes) == 2
+
+    manifest.commit(TABLE, changes)
+    manifest.save()
+    with open(manifest_path) as f:
+        stored = json.load(f)[TABLE]
+    # Rows missing from a batch are kept: the MERGE never deletes them from the table either
+    assert sorted(stored) == ['global-2000-01', 'global-2001-01', 'global-2002-01', 'global-2003-01']
+    again = gistemp.create_change_manifest(manifest_path).diff(TABLE, gistemp_rows({2001: 0.55, 2002: 0.6}))
+    assert len(again) == 0
+
+
+def test_diff_leaves_the_manifest_unchanged_until_commit(gistemp, manifest_path):
+    manifest = gistemp.create_change_manifest(manifest_path)
+    rows = gistemp_rows({2000: 0.4})
+
+    manifest.diff(TABLE, rows)
+    manifest.save()
+
+    assert manifest.updates() == {}
+    assert len(manifest.diff(TABLE, rows).inserted) == 1
+    assert not os.path.exists(manifest_path)
+
+
+class FailingLoadClient(StubBigQueryClient):
+    """Stub client whose load jobs fail."""
+
+    def load_table_from_file(self, *args, **kwargs):
+        raise RuntimeError('load job failed')
+
+
+def test_manifest_is_not_committed_when_the_load_fails(gistemp, manifest_path, monkeypatch):
+    monkeypatch.setattr(gistemp, 'MAINTAIN_AGGREGATES', False)
+    manifest = gistemp.create_change_manifest(manifest_path)
+
+    with LocalUpstream() as upstream:
+        point_sources_at(gistemp, upstream.base_url)
+        config = gistemp.DATA_SOURCES['global']
+        with pytest.raises(RuntimeError):
+            gistemp.fetch_and_load_gistemp(FailingLoadClient(TABLE_SCHEMAS), 'global', config, manifest=manifest)
+        manifest.save()
+
+        assert manifest.updates() == {}
+        assert not os.path.exists(manifest_path)
+
+        result = gistemp.fetch_and_load_gistemp(StubBigQueryClient(TABLE_SCHEMAS), 'global', config,
+                                                manifest=manifest)
+        assert result['status'] == 'success' and result['inserted'] > 0
+        assert len(manifest.updates()[TABLE]) == result['inserted']
+
+
+def test_failed_run_leaves_the_stored_manifest_as_it_was(gistemp, bigquery_clients, manifest_path, monkeypatch):
+    monkeypatch.setattr(gistemp, 'CHANGE_MANIFEST_URI', manifest_path)
+    monkeypatch.setattr(gistemp, 'FETCH_STATE_URI', None)
+    monkeypatch.setattr(gistemp, 'SNAPSHOT_ARCHIVE_URI', None)
+    monkeypatch.setattr(gistemp, 'SERIES_CACHE_URL', None)
+    monkeypatch.setattr(gistemp, 'FANOUT_TOPIC', None)
+    stored = {TABLE: {'global-1880-01': '0123456789abcdef'}}
+    with open(manifest_path, 'w') as f:
+        json.dump(stored, f)
+
+    with LocalUpstream() as upstream:
+        point_sources_at(gistemp, upstream.base_url)
+        monkeypatch.setattr(StubBigQueryClient, 'load_table_from_file', FailingLoadClient.load_table_from_file)
+        body, status = gistemp.ingest_gistemp_data(None)
+        assert {result['status'] for result in body['details'].values()} == {'failed'}
+
+    with open(manifest_path) as f:
+        assert json.load(f) == stored
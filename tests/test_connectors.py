@@ -0,0 +1,23 @@
+"""Connector mappings compiled from config/connectors."""
+
+from datetime import datetime
+
+
+def test_numeric_time_is_kept_as_string(global_warming):
+    connector = global_warming.CONNECTORS['temperature']
+    records = [{'time': 2001.5, 'station': '0.61', 'land': '0.84'},
+               {'time': '2001.54', 'station': 0.55, 'land': None}]
+
+    rows = connector.build_batch(records, datetime(2024, 1, 1).isoformat(), 'https://global-warming.org')
+    valid = connector.validator.validate(rows)
+
+    assert valid.column('time').values() == ['2001.5', '2001.54']
+
+
+def test_columns_and_source_fields_come_from_the_mapping(global_warming):
+    connector = global_warming.CONNECTORS['temperature']
+
+    assert connector.columns == ('record_id', 'measurement_date', 'ingestion_timestamp', 'source_file',
+                                 'land', 'station', 'time')
+    assert connector.source_fields == ('time', 'land', 'station')
+    assert global_warming.API_ENDPOINTS['temperature']['fields'] == ['time', 'land', 'station']
@@ -0,0 +1,129 @@
+"""Fan-out of sources to worker invocations, through LocalTaskQueue."""
+
+import json
+import threading
+
+import pytest
+
+from fanout import LocalTaskQueue, create_result_store, fan_out, read_push_task, run_task
+from local_server import LocalUpstream, point_sources_at
+from pipeline import Deadline
+
+SOURCES = ['global', 'northern', 'zonal']
+
+
+class Request:
+    """The parts of a Flask request the entry points read."""
+
+    def __init__(self, **args):
+        self.args = args
+
+    def get_json(self, silent: bool = False):
+        return None
+
+
+class Worker:
+    """Push handler that runs tasks with run_task() and records every source it processed."""
+
+    def __init__(self, store, failing=(), blocked=()):
+        self.store = store
+        self.failing = set(failing)
+        self.blocked = set(blocked)
+        self.release = threading.Event()
+        self.processed = []
+
+    def process(self, task: dict) -> dict:
+        source = task['source']
+        if source in self.blocked:
+            self.release.wait(5)
+        self.processed.append(source)
+        if source in self.failing:
+            raise ConnectionError(f"{source} is down")
+        return {'result': {'status': 'success', 'records': 1}}
+
+    def handle(self, envelope: dict) -> tuple:
+        record = run_task(self.store, read_push_task(envelope), self.process)
+        return record['result'], 200
+
+
+@pytest.fixture
+def store(tmp_path):
+    return create_result_store(str(tmp_path / 'results'))
+
+
+def run(worker, run_id: str, deadline: Deadline = None) -> dict:
+    queue = LocalTaskQueue(worker.handle)
+    try:
+        return fan_out(queue, worker.store, 'test', run_id, SOURCES, deadline=deadline, poll_seconds=0.01)
+    finally:
+        worker.release.set()
+        queue.close(wait=True)
+
+
+def test_redelivered_task_after_success_is_acknowledged(store):
+    worker = Worker(store)
+    queue = LocalTaskQueue(worker.handle, workers=1)
+    task = {'function': 'test', 'run_id': 'run-1', 'task_id': 'task-1', 'source': 'global', 'options': {}}
+    queue.publish(task)
+    queue.publish(task)
+    queue.close(wait=True)
+
+    assert worker.processed == ['global']
+    assert queue.deliveries == [('global', 200), ('global', 200)]
+    assert store.results('run-1')['global']['task_id'] == 'task-1'
+
+
+def test_rerun_republishes_only_unfinished_sources(store):
+    first = run(Worker(store, failing={'zonal'}), 'run-1')
+    assert {source: record['result']['status'] for source, record in first.items()} == {
+        'global': 'success', 'northern': 'success', 'zonal': 'failed'}
+
+    worker = Worker(store)
+    second = run(worker, 'run-1')
+    assert worker.processed == ['zonal']
+    assert all(record['result']['status'] == 'success' for record in second.values())
+    assert second['global']['task_id'] == first['global']['task_id']
+
+
+def test_deadline_expires_with_sources_missing(store):
+    worker = Worker(store, blocked={'zonal'})
+    records = run(worker, 'run-1', Deadline(0.2))
+
+    assert records['global']['result']['status'] == 'success'
+    assert records['northern']['result']['status'] == 'success'
+    assert records['zonal']['result']['status'] == 'failed'
+    assert 'before the deadline' in records['zonal']['result']['error']
+
+
+def test_coordinator_applies_and_saves_worker_state_once(gistemp, bigquery_clients, tmp_path, monkeypatch):
+    import change_manifest
+    import fetch_state
+
+    saves = []
+    for cls in (fetch_state.FetchStateStore, change_manifest.ChangeManifest):
+        def save(self, original=cls.save, name=cls.__name__):
+            saves.append((name, threading.current_thread().name))
+            original(self)
+        monkeypatch.setattr(cls, 'save', save)
+
+    monkeypatch.setattr(gistemp, 'FANOUT_TOPIC', 'local')
+    monkeypatch.setattr(gistemp, 'FANOUT_RESULTS_URI', str(tmp_path / 'results'))
+    monkeypatch.setattr(gistemp, 'FANOUT_POLL_SECONDS', 0.01)
+    monkeypatch.setattr(gistemp, 'FETCH_STATE_URI', str(tmp_path / 'fetch-state.json'))
+    monkeypatch.setattr(gistemp, 'CHANGE_MANIFEST_URI', str(tmp_path / 'change-manifest.json'))
+    monkeypatch.setattr(gistemp, 'SNAPSHOT_ARCHIVE_URI', None)
+    monkeypatch.setattr(gistemp, 'SERIES_CACHE_URL', None)
+
+    with LocalUpstream() as upstream:
+        point_sources_at(gistemp, upstream.base_url)
+        body, status = gistemp.ingest_gistemp_data(Request())
+        assert status == 200 and body['status'] == 'completed'
+        assert sorted(saves) == [('ChangeManifest', 'MainThread'), ('FetchStateStore', 'MainThread')]
+
+        with open(tmp_path / 'fetch-state.json') as f:
+            assert set(json.load(f)) == {config['url'] for config in gistemp.DATA_SOURCES.values()}
+        with open(tmp_path / 'change-manifest.json') as f:
+            assert set(json.load(f)) == {config['table'] for config in gistemp.DATA_SOURCES.values()}
+
+        body, _ = gistemp.ingest_gistemp_data(Request())
+        assert {result['status'] for result in body['details'].values()} == {'unchanged'}
@@ -0,0 +1,44 @@
+"""Fetch state: an unreadable state document never blocks a run."""
+
+import json
+
+from fetch_state import create_fetch_state_store
+
+
+class Response:
+    headers = {'ETag': '"v2"'}
+
+
+def test_unreadable_state_falls_back_to_empty(tmp_path, caplog):
+    path = tmp_path / 'fetch-state.json'
+    path.write_text('{"https://example.test/a": {"etag": "\\"v1\\"", "digest": "')  # Truncated write
+
+    store = create_fetch_state_store(str(path))
+
+    assert store.get('https://example.test/a') == {}
+    assert store.conditional_headers('https://example.test/a') == {}
+    assert 'Failed to read fetch state' in caplog.text
+
+    store.update('https://example.test/a', Response(), 'abc')
+    store.save()
+    assert json.loads(path.read_text())['https://example.test/a']['etag'] == '"v2"'
+
+
+def test_ingest_runs_when_state_cannot_be_read(gistemp, bigquery_clients, tmp_path, monkeypatch):
+    from local_server import LocalUpstream, point_sources_at
+
+    unreadable = tmp_path / 'state'
+    unreadable.mkdir()  # open() on a directory fails like a denied GCS read
+    monkeypatch.setattr(gistemp, 'FETCH_STATE_URI', str(unreadable))
+    monkeypatch.setattr(gistemp, 'CHANGE_MANIFEST_URI', str(unreadable))
+    monkeypatch.setattr(gistemp, 'SNAPSHOT_ARCHIVE_URI', None)
+    monkeypatch.setattr(gistemp, 'SERIES_CACHE_URL', None)
+    monkeypatch.setattr(gistemp, 'FANOUT_TOPIC', None)
+
+    with LocalUpstream() as upstream:
+        point_sources_at(gistemp, upstream.base_url)
+        body, status = gistemp.ingest_gistemp_data(None)
+
+    assert status == 200 and body['status'] == 'completed'
+    assert all(result['status'] == 'success' and result['inserted'] == 0
+               for name, result in body['details'].items() if name != 'zonal')
@@ -0,0 +1,117 @@
+"""nasa-gistemp-ingest parses the monthly and zonal GISTEMP CSV tables."""
+
+import pytest
+
+from metrics import SourceMetrics
+
+SOURCE_FILE = 'https://example.invalid/gistemp.csv'
+
+MONTHLY_CSV = """Northern Hemisphere-mean monthly, seasonal, and annual means, 1880-present
+Year,Jan,Feb,Mar,Apr,May,Jun,Jul,Aug,Sep,Oct,Nov,Dec,J-D,D-N,DJF,MAM,JJA,SON
+1880,-.36,-.50,***,-.30,-.05,-.18,-.21,-.10,-.16,-.23,-.24,-.17,-.22,***,***,-.17,-.16,-.21
+
+2024,1.25,999.9,1.10
+year,.10,.20,.30,.40,.50,.60,.70,.80,.90,1.0,1.1,1.2,.65,.65,.20,.40,.70,1.0
+"""
+
+ZONAL_CSV = """Year,Glob,NHem,SHem,24N-90N
+1880,-.17,-.28,***,-.39
+1881,999.9,-.17
+"""
+
+
+def strip_ingestion_time(rows: list) -> list:
+    for row in rows:
+        assert row.pop('ingestion_timestamp')
+    return rows
+
+
+def monthly_row(gistemp, year: int, month: int, anomaly: float) -> dict:
+    return {
+        'year': year,
+        'month': month,
+        'temperature_anomaly': anomaly,
+        'measurement_date': f"{year:04d}-{month:02d}-01",
+        'record_id': gistemp.generate_record_id('northern', year, month),
+        'source_file': SOURCE_FILE,
+        'hemisphere': 'northern',
+    }
+
+
+def zonal_row(gistemp, year: int, zone: str, anomaly: float) -> dict:
+    return {
+        'year': year,
+        'zone': zone,
+        'temperature_anomaly': anomaly,
+        'record_id': gistemp.generate_record_id(zone, year),
+        'source_file': SOURCE_FILE,
+    }
+
+
+def test_read_columns_skips_title_and_blank_lines_and_pads_short_rows(gistemp):
+    header, columns = gistemp.read_gistemp_columns(ZONAL_CSV)
+
+    assert header == ['Year', 'Glob', 'NHem', 'SHem', '24N-90N']
+    assert columns == [['1880', '1881'], ['-.17', '999.9'], ['-.28', '-.17'], ['***', ''], ['-.39', '']]
+
+    header, columns = gistemp.read_gistemp_columns(MONTHLY_CSV)
+    assert header[:3] == ['Year', 'Jan', 'Feb'] and len(header) == 19
+    assert columns[0] == ['1880', '2024', 'year']
+    assert columns[header.index('Apr')] == ['-.30', '', '.40']
+
+
+def test_read_columns_without_year_header(gistemp):
+    assert gistemp.read_gistemp_columns('Title only\n1880,1,2\n') == ([], [])
+    assert gistemp.read_gistemp_columns('Year,Jan\n') == (['Year', 'Jan'], [[], []])
+
+
+def test_monthly_rows(gistemp):
+    metrics = SourceMetrics('northern')
+
+    rows = gistemp.parse_gistemp_csv(MONTHLY_CSV, 'monthly', 'northern', SOURCE_FILE, metrics)
+
+    anomalies_1880 = [-.36, -.50, None, -.30, -.05, -.18, -.21, -.10, -.16, -.23, -.24, -.17]
+    expected = [monthly_row(gistemp, 1880, month, anomaly)
+                for month, anomaly in enumerate(anomalies_1880, 1) if anomaly is not None]
+    expected += [monthly_row(gistemp, 2024, 1, 1.25), monthly_row(gistemp, 2024, 3, 1.10)]
+    assert strip_ingestion_time(rows.to_rows()) == expected
+    # '***' in Mar 1880 and the blank cells of the short 2024 row; 999.9 in Feb 2024
+    assert metrics.dropped == {'invalid_year': 1, 'missing_value': 10, 'missing_sentinel': 1}
+    assert metrics.counters['rows_parsed'] == len(expected) + 12
+
+
+def test_monthly_rows_outside_the_date_range_are_dropped(gistemp):
+    metrics = SourceMetrics('northern')
+
+    rows = gistemp.parse_gistemp_csv('Year,Jan\n0,.1\n10000,.2\n1,.3\n', 'monthly', 'northern', SOURCE_FILE,
+                                     metrics)
+
+    assert strip_ingestion_time(rows.to_rows()) == [monthly_row(gistemp, 1, 1, .3)]
+    assert metrics.dropped == {'invalid_year': 2}
+
+
+def test_zonal_rows(gistemp):
+    metrics = SourceMetrics('zonal')
+
+    rows = gistemp.parse_gistemp_csv(ZONAL_CSV, 'zonal', source_file=SOURCE_FILE, metrics=metrics)
+
+    assert strip_ingestion_time(rows.to_rows()) == [
+        zonal_row(gistemp, 1880, 'Glob', -.17),
+        zonal_row(gistemp, 1880, 'NHem', -.28),
+        zonal_row(gistemp, 1880, '24N-90N', -.39),
+        zonal_row(gistemp, 1881, 'NHem', -.17),
+    ]
+    assert metrics.dropped == {'missing_value': 3, 'missing_sentinel': 1}
+
+
+def test_zonal_source_file_defaults_to_the_zonal_url(gistemp):
+    rows = gistemp.parse_gistemp_csv(ZONAL_CSV, 'zonal')
+
+    assert set(rows.column('source_file').values()) == {gistemp.DATA_SOURCES['zonal']['url']}
+
+
+@pytest.mark.parametrize('csv_content', ['', 'Title\nno header here\n'])
+def test_csv_without_year_header_yields_no_rows(gistemp, csv_content):
+    rows = gistemp.parse_gistemp_csv(csv_content, 'monthly', 'northern', SOURCE_FILE)
+
+    assert len(rows) == 0
@@ -0,0 +1,123 @@
+"""Fetcher retries, backoff jitter and the per-host circuit breaker."""
+
+import random
+import time
+
+import pytest
+
+from http_fetch import CircuitBreaker, CircuitOpenError, Fetcher, reset_host_state
+from runtime import requests
+
+URL = 'https://upstream.test/api/co2-api'
+
+
+class Response:
+    def __init__(self, status_code: int, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.url = URL
+
+    def close(self):
+        pass
+
+
+class Session:
+    """Answers GETs from a list of statuses (the last one repeats); an exception instance is raised."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Response(outcome)
+
+
+@pytest.fixture(autouse=True)
+def host_state():
+    reset_host_state()
+    yield
+    reset_host_state()
+
+
+def test_breaker_opens_goes_half_open_and_closes():
+    session = Session(503)
+    fetcher = Fetcher(session, retries=0, backoff_base=0, breaker_threshold=2, breaker_cooldown=0.05)
+
+    assert fetcher.get(URL).status_code == 503
+    assert fetcher.get(URL).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        fetcher.get(URL)
+    assert session.calls == 2  # Open: failed fast without a request
+
+    time.sleep(0.06)
+    assert fetcher.get(URL).status_code == 503  # Half-open trial fails and re-opens the circuit
+    with pytest.raises(CircuitOpenError):
+        fetcher.get(URL)
+    assert session.calls == 3
+
+    time.sleep(0.06)
+    session.outcomes = [200]
+    assert fetcher.get(URL).status_code == 200  # Trial succeeds and closes the circuit
+    assert fetcher.get(URL).status_code == 200
+    assert session.calls == 5
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()  # The trial is still outstanding
+    breaker.record_success()
+    assert breaker.allow() and breaker.failures == 0
+
+
+@pytest.mark.parametrize('error', [requests.exceptions.TooManyRedirects('loop'),
+                                   requests.exceptions.InvalidURL('bad'), UnicodeDecodeError('utf-8', b'', 0, 1, 'x')])
+def test_half_open_trial_ending_in_other_error_does_not_block_host(error):
+    session = Session(503)
+    fetcher = Fetcher(session, retries=0, backoff_base=0, breaker_threshold=1, breaker_cooldown=0.05)
+    fetcher.get(URL)
+    time.sleep(0.06)
+
+    session.outcomes = [error]
+    with pytest.raises(type(error)):
+        fetcher.get(URL)  # The half-open trial
+
+    session.outcomes = [200]
+    assert fetcher.get(URL).status_code == 200  # The next request is let through and closes the circuit
+    assert fetcher.get(URL).status_code == 200
+    assert session.calls == 4
+
+
+def test_retries_stop_at_the_cap():
+    session = Session(requests.exceptions.ConnectionError('reset'))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        Fetcher(session, retries=3, backoff_base=0, breaker_threshold=100).get(URL)
+    assert session.calls == 4
+
+    session = Session(503)
+    assert Fetcher(session, retries=2, backoff_base=0, breaker_threshold=100).get(URL).status_code == 503
+    assert session.calls == 3
+
+    session = Session(503, 503, 200)
+    assert Fetcher(session, retries=3, backoff_base=0, breaker_threshold=100).get(URL).status_code == 200
+    assert session.calls == 3
+
+
+def test_backoff_jitter_stays_within_bounds():
+    fetcher = Fetcher(Session(200), backoff_base=0.5, backoff_max=4.0, rng=random.Random(0))
+    for attempt in range(7):
+        ceiling = min(4.0, 0.5 * 2 ** attempt)
+        delays = [fetcher.backoff(attempt) for _ in range(500)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert min(delays) < ceiling * 0.1 and max(delays) > ceiling * 0.9  # Full jitter, not a fixed delay
+
+    assert fetcher.backoff(0, Response(429, {'Retry-After': '2'})) == 2.0
+    assert fetcher.backoff(0, Response(429, {'Retry-After': '120'})) == 4.0
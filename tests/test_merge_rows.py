@@ -0,0 +1,64 @@
+"""global-warming-api-ingest merge_rows stages one row per record_id."""
+
+import gzip
+import io
+import json
+
+import pyarrow.parquet as pq
+import pytest
+
+from metrics import SourceMetrics
+from record_batch import RecordBatch
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+TABLE_ID = 'test.climate_data.raw_gw_co2'
+
+
+def co2_rows() -> list:
+    rows = [{'record_id': f"co2-{day}", 'measurement_date': f"2024-01-{day:02d}", 'cycle': 400.0 + day,
+             'trend': 400.5, 'ingestion_timestamp': '2024-02-01T00:00:00', 'source_file': 'test'}
+            for day in range(1, 6)]
+    rows.append(dict(rows[1], cycle=499.0))  # The payload repeats co2-2 with a revised value
+    return rows
+
+
+def staged_rows(load: dict) -> list:
+    payload = load['payload']
+    if load['source_format'] == 'PARQUET':
+        return pq.read_table(io.BytesIO(payload)).to_pylist()
+    if payload[:2] == b'\x1f\x8b':
+        payload = gzip.decompress(payload)
+    return [json.loads(line) for line in payload.splitlines()]
+
+
+@pytest.mark.parametrize('load_format', ['json', 'parquet', 'ndjson_buffer'])
+def test_merge_stages_last_row_of_each_record_id(global_warming, load_format):
+    from streaming import NdjsonUploadBuffer
+
+    client = StubBigQueryClient(TABLE_SCHEMAS)
+    metrics = SourceMetrics('co2')
+    if load_format == 'ndjson_buffer':
+        rows = NdjsonUploadBuffer()
+        for row in co2_rows():
+            rows.write(row)
+    else:
+        rows = RecordBatch.from_rows(co2_rows())
+
+    global_warming.merge_rows(client, TABLE_ID, rows, 'parquet' if load_format == 'parquet' else 'json',
+                              metrics)
+
+    staged = staged_rows(client.loads[0])
+    assert sorted(row['record_id'] for row in staged) == [f"co2-{day}" for day in range(1, 6)]
+    assert next(row['cycle'] for row in staged if row['record_id'] == 'co2-2') == 499.0
+    assert metrics.dropped == {'duplicate_record_id': 1}
+    assert 'MERGE' in client.queries[0] and client.deleted == [client.loads[0]['table']]
+    assert len(rows) == 6  # The caller's rows are left as they were
+
+
+def test_merge_without_duplicates_stages_rows_as_given(global_warming):
+    client = StubBigQueryClient(TABLE_SCHEMAS)
+    metrics = SourceMetrics('co2')
+    global_warming.merge_rows(client, TABLE_ID, RecordBatch.from_rows(co2_rows()[:5]), 'json', metrics)
+
+    assert [row['record_id'] for row in staged_rows(client.loads[0])] == [f"co2-{day}" for day in range(1, 6)]
+    assert metrics.dropped == {}
@@ -0,0 +1,24 @@
+"""Column kinds of record_batch.py."""
+
+from array import array
+
+import pytest
+
+from record_batch import ArrayColumn, Column, ConstantColumn, DateColumn, DictionaryColumn, ListColumn
+
+
+def test_column_kinds_implement_the_abstract_methods():
+    with pytest.raises(TypeError):
+        Column()
+
+    class Incomplete(Column):
+        def values(self) -> list:
+            return []
+
+    with pytest.raises(TypeError, match='take'):
+        Incomplete()
+
+    for column in (ConstantColumn('a', 3), DictionaryColumn.encode(['a', 'b', 'a']),
+                   ArrayColumn.from_values([1.0, None, 3.0], 'd'), DateColumn(array('i', [738886, 738887, 738888])),
+                   ListColumn(['x', 'y', 'z'])):
+        assert column.take([2, 0]).values() == [column.values()[2], column.values()[0]]
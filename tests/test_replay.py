@@ -0,0 +1,58 @@
+"""replay.py loads, merges and summarizes into the dataset it is given, and nowhere else."""
+
+import re
+from urllib.parse import urlsplit
+
+import pytest
+
+from local_server import synthetic_payloads
+from snapshot_archive import create_snapshot_archive
+
+TARGET = 'scratch.climate_backfill.'
+
+
+def archive_sources(directory: str, sources: dict, vintages: int = 2):
+    archive = create_snapshot_archive(directory)
+    for vintage in range(vintages):
+        payloads = synthetic_payloads(seed=vintage)
+        for name, config in sources.items():
+            archive.save(name, config['url'], payloads[urlsplit(config['url']).path][1])
+
+
+def tables_written(client) -> set:
+    tables = {load['table'] for load in client.loads} | set(client.deleted)
+    for query in client.queries:
+        tables.update(re.findall(r'`([^`]+)`', query))
+    return tables
+
+
+@pytest.mark.parametrize('function, sources', [
+    ('gistemp', 'DATA_SOURCES'),
+    ('global_warming', 'API_ENDPOINTS'),
+])
+def test_replay_writes_only_to_target_dataset(request, tmp_path, bigquery_clients, function, sources):
+    main = request.getfixturevalue(function)
+    import replay
+
+    archive_sources(str(tmp_path), getattr(main, sources))
+    results = replay.replay(str(tmp_path), project='scratch', dataset='climate_backfill', workers=1)
+
+    assert results and all(result['status'] == 'success' for result in results.values())
+    tables = tables_written(bigquery_clients[0])
+    assert any('.agg_' in table for table in tables), 'no summary table was written'
+    assert sorted(table for table in tables if not table.startswith(TARGET)) == []
+
+
+def test_truncate_refuses_to_replace_table_from_some_of_its_sources(tmp_path, bigquery_clients, gistemp):
+    import replay
+
+    archive_sources(str(tmp_path), gistemp.DATA_SOURCES)
+    with pytest.raises(ValueError, match='raw_gistemp_global: northern, southern'):
+        replay.replay(str(tmp_path), sources=['global'], project='scratch', dataset='climate_backfill',
+                      workers=1, truncate=True)
+    assert bigquery_clients == [] or bigquery_clients[0].loads == []
+
+    results = replay.replay(str(tmp_path), sources=['global', 'northern', 'southern', 'zonal'],
+                            project='scratch', dataset='climate_backfill', workers=1, truncate=True)
+    assert results['raw_gistemp_global']['status'] == 'success'
+    assert replay.replay(str(tmp_path), sources=['global'], workers=1, truncate=True, dry_run=True)
@@ -0,0 +1,93 @@
+"""StreamingSink: exactly-once streaming by insertId and the load-job path for revisions."""
+
+import pytest
+
+from sinks import LoadJobSink, StreamingSink
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+
+TABLE_ID = 'test.climate_data.raw_gw_co2'
+
+
+def co2_rows(days: int, run: int = 0, revised: dict = None) -> list:
+    revised = revised or {}
+    return [{
+        'record_id': f"co2-{day}",
+        'measurement_date': f"2024-01-{day:02d}",
+        'cycle': revised.get(day, 400.0 + day),
+        'trend': 400.5,
+        'ingestion_timestamp': f"2024-02-01T00:0{run}:00",
+    } for day in range(1, days + 1)]
+
+
+class Fallback(LoadJobSink):
+    """LoadJobSink recording the rows of every MERGE, which fails while `error` is set."""
+
+    def __init__(self):
+        super().__init__(self._record, None)
+        self.merged = []
+        self.error = None
+
+    def _record(self, client, table_id, rows, metrics=None, deadline=None):
+        if self.error:
+            raise self.error
+        self.merged.append(list(rows))
+        return {'merge_job_id': 'stub'}
+
+
+@pytest.fixture
+def fallback():
+    return Fallback()
+
+
+def test_retried_inserts_are_deduplicated_by_insert_id(fallback):
+    client = StubBigQueryClient(TABLE_SCHEMAS, insert_failure_rate=0.3, seed=3)
+    sink = StreamingSink(fallback, max_rows=4, retry_delay=0)
+    rows = co2_rows(20)
+    rows.append(dict(rows[5], cycle=999.0))  # Repeated record_id: the last row wins
+
+    result = sink.merge(client, TABLE_ID, rows)
+
+    stored = client.streamed['raw_gw_co2']
+    assert sum(client.inserts) > len(stored) == 20  # Some requests were resent
+    assert set(stored) == {row['record_id'] for row in rows}
+    assert stored['co2-6']['cycle'] == 999.0
+    assert result['streamed'] == 20 and result['skipped'] == 1
+    assert fallback.merged == []
+
+    sent = sum(client.inserts)
+    result = sink.merge(client, TABLE_ID, co2_rows(20, run=1))
+    assert result['unchanged'] == 20 - 1 and result['revised'] == 1  # co2-6 differs from the stored 999.0
+    assert sum(client.inserts) == sent
+
+
+def test_revision_of_streamed_row_merges_through_load_job(fallback):
+    client = StubBigQueryClient(TABLE_SCHEMAS)
+    sink = StreamingSink(fallback, retry_delay=0)
+    sink.merge(client, TABLE_ID, co2_rows(10))
+
+    # The revised row is still in the streaming buffer, where DML cannot update it
+    fallback.error = RuntimeError('UPDATE or DELETE statement over table would affect rows in the streaming buffer')
+    with pytest.raises(RuntimeError, match='streaming buffer'):
+        sink.merge(client, TABLE_ID, co2_rows(11, run=1, revised={3: 410.0}))
+    stored = client.streamed['raw_gw_co2']
+    assert len(stored) == 10 and stored['co2-3']['cycle'] == 403.0  # Nothing written; the next run retries
+
+    fallback.error = None
+    result = sink.merge(client, TABLE_ID, co2_rows(11, run=2, revised={3: 410.0}))
+    assert result['streamed'] == 1 and result['revised'] == 1 and result['unchanged'] == 9
+    assert [row['record_id'] for row in fallback.merged[0]] == ['co2-3']
+    assert fallback.merged[0][0]['cycle'] == 410.0
+    assert 'co2-11' in stored and stored['co2-3']['cycle'] == 403.0  # Revisions are never streamed
+
+
+def test_new_ids_skip_the_lookup(fallback):
+    client = StubBigQueryClient(TABLE_SCHEMAS)
+    sink = StreamingSink(fallback, retry_delay=0)
+    rows = co2_rows(5)
+
+    result = sink.merge(client, TABLE_ID, rows, new_ids={'co2-4', 'co2-5'})
+
+    assert client.queries == []
+    assert sorted(client.streamed['raw_gw_co2']) == ['co2-4', 'co2-5']
+    assert [row['record_id'] for row in fallback.merged[0]] == ['co2-1', 'co2-2', 'co2-3']
+    assert result['streamed'] == 2 and result['revised'] == 3
@@ -0,0 +1,136 @@
+"""global-warming-api-ingest streaming decodes payload arrays and buffers NDJSON uploads."""
+
+import gzip
+import json
+
+import pytest
+
+PAYLOAD = {
+    'meta': {'co2': [{'nested': True}], 'note': 'a "quoted" \\ value, with } and ]'},
+    'count': 12345.678e-2,
+    'co2': [
+        {'year': '2024', 'cycle': 421.25, 'trend': -0.5e3, 'note': 'café \\"escaped\\" \n line'},
+        {'year': 2024, 'cycle': 1234567890123, 'trend': None, 'co2': {'co2': [1, 2]}},
+        [],
+        'text',
+        17,
+    ],
+    'after': [1, 2, 3],
+}
+
+
+def chunked(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+def test_array_elements_survive_any_chunk_size(global_warming, size):
+    text = json.dumps(PAYLOAD)
+
+    assert list(global_warming.iter_json_array(chunked(text, size), 'co2')) == PAYLOAD['co2']
+
+
+def test_array_elements_survive_every_split_point(global_warming):
+    # Every position inside a string, escape sequence and number ends a chunk once
+    text = json.dumps({'data': [{'value': 12.5e-3, 'name': 'a\\"bé'}, -98765, "x\\ny"]}, ensure_ascii=False)
+    expected = json.loads(text)['data']
+
+    for split in range(len(text) + 1):
+        assert list(global_warming.iter_json_array([text[:split], text[split:]], 'data')) == expected, split
+
+
+def test_number_at_the_end_of_a_chunk_is_not_cut_short(global_warming):
+    chunks = ['{"data": [12', '34', '5, 6', '.', '25]}']
+
+    assert list(global_warming.iter_json_array(chunks, 'data')) == [12345, 6.25]
+
+
+def test_key_after_other_top_level_keys_and_nested_same_key(global_warming):
+    text = json.dumps({'data': None, 'nested': {'co2': ['wrong']}, 'list': [{'co2': 'wrong'}], 'co2': [1, 2]})
+    # 'data' shares no prefix with the key; the nested 'co2's are values of other keys
+    assert list(global_warming.iter_json_array(chunked(text, 5), 'co2')) == [1, 2]
+
+
+def test_empty_array(global_warming):
+    assert list(global_warming.iter_json_array(['{"co2": [ ', ' ], "other": 1}'], 'co2')) == []
+
+
+def test_missing_key_raises_missing_key_error(global_warming):
+    text = json.dumps({'methane': [1], 'meta': {'co2': [2]}})
+
+    with pytest.raises(global_warming.MissingKeyError):
+        list(global_warming.iter_json_array(chunked(text, 4), 'co2'))
+    with pytest.raises(global_warming.MissingKeyError):
+        list(global_warming.iter_json_array(['{}'], 'co2'))
+
+
+def test_non_object_payload_is_rejected(global_warming):
+    with pytest.raises(ValueError):
+        list(global_warming.iter_json_array(['[1, 2]'], 'co2'))
+
+
+def buffer_rows(count: int) -> list:
+    return [{'record_id': f"co2-{i % 40}", 'measurement_date': f"2024-{i % 12 + 1:02d}-01", 'value': i}
+            for i in range(count)]
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_buffer_spills_to_disk_and_keeps_every_row(global_warming, compress):
+    rows = buffer_rows(500)
+
+    with global_warming.NdjsonUploadBuffer(compress=compress, chunk_rows=16, max_memory=1024) as buffer:
+        for row in rows:
+            buffer.write(row)
+        file = buffer.open()
+
+        assert file._rolled  # Past max_memory the spooled file moved to disk
+        data = file.read()
+        lines = (gzip.decompress(data) if compress else data).decode().splitlines()
+        assert [json.loads(line) for line in lines] == rows
+        assert len(buffer) == 500
+        assert buffer.columns == ['record_id', 'measurement_date', 'value']
+        assert buffer.min_date == '2024-01-01'
+
+
+def test_small_buffer_stays_in_memory(global_warming):
+    with global_warming.NdjsonUploadBuffer(chunk_rows=4) as buffer:
+        for row in buffer_rows(10):
+            buffer.write(row)
+
+        assert not buffer.open()._rolled
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_buffer_can_be_uploaded_again(global_warming, compress):
+    # A retried load job reads the same file from the start again
+    rows = buffer_rows(300)
+    with global_warming.NdjsonUploadBuffer(compress=compress, chunk_rows=7, max_memory=512) as buffer:
+        for row in rows:
+            buffer.write(row)
+
+        first = buffer.open().read()
+        second = buffer.open().read()
+        assert first == second and first
+        assert list(buffer.iter_rows()) == rows
+        assert buffer.open().read() == first
+
+
+def test_unique_keeps_the_last_row_of_each_record_id(global_warming):
+    rows = buffer_rows(100)
+    with global_warming.NdjsonUploadBuffer(chunk_rows=8, max_memory=256) as buffer:
+        for row in rows:
+            buffer.write(row)
+        last = {row['record_id']: row for row in rows}
+
+        with buffer.unique() as unique:
+            assert unique is not buffer
+            assert list(unique.iter_rows()) == sorted(last.values(), key=rows.index)
+            assert len(unique) == 40
+
+
+def test_unique_returns_the_buffer_without_repeats(global_warming):
+    with global_warming.NdjsonUploadBuffer() as buffer:
+        for row in buffer_rows(40):
+            buffer.write(row)
+
+        assert buffer.unique() is buffer
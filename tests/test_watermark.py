@@ -0,0 +1,123 @@
+"""global-warming-api-ingest merges only rows past the watermark and its look-back window."""
+
+import json
+from datetime import date
+
+import pytest
+
+from fetch_state import create_fetch_state_store
+from local_server import LocalUpstream, point_sources_at
+from metrics import SourceMetrics
+from record_batch import RecordBatch
+from stub_bigquery import TABLE_SCHEMAS, StubBigQueryClient
+from test_merge_rows import staged_rows
+
+WATERMARK = {'measurement_date': date(2024, 3, 1), 'record_id': 'co2-2024-03-01'}
+CO2_PATH = '/api/co2-api'
+
+
+def dated_rows(*days: str) -> RecordBatch:
+    return RecordBatch.from_rows([{'record_id': f"co2-{day}", 'measurement_date': day, 'cycle': 420.0}
+                                  for day in days])
+
+
+def measurement_dates(rows: RecordBatch) -> list:
+    return rows.column('measurement_date').values()
+
+
+def test_rows_at_or_before_the_watermark_are_skipped(global_warming):
+    rows = dated_rows('2023-12-31', '2024-02-29', '2024-03-01', '2024-03-02', '2024-04-15')
+
+    kept = global_warming.filter_rows_after_watermark(rows, WATERMARK, 0)
+
+    assert measurement_dates(kept) == ['2024-03-02', '2024-04-15']
+
+
+def test_look_back_window_keeps_revisions_behind_the_watermark(global_warming):
+    rows = dated_rows('2024-01-30', '2024-01-31', '2024-02-15', '2024-03-01', '2024-03-02')
+
+    kept = global_warming.filter_rows_after_watermark(rows, WATERMARK, 30)
+
+    assert measurement_dates(kept) == ['2024-01-31', '2024-02-15', '2024-03-01', '2024-03-02']
+
+
+def test_empty_table_keeps_every_row(global_warming):
+    rows = dated_rows('1958-03-29', '2024-03-02')
+
+    assert global_warming.watermark_cutoff(None, 30) is None
+    assert len(global_warming.filter_rows_after_watermark(rows, None, 30)) == 2
+
+
+def co2_payload(*days: str, cycle: float = 420.0) -> dict:
+    year_month_days = [day.split('-') for day in days]
+    body = {'co2': [{'year': year, 'month': month.lstrip('0'), 'day': day_of_month.lstrip('0'),
+                     'cycle': str(cycle), 'trend': '419.5'} for year, month, day_of_month in year_month_days]}
+    return {CO2_PATH: ('application/json', json.dumps(body).encode())}
+
+
+@pytest.fixture
+def co2(global_warming, monkeypatch):
+    """The co2 endpoint config, its table's watermark at WATERMARK and aggregates off."""
+    monkeypatch.setattr(global_warming, 'MAINTAIN_AGGREGATES', False)
+    monkeypatch.setattr(global_warming, 'WRITE_SINK', 'load_job')
+    return global_warming.API_ENDPOINTS['co2']
+
+
+def stub_client() -> StubBigQueryClient:
+    client = StubBigQueryClient(TABLE_SCHEMAS)
+    client.watermarks['raw_gw_co2'] = WATERMARK
+    return client
+
+
+class FailingLoadClient(StubBigQueryClient):
+    """Stub client whose load jobs fail."""
+
+    def load_table_from_file(self, *args, **kwargs):
+        raise RuntimeError('load job failed')
+
+
+@pytest.mark.parametrize('stream_json', [False, True])
+def test_endpoint_merges_rows_after_the_watermark_and_in_the_window(global_warming, co2, monkeypatch,
+                                                                     stream_json):
+    monkeypatch.setattr(global_warming, 'STREAM_JSON', stream_json)
+    client = stub_client()
+    metrics = SourceMetrics('co2')
+    payload = co2_payload('2024-01-15', '2024-01-31', '2024-02-20', '2024-03-01', '2024-03-05')
+
+    with LocalUpstream(payloads=payload) as upstream:
+        point_sources_at(global_warming, upstream.base_url)
+        loaded = global_warming.fetch_and_load_endpoint(client, 'co2', co2, metrics=metrics)
+
+    assert loaded == 4
+    assert sorted(str(row['measurement_date']) for row in staged_rows(client.loads[0])) == [
+        '2024-01-31', '2024-02-20', '2024-03-01', '2024-03-05']
+    assert metrics.counters['rows_before_window'] == 1
+
+
+def test_fetch_state_advances_only_after_a_successful_load(global_warming, co2, tmp_path):
+    state_path = str(tmp_path / 'fetch-state.json')
+    payload = co2_payload('2024-02-20', '2024-03-05')
+
+    with LocalUpstream(payloads=payload) as upstream:
+        point_sources_at(global_warming, upstream.base_url)
+        url = co2['url']
+
+        fetch_state = create_fetch_state_store(state_path)
+        failing = FailingLoadClient(TABLE_SCHEMAS)
+        failing.watermarks['raw_gw_co2'] = WATERMARK
+        with pytest.raises(RuntimeError):
+            global_warming.fetch_and_load_endpoint(failing, 'co2', co2, fetch_state=fetch_state)
+        fetch_state.save()
+        assert create_fetch_state_store(state_path).get(url) == {}
+
+        # The next run downloads and merges the same rows again
+        fetch_state = create_fetch_state_store(state_path)
+        client = stub_client()
+        assert global_warming.fetch_and_load_endpoint(client, 'co2', co2, fetch_state=fetch_state) == 2
+        fetch_state.save()
+        assert create_fetch_state_store(state_path).get(url)['etag']
+
+        # Once loaded, an unchanged upstream is skipped
+        fetch_state = create_fetch_state_store(state_path)
+        assert global_warming.fetch_and_load_endpoint(stub_client(), 'co2', co2, fetch_state=fetch_state) is None
+        assert len(client.loads) == 1